@@ -0,0 +1,74 @@
+"""Project-wide anchoring: hashing every file vs. the stat fingerprint index.
+
+Builds a project of small files, each with a few fragments and a snapshot,
+then runs `anchor --all` passes: cold (no index, so every file is hashed),
+warm (nothing changed, stat only), after touching every file (hashed but
+unchanged), and after editing 1% of the files (those are re-anchored).
+
+Run from the repository root:
+    python -m benchmarks.bench_anchor [files] [workers]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from pyweb.core.anchoring import anchor_project
+from pyweb.core.models import FileFragments, Fragment, Range
+from pyweb.core.store import FragmentStore
+
+LINES = 200
+
+
+def make_project(root: Path, n: int) -> list[str]:
+    store = FragmentStore(root)
+    store.init()
+    text = "".join(f"x{i} = {i}\n" for i in range(LINES))
+    files = [f"pkg{i // 100}/mod{i}.py" for i in range(n)]
+    for rel in files:
+        path = root / rel
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text)
+        fragments = [
+            Fragment(f"{rel}:{k}", f"block {k}", rel, Range(k * 20, 0, k * 20 + 10, 0))
+            for k in range(LINES // 20)
+        ]
+        store.save_file(FileFragments(rel, store.content_hash(text), fragments))
+        store.save_cache(rel, text)
+    return files
+
+
+def run(label: str, root: Path, workers: int | None) -> None:
+    report = anchor_project(FragmentStore(root), workers=workers)
+    t = report.timings
+    anchored = sum(r.status == "anchored" for r in report.results)
+    print(
+        f"{label:>10}: total {t['total'] * 1000:8.1f} ms  stat {t['stat'] * 1000:7.1f}  "
+        f"hash {t['hash'] * 1000:7.1f} ({report.hashed:5} files)  "
+        f"anchor {t['anchor'] * 1000:7.1f} ({anchored} files, {report.shifted} shifted)"
+    )
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = make_project(root, n)
+        print(f"{n} files of {LINES} lines, {LINES // 20} fragments each")
+
+        run("cold", root, workers)
+        run("warm", root, workers)
+        for rel in files:
+            os.utime(root / rel)
+        run("touched", root, workers)
+        for rel in files[::100]:
+            path = root / rel
+            path.write_text("# edited\n" + path.read_text())
+        run("1% edited", root, workers)
+
+
+if __name__ == "__main__":
+    main()
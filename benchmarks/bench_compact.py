@@ -0,0 +1,59 @@
+"""Memory and time: list-of-dataclasses ParseResult vs. CompactParseResult.
+
+Run from the repository root:
+    python -m benchmarks.bench_compact [fragments]
+"""
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from pyweb.core.compact import parse_markers_compact
+from pyweb.core.parser import parse_markers
+
+
+def make_source(n_fragments: int) -> str:
+    """Machine-annotated style: many small nested fragments, some with prose."""
+    parts: list[str] = []
+    for i in range(0, n_fragments, 2):
+        parts.append(f'# @pyweb:start id="o{i:06x}" name="region {i}"\n')
+        if i % 10 == 0:
+            parts.append(f"# @pyweb:prose Generated region {i}.\n")
+        parts.append(f"a_{i} = {i}\n")
+        parts.append(f'    # @pyweb:start id="i{i:06x}" name="detail"\n')
+        parts.append(f"    b_{i} = a_{i} + 1\n")
+        parts.append(f'    # @pyweb:end id="i{i:06x}"\n')
+        parts.append(f'# @pyweb:end id="o{i:06x}"\n')
+    return "".join(parts)
+
+
+def measure(fn, source: str) -> tuple[int, float]:
+    """Bytes retained by the result, and the parse time (timed without tracing)."""
+    t0 = time.perf_counter()
+    fn(source)
+    elapsed = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn(source)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, elapsed
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    source = make_source(n)
+    print(f"{n} fragments, {len(source) / 1e6:.1f} MB source")
+    for label, fn in (("dataclasses", parse_markers), ("compact", parse_markers_compact)):
+        retained, elapsed = measure(fn, source)
+        print(f"{label:>12}: {retained / 1e6:7.2f} MB retained  "
+              f"{retained / n:6.0f} B/fragment  {elapsed * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Sequential small edits on a large file: Document vs. splitlines/join.
+
+The baseline is what the writer and SyncEngine used to do per edit: split
+the whole text into lines, slice in the new lines and join it back. It is
+timed on a sample of the edits and extrapolated.
+
+Run from the repository root:
+    python -m benchmarks.bench_document [megabytes] [edits]
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from pyweb.core.document import Document
+
+
+def make_source(megabytes: float) -> str:
+    line = "    value = compute(alpha, beta, gamma)  # a typical line of code\n"
+    return line * int(megabytes * 1e6 / len(line))
+
+
+def make_edits(n_lines: int, n: int, seed: int = 0) -> list[tuple[int, int, str]]:
+    """(start_line, end_line, text): replace 0-2 lines with 0-2 new ones."""
+    rng = random.Random(seed)
+    edits = []
+    for i in range(n):
+        start = rng.randrange(n_lines - 2)
+        end = start + rng.randint(0, 2)
+        edits.append((start, end, f"edited_{i} = {i}\n" * rng.randint(0, 2)))
+    return edits
+
+
+def run_baseline(source: str, edits: list[tuple[int, int, str]]) -> str:
+    for start, end, text in edits:
+        lines = source.splitlines(keepends=True)
+        source = "".join(lines[:start]) + text + "".join(lines[end:])
+    return source
+
+
+def run_document(source: str, edits: list[tuple[int, int, str]]) -> Document:
+    doc = Document(source)
+    for start, end, text in edits:
+        doc.replace_lines(start, end, text)
+    return doc
+
+
+def main() -> None:
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    source = make_source(megabytes)
+    n_lines = source.count("\n")
+    edits = make_edits(n_lines, n)
+    print(f"{len(source) / 1e6:.1f} MB, {n_lines} lines, {n} edits")
+
+    t0 = time.perf_counter()
+    doc = run_document(source, edits)
+    t_edits = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    text = str(doc)
+    t_str = time.perf_counter() - t0
+
+    sample = edits[:min(n, 100)]
+    t0 = time.perf_counter()
+    expected = run_baseline(source, sample)
+    t_base = (time.perf_counter() - t0) / len(sample)
+    assert str(run_document(source, sample)) == expected
+
+    print(f"{'Document':>12}: {t_edits:8.3f} s total  {t_edits / n * 1e6:9.1f} us/edit"
+          f"  (+ {t_str * 1000:.1f} ms to materialize)")
+    print(f"{'splitlines':>12}: {t_base * n:8.3f} s total  {t_base * 1e6:9.1f} us/edit"
+          f"  (extrapolated from {len(sample)} edits)")
+    assert len(text) == len(doc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Line edits for a pulled tree: difflib per file vs. one `git diff`.
+
+Builds a git repository of many files, commits, then changes a few lines
+in every file (as a pull would) and times getting every file's line
+edits: with DiffAnchorer.compute_line_edits on each (snapshot, new text)
+pair, and with GitDiffProvider (one git call, then a blob-id check per
+file).
+
+Run from the repository root:
+    python -m benchmarks.bench_gitdiff [files] [lines]
+"""
+from __future__ import annotations
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pyweb.core.anchorer import DiffAnchorer
+from pyweb.core.gitdiff import GitDiffProvider
+
+
+def git(repo: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=b", "-c", "user.email=b@b", *args],
+                   cwd=repo, check=True, capture_output=True)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Path(tmp)
+        git(repo, "init", "-q")
+        old: dict[str, str] = {}
+        new: dict[str, str] = {}
+        for i in range(n):
+            rel = f"pkg{i // 100}/mod{i}.py"
+            body = [f"value_{i}_{k} = {k}\n" for k in range(lines)]
+            old[rel] = "".join(body)
+            body[lines // 3] = "changed = True\n"
+            body.insert(2 * lines // 3, "inserted = 1\n")
+            new[rel] = "".join(body)
+            (repo / rel).parent.mkdir(exist_ok=True)
+            (repo / rel).write_text(old[rel])
+        git(repo, "add", ".")
+        git(repo, "commit", "-q", "-m", "base")
+        for rel, text in new.items():
+            (repo / rel).write_text(text)
+        print(f"{n} files of {lines} lines, 2 hunks each")
+
+        t0 = time.perf_counter()
+        for rel in old:
+            DiffAnchorer.compute_line_edits(old[rel], new[rel])
+        t_difflib = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        provider = GitDiffProvider.from_git(repo)
+        t_git = time.perf_counter() - t0
+        for rel in old:
+            provider.line_edits(rel, old[rel], new[rel])
+        t_total = time.perf_counter() - t0
+
+        print(f"    difflib: {t_difflib * 1000:9.1f} ms")
+        print(f"   git diff: {t_total * 1000:9.1f} ms  (git {t_git * 1000:.1f} ms, "
+              f"{provider.hits} from git, {provider.fallbacks} fallbacks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Mutation cost: full sidecar rewrite vs. journal append.
+
+Renames fragments one at a time in a large file, once with every mutation
+rewriting the sidecar and once with the mutation journal (compaction
+included), and reports the latency per mutation and the bytes written.
+Bytes come from /proc/self/io (wchar), so they are only shown on Linux.
+
+Run from the repository root:
+    python -m benchmarks.bench_journal [fragments] [mutations]
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_store import make_fragments
+from pyweb.core.models import FileFragments
+from pyweb.core.store import FragmentStore
+
+
+def bytes_written() -> int | None:
+    try:
+        with open("/proc/self/io") as fh:
+            for line in fh:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run(root: Path, ids: list[str], **kwargs) -> tuple[float, int | None]:
+    store = FragmentStore(root, **kwargs)
+    store.load_file("big.py")
+    w0 = bytes_written()
+    t0 = time.perf_counter()
+    for i, fid in enumerate(ids):
+        store.rename_fragment("big.py", fid, f"renamed {i}")
+    elapsed = time.perf_counter() - t0
+    w1 = bytes_written()
+    return elapsed, None if w0 is None or w1 is None else w1 - w0
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    fragments = make_fragments(n)
+    ids = [f.id for f in fragments[:count]]
+    print(f"{len(fragments)} fragments, {len(ids)} renames")
+
+    for label, kwargs in (
+        ("rewrite", {"journal": False}),
+        ("journal", {"journal": True}),
+        ("rewrite+fsync", {"journal": False, "fsync": True}),
+        ("journal+fsync", {"journal": True, "fsync": True}),
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            setup = FragmentStore(root)
+            setup.init()
+            setup.save_file(FileFragments("big.py", "sha256:", make_fragments(n)))
+            sidecar = setup._frag_path("big.py").stat().st_size
+            elapsed, written = run(root, ids, **kwargs)
+            per = f"{written / len(ids):12,.0f} B/op" if written is not None else ""
+            print(f"{label:>14}: {elapsed / len(ids) * 1000:8.2f} ms/op  {per}  (sidecar {sidecar:,} B)")
+
+
+if __name__ == "__main__":
+    main()
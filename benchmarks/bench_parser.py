@@ -0,0 +1,84 @@
+"""Parser throughput: per-line regex path vs. sentinel scanner vs. bytes mode.
+
+The CLI, parse cache and project parse with parse_text_file() (str scanner
+plus char offsets); the file cases compare it against parse_file(), which
+would have to be at least as fast to take its place.
+
+Run from the repository root:
+    python -m benchmarks.bench_parser [size_mb]
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pyweb.core.parser import parse_file, parse_markers, parse_markers_bytes, parse_text_file
+
+
+def make_source(size_mb: float, marker_every: int = 200) -> str:
+    """Generate Python-ish source with a nested fragment pair every few hundred lines."""
+    target = int(size_mb * 1024 * 1024)
+    parts: list[str] = []
+    size = 0
+    i = 0
+    while size < target:
+        block = [f'# @pyweb:start id="o{i}" name="outer {i}"\n',
+                 f"# @pyweb:prose Block number {i}.\n"]
+        block += [f"value_{i}_{j} = compute({j}, 'payload string')\n" for j in range(marker_every // 2)]
+        block.append(f'    # @pyweb:start id="i{i}" name="inner {i}"\n')
+        block += [f"    other_{i}_{j} = value_{i}_{j} * 2\n" for j in range(marker_every // 2)]
+        block.append(f'    # @pyweb:end id="i{i}"\n')
+        block.append(f'# @pyweb:end id="o{i}"\n')
+        chunk = "".join(block)
+        parts.append(chunk)
+        size += len(chunk)
+        i += 1
+    return "".join(parts)
+
+
+def bench(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    source = make_source(size_mb)
+    mb = len(source.encode()) / (1024 * 1024)
+    assert parse_markers(source) == parse_markers(source, fast=False)
+
+    data = source.encode()
+    print(f"source: {mb:.1f} MB, {source.count(chr(10))} lines")
+    cases = [
+        ("per-line", lambda: parse_markers(source, fast=False)),
+        ("scanner", lambda: parse_markers(source)),
+        ("scanner+offsets", lambda: parse_markers(source, with_offsets=True)),
+        ("bytes", lambda: parse_markers_bytes(data)),
+    ]
+    for label, fn in cases:
+        t = bench(fn)
+        print(f"{label:>16}: {t * 1000:8.1f} ms  {mb / t:8.1f} MB/s")
+
+    # End-to-end latency from a file on disk
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "big.py"
+        path.write_bytes(data)
+        assert parse_text_file(path).char_offsets == parse_file(path).char_offsets
+        cases = [
+            ("read_text+parse", lambda: parse_markers(path.read_text())),
+            ("parse_text_file", lambda: parse_text_file(path)),
+            ("mmap bytes", lambda: parse_file(path)),
+        ]
+        for label, fn in cases:
+            t = bench(fn)
+            print(f"{label:>16}: {t * 1000:8.1f} ms  {mb / t:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
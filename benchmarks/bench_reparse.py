@@ -0,0 +1,42 @@
+"""One-line edits: reparse() vs. a full parse_markers() of the edited text.
+
+reparse() only scans the new text. Editing within a line reuses the
+previous fragments outright; inserting a line replays the stack machine
+over every marker of the file, so its cost follows the marker count
+rather than the file size. Sources of the same size with sparse and
+dense markers are edited near the start, middle and end.
+
+Run from the repository root:
+    python -m benchmarks.bench_reparse [size_mb]
+"""
+from __future__ import annotations
+
+import sys
+
+from benchmarks.bench_parser import bench, make_source
+from pyweb.core.parser import parse_markers, reparse
+
+
+def main() -> None:
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    for every in (200, 20):
+        source = make_source(size_mb, marker_every=every)
+        lines = source.splitlines(keepends=True)
+        previous = parse_markers(source)
+        print(f"{len(lines)} lines, {len(previous.markers)} markers (one every ~{every // 2} lines)")
+        for label, at in (("start", 3), ("middle", len(lines) // 2), ("end", len(lines) - 3)):
+            # Replace a code line (typing), or insert one before it
+            while lines[at].lstrip().startswith("#"):
+                at += 1
+            for kind, span, new_text in (("edit", (at, at + 1), "edited = 1\n"),
+                                         ("insert", (at, at), "inserted = 1\n")):
+                edited = "".join(lines[:span[0]]) + new_text + "".join(lines[span[1]:])
+                assert reparse(previous, source, span, new_text) == parse_markers(edited)
+                t_full = bench(lambda: parse_markers(edited))
+                t_re = bench(lambda: reparse(previous, source, span, new_text))
+                print(f"  {label:>6} {kind:>6}: parse_markers {t_full * 1000:7.2f} ms   "
+                      f"reparse {t_re * 1000:7.2f} ms  ({t_full / t_re:7.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Sidecar encodings: pretty JSON (to_json) vs. columnar JSON (to_columnar).
+
+Times encode and decode of a FileFragments, save_file() and a cold
+load_file() through a FragmentStore, and the bytes written, for each
+sidecar_format.
+
+Run from the repository root:
+    python -m benchmarks.bench_sidecar [fragments]
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_store import make_fragments
+from pyweb.core.models import FileFragments
+from pyweb.core.store import SIDECAR_FORMATS, FragmentStore
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    ff = FileFragments("big.py", "sha256:", make_fragments(n))
+    for f in ff.fragments[::10]:
+        f.prose = f"Prose for {f.name}."
+    print(f"{len(ff.fragments)} fragments")
+    print(f"{'format':>10} {'bytes':>11} {'encode':>9} {'decode':>9} {'save':>9} {'load':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, encode in SIDECAR_FORMATS.items():
+            text = encode(ff)
+            assert FileFragments.from_json(text) == ff
+            t_encode = best_of(lambda: encode(ff))
+            t_decode = best_of(lambda: FileFragments.from_json(text))
+
+            root = Path(tmp) / fmt
+            root.mkdir()
+            store = FragmentStore(root, sidecar_format=fmt)
+            store.init()
+            t_save = best_of(lambda: store.save_file(ff))
+
+            def load() -> None:
+                store.invalidate()
+                store.load_file("big.py")
+
+            t_load = best_of(load)
+            size = store._frag_path("big.py").stat().st_size
+            print(f"{fmt:>10} {size:>11,} {t_encode * 1000:7.0f}ms {t_decode * 1000:7.0f}ms "
+                  f"{t_save * 1000:7.0f}ms {t_load * 1000:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""FragmentStore queries and validation on a large sidecar.
+
+Builds a file of top-level fragments with a few nested children each and
+times validate(), fragment_at() for every line, and the sibling overlap
+checks a resize makes, all on a warm (already loaded) store.
+
+Run from the repository root:
+    python -m benchmarks.bench_store [fragments]
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pyweb.core.models import FileFragments, Fragment, Range
+from pyweb.core.store import FragmentStore
+
+CHILDREN = 4
+
+
+def make_fragments(n: int) -> list[Fragment]:
+    """n fragments: roots of 10 lines, each with CHILDREN one-line children."""
+    fragments: list[Fragment] = []
+    for i in range(n // (CHILDREN + 1)):
+        base = i * 10
+        kids = [f"c{i}_{k}" for k in range(CHILDREN)]
+        fragments.append(Fragment(f"r{i}", f"root {i}", "big.py", Range(base, 0, base + 10, 0), kids))
+        for k, kid in enumerate(kids):
+            line = base + 1 + 2 * k
+            fragments.append(Fragment(kid, f"child {i}.{k}", "big.py", Range(line, 0, line + 1, 0)))
+    return fragments
+
+
+def timed(label: str, fn, count: int = 1) -> None:
+    t0 = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t0
+    per = f"  {dt / count * 1e6:9.1f} us each" if count > 1 else ""
+    print(f"{label:>26}: {dt:8.3f} s{per}")
+    return result
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    fragments = make_fragments(n)
+    n_lines = fragments[-CHILDREN - 1].range.end_line
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FragmentStore(Path(tmp))
+        store.init()
+        store.save_file(FileFragments("big.py", "sha256:", fragments))
+        store.invalidate()
+        print(f"{len(fragments)} fragments over {n_lines} lines")
+
+        timed("load (cold)", lambda: store.load_file("big.py"))
+        errors = timed("validate", lambda: store.validate("big.py"))
+        assert errors == []
+        timed("first fragment_at", lambda: store.fragment_at("big.py", 0, 0))
+        positions = [(line, 0) for line in range(n_lines)]
+        owners = timed("fragments_at (all lines)", lambda: store.fragments_at("big.py", positions), len(positions))
+        assert owners[1].id == "c0_0"
+        timed("fragment_at x 1000", lambda: [store.fragment_at("big.py", i * 7, 0) for i in range(1000)], 1000)
+        ff = store.load_file("big.py")
+        timed("overlapping_sibling x 1000", lambda: [
+            ff.overlapping_sibling(f"r{i}", Range(i * 10 + 1, 0, i * 10 + 2, 5), exclude=f"c{i}_0")
+            for i in range(1000)
+        ], 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,61 @@
 from __future__ import annotations
 
+import io
 import json
 import sys
+import time
 from pathlib import Path
 
 import click
 
+from pyweb.core.anchorer import DiffProvider
+from pyweb.core.anchoring import (
+    ANCHORED, NO_SNAPSHOT, UNCHANGED, UNREADABLE, AnchorResult, anchor_project,
+)
 from pyweb.core.comments import get_comment_style, load_config_overrides, CommentStyle
-from pyweb.core.parser import parse_markers, get_roots, get_fragment_by_id, get_fragment_by_name
+from pyweb.core.gitdiff import GitDiffProvider
+from pyweb.core.parser import ParseResult, parse_text_file
 from pyweb.core import writer
+from pyweb.core.autofrag import CODE_EXTENSIONS, autofrag_project
+from pyweb.core.parsecache import ParseCache
+from pyweb.core.project import is_binary, iter_project_files, parse_project
+from pyweb.core.store import FragmentStore, open_store
+from pyweb.core.strip import StripResult, strip_file, strip_project
 
 
 def _project_root(ctx: click.Context) -> Path:
     return Path(ctx.obj or ".").resolve()
 
 
-def _read_source(project_root: Path, file_path: str) -> str:
+def _source_path(project_root: Path, file_path: str) -> Path:
     p = project_root / file_path
     if not p.exists():
         click.echo(f"Error: file '{file_path}' not found.", err=True)
         sys.exit(1)
-    return p.read_text()
+    return p
+
+
+def _read_source(project_root: Path, file_path: str) -> str:
+    return _source_path(project_root, file_path).read_text()
+
+
+def _parse_cache(project_root: Path) -> ParseCache | None:
+    """The parse cache, enabled once the project has a .pyweb/ directory."""
+    if not (project_root / ".pyweb").is_dir():
+        return None
+    return ParseCache(project_root)
+
+
+def _parse_file(project_root: Path, file_path: str) -> ParseResult:
+    """Parse a file's markers with character offsets.
+
+    Served from the parse cache when the file is unchanged since last time.
+    """
+    p = _source_path(project_root, file_path)
+    cache = _parse_cache(project_root)
+    if cache is not None:
+        return cache.parse(file_path)
+    return parse_text_file(p, file_path)
 
 
 def _write_source(project_root: Path, file_path: str, content: str) -> None:
@@ -182,21 +217,101 @@ def resize(ctx: click.Context, file: str, fragment_id: str, start_line: int, end
     click.echo(f"Resized fragment {fragment_id} → [{start_line} - {end_line}]")
 
 
+# Fields each batch operation must have
+_BATCH_FIELDS = {
+    "add": ("name", "start_line", "end_line"),
+    "rm": ("id",),
+    "rename": ("id", "name"),
+    "prose": ("id",),
+    "resize": ("id", "start_line", "end_line"),
+}
+
+
+def _apply_batch_op(batch: writer.Batch, op: object) -> str:
+    """Queue one JSON batch operation, returning a line for the report."""
+    if not isinstance(op, dict):
+        raise ValueError(f"expected a JSON object, got {type(op).__name__}")
+    kind = op.get("op")
+    if not isinstance(kind, str) or kind not in _BATCH_FIELDS:
+        raise ValueError(f"unknown op {kind!r}")
+    missing = [f for f in _BATCH_FIELDS[kind] if f not in op]
+    if missing:
+        raise ValueError(f"missing field{'s' if len(missing) > 1 else ''} {', '.join(map(repr, missing))}")
+    if kind == "add":
+        fid = batch.add(op["name"], op["start_line"], op["end_line"], op.get("prose"))
+        return f"Created fragment '{op['name']}' ({fid}) [{op['start_line']} - {op['end_line']}]"
+    if kind == "rm":
+        batch.remove(op["id"])
+        return f"Removed fragment {op['id']}"
+    if kind == "rename":
+        batch.rename(op["id"], op["name"])
+        return f"Renamed fragment {op['id']} → '{op['name']}'"
+    if kind == "prose":
+        batch.set_prose(op["id"], op.get("text"))
+        return f"Set prose on {op['id']}" if op.get("text") else f"Cleared prose on {op['id']}"
+    batch.resize(op["id"], op["start_line"], op["end_line"])
+    return f"Resized fragment {op['id']} → [{op['start_line']} - {op['end_line']}]"
+
+
+@cli.command()
+@click.argument("file")
+@comment_options
+@click.pass_context
+def batch(ctx: click.Context, file: str, comment_prefix: str | None, comment_suffix: str | None) -> None:
+    """Apply marker operations read as JSON lines from stdin, writing the file once.
+
+    One object per line, with "op" one of add, rm, rename, prose, resize:
+
+    \b
+      {"op": "add", "name": "setup", "start_line": 0, "end_line": 4, "prose": "..."}
+      {"op": "rm", "id": "a1b2c3d4"}
+      {"op": "rename", "id": "a1b2c3d4", "name": "teardown"}
+      {"op": "prose", "id": "a1b2c3d4", "text": "..."}
+      {"op": "resize", "id": "a1b2c3d4", "start_line": 2, "end_line": 9}
+
+    All line numbers refer to the file as it is before the batch. Nothing is
+    written if any operation is invalid.
+    """
+    root = _project_root(ctx)
+    source = _read_source(root, file)
+    cs = _resolve_comment_style(ctx, file, comment_prefix, comment_suffix)
+    b = writer.Batch(source, file, cs)
+
+    report: list[str] = []
+    for n, raw in enumerate(sys.stdin, 1):
+        if not raw.strip():
+            continue
+        try:
+            report.append(_apply_batch_op(b, json.loads(raw)))
+        except (ValueError, TypeError) as e:
+            click.echo(f"Error: line {n}: {e}", err=True)
+            sys.exit(1)
+
+    try:
+        new_source = b.apply()
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    _write_source(root, file, new_source)
+    for line in report:
+        click.echo(line)
+    click.echo(f"Applied {len(report)} operation{'s' if len(report) != 1 else ''} to {file}")
+
+
 @cli.command()
 @click.argument("file")
 @click.pass_context
 def ls(ctx: click.Context, file: str) -> None:
     """List fragments as an indented tree."""
     root = _project_root(ctx)
-    source = _read_source(root, file)
-    result = parse_markers(source, file)
+    result = _parse_file(root, file)
 
     if not result.fragments:
         click.echo("No fragments in this file.")
         return
 
-    by_id = {f.id: f for f in result.fragments}
-    roots = get_roots(result.fragments)
+    by_id = result.by_id
+    roots = result.roots
 
     def print_tree(frag_id: str, depth: int) -> None:
         f = by_id[frag_id]
@@ -220,25 +335,26 @@ def view(ctx: click.Context, file: str, fragment: str | None) -> None:
     root = _project_root(ctx)
     source = _read_source(root, file)
     lines = source.splitlines(keepends=True)
-    result = parse_markers(source, file)
+    # The cached parse numbers lines as source.splitlines() does, so its
+    # marker lines line up with the lines sliced below
+    result = _parse_file(root, file)
 
     if not result.fragments:
         click.echo("No fragments in this file.")
         return
 
-    by_id = {f.id: f for f in result.fragments}
     frags_to_show: list = []
 
     if fragment:
-        f = get_fragment_by_id(result.fragments, fragment)
+        f = result.get(fragment)
         if f is None:
-            f = get_fragment_by_name(result.fragments, fragment)
+            f = result.get_by_name(fragment)
         if f is None:
             click.echo(f"Fragment '{fragment}' not found.", err=True)
             sys.exit(1)
         frags_to_show = [f]
     else:
-        frags_to_show = get_roots(result.fragments)
+        frags_to_show = result.roots
 
     def render(frag, depth: int) -> None:
         if depth == 0:
@@ -250,7 +366,7 @@ def view(ctx: click.Context, file: str, fragment: str | None) -> None:
             click.echo(frag.prose)
             click.echo()
 
-        child_frags = [by_id[cid] for cid in frag.children if cid in by_id]
+        child_frags = list(result.children_of(frag.id))
         child_frags.sort(key=lambda c: c.start_line)
 
         line_idx = frag.content_start_line
@@ -279,37 +395,306 @@ def expand(ctx: click.Context, file: str) -> None:
     click.echo(source, nl=False)
 
 
+def _anchor_summary(result: AnchorResult) -> str:
+    if result.status == UNCHANGED:
+        return "up to date"
+    if result.status == NO_SNAPSHOT:
+        return "no cached content to diff against"
+    if result.status == UNREADABLE:
+        return "unreadable"
+    return (f"shifted {result.shifted} fragment{'s' if result.shifted != 1 else ''}, "
+            f"{result.orphaned} orphaned")
+
+
 @cli.command()
-@click.argument("file")
+@click.argument("file", required=False)
+@click.option("--all", "all_files", is_flag=True,
+              help="Re-anchor every file with fragments.")
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Worker processes for --all (default: one per core).")
+@click.option("--git-base", default=None, metavar="REV",
+              help="Take line edits from one `git diff REV` (e.g. ORIG_HEAD after a pull).")
 @click.pass_context
-def parse(ctx: click.Context, file: str) -> None:
-    """Parse markers and output fragment tree as JSON (for editor extensions)."""
+def anchor(ctx: click.Context, file: str | None, all_files: bool, jobs: int | None,
+           git_base: str | None) -> None:
+    """Re-anchor fragments to current file content. Run after external changes.
+
+    The file is diffed against its snapshot from the last anchor. With
+    --all, files unchanged since then are skipped on their stat fingerprint
+    (or content hash), and the changed ones are re-anchored in parallel.
+    With --git-base, git's hunks are used for files whose snapshot is
+    REV's version; other files are still diffed against their snapshot.
+    """
     root = _project_root(ctx)
-    source = _read_source(root, file)
-    result = parse_markers(source, file)
+    store = open_store(root)
+    if file is None and not all_files:
+        click.echo("Error: give a FILE or --all.", err=True)
+        sys.exit(1)
+    if file is not None:
+        _source_path(root, file)
+
+    diff = None
+    if git_base is not None:
+        try:
+            diff = GitDiffProvider.from_git(root, git_base, None if all_files else [file])
+        except RuntimeError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+    if all_files:
+        _anchor_all(store, jobs, diff)
+        return
+
+    result = anchor_project(store, [file], workers=1, diff=diff).results[0]
+    click.echo(f"{file}: {_anchor_summary(result)}")
+    if result.status in (NO_SNAPSHOT, UNREADABLE):
+        sys.exit(1)
+
 
-    data = {
+def _anchor_all(store: FragmentStore, jobs: int | None, diff: DiffProvider | None) -> None:
+    """Re-anchor every tracked file, then print a summary with the time per phase."""
+    report = anchor_project(store, workers=jobs, diff=diff)
+    for result in report.results:
+        if result.status != UNCHANGED:
+            click.echo(f"{result.file}: {_anchor_summary(result)}")
+
+    anchored = report.with_status(ANCHORED)
+    t = report.timings
+    click.echo(
+        f"Anchored {len(anchored)} of {len(report.results)} files: "
+        f"shifted {report.shifted} fragments, {report.orphaned} orphaned "
+        f"({len(report.with_status(UNCHANGED))} up to date, "
+        f"{len(report.with_status(NO_SNAPSHOT))} without cached content, "
+        f"{len(report.with_status(UNREADABLE))} unreadable) in {t['total']:.2f}s"
+    )
+    click.echo(
+        f"  stat {t['stat']:.3f}s ({len(report.results)} files, {report.stat_matched} unchanged), "
+        f"hash {t['hash']:.3f}s ({report.hashed} files), "
+        f"anchor {t['anchor']:.3f}s ({len(anchored)} files)"
+    )
+
+
+def _result_to_dict(file: str, result: ParseResult) -> dict:
+    fragments = []
+    for f in result.fragments:
+        d = {
+            "id": f.id,
+            "name": f.name,
+            "start_line": f.start_line,
+            "end_line": f.end_line,
+            "content_start_line": f.content_start_line,
+            "content_end_line": f.content_end_line,
+            "children": f.children,
+            "parent_id": f.parent_id,
+            "prose": f.prose,
+        }
+        if result.char_offsets is not None:
+            # Character offsets/columns so editors can decorate without re-reading
+            closed = f.content_end_line < f.end_line
+            d["start_offset"] = result.char_offsets[f.start_line]
+            d["end_offset"] = result.char_offsets[f.end_line]
+            d["start_col"] = result.columns[f.start_line][0]
+            d["end_col"] = result.columns[f.end_line - 1][1] if closed else None
+        fragments.append(d)
+    return {
         "file": file,
-        "fragments": [
-            {
-                "id": f.id,
-                "name": f.name,
-                "start_line": f.start_line,
-                "end_line": f.end_line,
-                "content_start_line": f.content_start_line,
-                "content_end_line": f.content_end_line,
-                "children": f.children,
-                "parent_id": f.parent_id,
-                "prose": f.prose,
-            }
-            for f in result.fragments
-        ],
+        "fragments": fragments,
         "warnings": [
             {"line": w.line, "message": w.message}
             for w in result.warnings
         ],
     }
-    click.echo(json.dumps(data, indent=2))
+
+
+@cli.command()
+@click.argument("file", required=False)
+@click.option("--all", "all_files", is_flag=True,
+              help="Parse every project file in parallel and stream NDJSON.")
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Worker processes for --all (default: one per core).")
+@click.pass_context
+def parse(ctx: click.Context, file: str | None, all_files: bool, jobs: int | None) -> None:
+    """Parse markers and output fragment tree as JSON (for editor extensions)."""
+    root = _project_root(ctx)
+    if all_files:
+        _parse_all(root, jobs)
+        return
+    if file is None:
+        click.echo("Error: give a FILE or --all.", err=True)
+        sys.exit(1)
+
+    result = _parse_file(root, file)
+    click.echo(json.dumps(_result_to_dict(file, result), indent=2))
+
+
+def _parse_all(root: Path, jobs: int | None) -> None:
+    """Stream one JSON document per file, then a summary on stderr."""
+    t0 = time.perf_counter()
+    files = list(iter_project_files(root))
+    t_walk = time.perf_counter() - t0
+
+    parsed = skipped = n_frags = 0
+    warned: list[tuple[str, int]] = []
+    for rel, result in parse_project(root, files, workers=jobs):
+        if result is None:
+            skipped += 1
+            continue
+        parsed += 1
+        n_frags += len(result.fragments)
+        if result.warnings:
+            warned.append((rel, len(result.warnings)))
+        click.echo(json.dumps(_result_to_dict(rel, result), separators=(",", ":")))
+
+    elapsed = time.perf_counter() - t0
+    n_warn = sum(n for _, n in warned)
+    click.echo(
+        f"Parsed {parsed} files ({skipped} skipped), {n_frags} fragments, "
+        f"{n_warn} warnings in {elapsed:.2f}s (walk {t_walk:.2f}s)",
+        err=True,
+    )
+    for rel, n in sorted(warned):
+        click.echo(f"  {rel}: {n} warning{'s' if n != 1 else ''}", err=True)
+
+
+def _collect_files(
+    root: Path, paths: tuple[str, ...], suffixes: frozenset[str] | None = None,
+) -> list[str]:
+    """Project-relative files named by PATHS; directories expand to their project files.
+
+    Files found through a directory are limited to suffixes, if given.
+    Exits with an error if a path does not exist.
+    """
+    files: list[str] = []
+    project_files: list[str] | None = None
+    for path in paths or (".",):
+        p = (root / path).resolve()
+        if p.is_file():
+            files.append(p.relative_to(root).as_posix())
+        elif p.is_dir():
+            if project_files is None:
+                project_files = list(iter_project_files(root))
+            rel_dir = p.relative_to(root).as_posix()
+            files.extend(
+                f for f in project_files
+                if (rel_dir == "." or f.startswith(rel_dir + "/"))
+                and (suffixes is None or Path(f).suffix.lower() in suffixes)
+            )
+        else:
+            click.echo(f"Error: '{path}' not found.", err=True)
+            sys.exit(1)
+    return files
+
+
+@cli.command()
+@click.argument("paths", nargs=-1)
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Worker processes (default: one per core).")
+@click.option("--min-lines", type=int, default=1, show_default=True,
+              help="Skip definitions shorter than this many lines.")
+@click.option("--dry-run", is_flag=True, help="Report what would be added without writing.")
+@comment_options
+@click.pass_context
+def autofrag(ctx: click.Context, paths: tuple[str, ...], jobs: int | None, min_lines: int,
+             dry_run: bool, comment_prefix: str | None, comment_suffix: str | None) -> None:
+    """Wrap classes, functions and methods in fragment markers.
+
+    PATHS are files or directories (default: the whole project). Python is
+    read with ast; other languages are split by indentation. Each file is
+    written at most once, and already-wrapped definitions are left alone.
+    """
+    root = _project_root(ctx)
+    t0 = time.perf_counter()
+    files = _collect_files(root, paths, CODE_EXTENSIONS)
+    overrides = load_config_overrides(root)
+    changed = unchanged = skipped = total = 0
+    for rel, added in sorted(autofrag_project(
+        root, files, workers=jobs, overrides=overrides, prefix=comment_prefix,
+        suffix=comment_suffix, min_lines=min_lines, dry_run=dry_run,
+    )):
+        if added is None:
+            skipped += 1
+        elif added:
+            changed += 1
+            total += added
+            click.echo(f"{rel}: {added} fragment{'s' if added != 1 else ''}")
+        else:
+            unchanged += 1
+
+    verb = "Would add" if dry_run else "Added"
+    click.echo(
+        f"{verb} {total} fragments to {changed} files "
+        f"({unchanged} unchanged, {skipped} skipped) in {time.perf_counter() - t0:.2f}s"
+    )
+
+
+@cli.command()
+@click.argument("paths", nargs=-1)
+@click.option("--output", "-o", default=None,
+              help="Write stripped files into this directory (relative to the project), mirroring the tree.")
+@click.option("--sidecars", is_flag=True,
+              help="Also save the fragments as a pyweb store in OUTPUT (.pyweb/fragments/).")
+@click.option("--jobs", "-j", type=int, default=None,
+              help="Worker processes for --output (default: CPU count).")
+@click.pass_context
+def strip(ctx: click.Context, paths: tuple[str, ...], output: str | None, sidecars: bool,
+          jobs: int | None) -> None:
+    """Remove fragment markers and prose, e.g. for a release build.
+
+    PATHS are files or directories (default: the whole project). Files are
+    streamed line by line and keep their bytes and line endings otherwise.
+    Without --output, the stripped text is written to stdout.
+    """
+    root = _project_root(ctx)
+    t0 = time.perf_counter()
+    files = _collect_files(root, paths)
+    results: list[tuple[str, StripResult | None]] = []
+
+    if output is None:
+        if sidecars:
+            click.echo("Error: --sidecars needs --output.", err=True)
+            sys.exit(1)
+        out = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8",
+                               errors="surrogateescape", newline="")
+        for rel in files:
+            path = root / rel
+            if is_binary(path):
+                results.append((rel, None))
+                continue
+            results.append((rel, strip_file(path, out, rel)))
+        out.flush()
+        out.detach()
+    else:
+        out_root = (root / output).resolve()
+        if out_root == root:
+            click.echo("Error: --output must not be the project root.", err=True)
+            sys.exit(1)
+        if out_root.is_relative_to(root):
+            # Never read back our own output
+            rel_out = out_root.relative_to(root).as_posix()
+            files = [f for f in files if not f.startswith(rel_out + "/")]
+        results = sorted(
+            strip_project(root, files, out_root, workers=jobs, sidecars=sidecars),
+            key=lambda item: item[0],
+        )
+
+    dropped = stripped = copied = skipped = 0
+    for rel, result in results:
+        if result is None:
+            skipped += 1
+            continue
+        if result.fragments is None:
+            copied += 1
+        elif result.dropped:
+            stripped += 1
+            dropped += result.dropped
+        for w in result.warnings:
+            click.echo(f"  WARNING ({rel} line {w.line}): {w.message}", err=True)
+
+    click.echo(
+        f"Removed {dropped} marker lines from {stripped} files "
+        f"({len(results) - stripped - copied - skipped} without markers, {copied} copied, "
+        f"{skipped} skipped) in {time.perf_counter() - t0:.2f}s",
+        err=True,
+    )
 
 
 @cli.command()
@@ -318,8 +703,7 @@ def parse(ctx: click.Context, file: str) -> None:
 def check(ctx: click.Context, file: str) -> None:
     """Validate fragment markers in a file."""
     root = _project_root(ctx)
-    source = _read_source(root, file)
-    result = parse_markers(source, file)
+    result = _parse_file(root, file)
 
     if result.warnings:
         for w in result.warnings:
@@ -327,3 +711,35 @@ def check(ctx: click.Context, file: str) -> None:
         sys.exit(1)
     else:
         click.echo("OK — no warnings.")
+
+
+@cli.group()
+def cache() -> None:
+    """Inspect or clear the parse-result cache (.pyweb/cache/parse/) and snapshots."""
+
+
+@cache.command("stats")
+@click.pass_context
+def cache_stats(ctx: click.Context) -> None:
+    """Show entry count and disk usage of the parse cache."""
+    pc = ParseCache(_project_root(ctx))
+    st = pc.stats()
+    click.echo(f"entries: {st.entries}")
+    click.echo(f"size:    {st.total_bytes} bytes (limit {st.max_bytes})")
+    click.echo(f"dir:     {pc.cache_dir}")
+
+
+@cache.command("clear")
+@click.pass_context
+def cache_clear(ctx: click.Context) -> None:
+    """Delete all parse cache entries."""
+    removed = ParseCache(_project_root(ctx)).clear()
+    click.echo(f"Removed {removed} cache entries")
+
+
+@cache.command("gc")
+@click.pass_context
+def cache_gc(ctx: click.Context) -> None:
+    """Delete source snapshots that no file with fragments refers to."""
+    removed = open_store(_project_root(ctx)).gc_cache()
+    click.echo(f"Removed {removed} snapshot files")
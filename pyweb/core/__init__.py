@@ -1,4 +1,5 @@
 from pyweb.core.models import Range, Fragment, FileFragments
 from pyweb.core.comments import CommentStyle, get_comment_style
-from pyweb.core.parser import parse_markers, ParseResult, ParsedFragment, ParseWarning
+from pyweb.core.document import Document
+from pyweb.core.parser import parse_markers, parse_markers_bytes, parse_file, parse_text_file, parse_stream, reparse, ParseResult, ParsedFragment, ParseWarning
 from pyweb.core.writer import add_fragment, remove_fragment, rename_fragment, set_prose, resize_fragment
@@ -117,3 +117,19 @@ class DiffAnchorer:
                         frag.range = ORPHAN_RANGE
 
         return result
+
+
+class DiffProvider:
+    """Where line edits between a file's anchored text and its current text come from.
+
+    This one diffs the two texts with DiffAnchorer.compute_line_edits().
+    Subclasses can take the edits from elsewhere (see gitdiff.GitDiffProvider)
+    and fall back to this for files they know nothing about.
+    """
+
+    def line_edits(self, file_path: str, old_content: str, new_content: str) -> list[LineEdit]:
+        return DiffAnchorer.compute_line_edits(old_content, new_content)
+
+    def restrict(self, files: list[str]) -> DiffProvider:
+        """A provider for just these files, e.g. to send to a worker process."""
+        return self
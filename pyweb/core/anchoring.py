@@ -0,0 +1,279 @@
+"""Re-anchor a project's files after external changes (git pull, rebase, ...).
+
+A pass runs in three phases:
+
+- stat: each file's stat fingerprint (mtime_ns, size, inode) is compared
+  with the one recorded in .pyweb/cache/anchor.json the last time the file
+  matched its snapshot. A match (with the snapshot unchanged too) skips the
+  file without opening it, unless the recorded mtime is not older than
+  anchor.json itself: such a file may have been edited again in the same
+  timestamp tick it was hashed in ("racily clean", as git calls it), so it
+  is hashed again.
+- hash: files whose fingerprint changed are hashed. Those whose text still
+  matches the snapshot (touched, or checked out again unchanged) only get
+  their fingerprint recorded again.
+- anchor: the rest are diffed against their snapshot and re-anchored with
+  SyncEngine.on_source_changed, batched across a process pool. The line
+  edits come from a DiffProvider: difflib by default, or one `git diff`
+  for the whole tree (gitdiff.GitDiffProvider).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+from pyweb.core.anchorer import DiffProvider
+from pyweb.core.fsutil import atomic_write, fingerprint
+from pyweb.core.project import map_batches
+from pyweb.core.store import FragmentStore, open_store
+from pyweb.core.sync import SyncEngine
+
+INDEX_VERSION = 1
+INDEX_NAME = "anchor.json"
+
+# Statuses of AnchorResult
+UNCHANGED = "unchanged"
+ANCHORED = "anchored"
+NO_SNAPSHOT = "no snapshot"
+UNREADABLE = "unreadable"
+
+# Read size when hashing a file
+_CHUNK = 1 << 20
+
+# Index entry: [mtime_ns, size, inode, snapshot digest]
+Entry = list[int | str]
+
+
+@dataclass
+class AnchorResult:
+    file: str
+    status: str        # UNCHANGED, ANCHORED, NO_SNAPSHOT or UNREADABLE
+    shifted: int = 0   # fragments whose range moved or changed size
+    orphaned: int = 0  # fragments orphaned by this pass
+
+
+@dataclass
+class AnchorReport:
+    results: list[AnchorResult]
+    timings: dict[str, float] = field(default_factory=dict)  # phase -> seconds
+    stat_matched: int = 0  # files skipped on their stat fingerprint alone
+    hashed: int = 0        # files read and hashed
+
+    def with_status(self, status: str) -> list[AnchorResult]:
+        return [r for r in self.results if r.status == status]
+
+    @property
+    def shifted(self) -> int:
+        return sum(r.shifted for r in self.results)
+
+    @property
+    def orphaned(self) -> int:
+        return sum(r.orphaned for r in self.results)
+
+
+def text_digest(path: Path) -> tuple[str, tuple[int, int, int]]:
+    """Digest of a text file as read_text() reads it, and the fingerprint it was read at.
+
+    The digest is the one FragmentStore.content_hash() and the snapshot
+    cache give for the same text.
+    """
+    hasher = hashlib.sha256()
+    with path.open(encoding="utf-8", errors="surrogateescape") as fh:
+        st = os.fstat(fh.fileno())
+        while chunk := fh.read(_CHUNK):
+            hasher.update(chunk.encode("utf-8", "surrogateescape"))
+    return "sha256:" + hasher.hexdigest(), fingerprint(st)
+
+
+# --- index ---
+
+def _index_path(store: FragmentStore) -> Path:
+    return store.cache_dir / INDEX_NAME
+
+
+def _index_mtime(store: FragmentStore) -> int | None:
+    """When the index was last written, on the filesystem's clock."""
+    try:
+        return _index_path(store).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_index(store: FragmentStore) -> dict[str, Entry]:
+    """file path -> entry recorded when the file last matched its snapshot."""
+    try:
+        data = json.loads(_index_path(store).read_bytes())
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _save_index(store: FragmentStore, files: dict[str, Entry]) -> None:
+    data = json.dumps({"version": INDEX_VERSION, "files": files}, separators=(",", ":"), sort_keys=True)
+    atomic_write(_index_path(store), data.encode())
+
+
+# --- anchoring ---
+
+def anchor_file(
+    store: FragmentStore, file_path: str, engine: SyncEngine | None = None,
+) -> tuple[AnchorResult, Entry | None]:
+    """Re-anchor one file's fragments to its text on disk, diffed against its snapshot.
+
+    Returns the result and the file's new index entry (None when there is
+    no snapshot or the file cannot be read).
+    """
+    old = store.load_cache(file_path)
+    if old is None:
+        return AnchorResult(file_path, NO_SNAPSHOT), None
+    try:
+        with (store.project_root / file_path).open(encoding="utf-8") as fh:
+            st = os.fstat(fh.fileno())
+            new = fh.read()
+    except (OSError, UnicodeDecodeError):
+        return AnchorResult(file_path, UNREADABLE), None
+    entry = [*fingerprint(st), store.content_hash(new)]
+    if new == old:
+        # Moves an old plain-copy snapshot into the index, so the stat check applies next time
+        store.save_cache(file_path, new)
+        return AnchorResult(file_path, UNCHANGED), entry
+
+    before = store.load_file(file_path)
+    ranges = {f.id: (f.range.start_line, f.range.start_col, f.range.end_line, f.range.end_col)
+              for f in before.fragments} if before is not None else {}
+    if engine is None:
+        engine = SyncEngine(store, store.project_root)
+    engine.on_source_changed(file_path, old, new)
+    # on_source_changed only snapshots files it re-anchored
+    store.save_cache(file_path, new)
+
+    result = AnchorResult(file_path, ANCHORED)
+    after = store.load_file(file_path)
+    for f in after.fragments if after is not None else ():
+        was = ranges.get(f.id)
+        r = f.range
+        if was is None or was == (r.start_line, r.start_col, r.end_line, r.end_col):
+            continue
+        if r.is_orphaned():
+            result.orphaned += 1
+        else:
+            result.shifted += 1
+    return result, entry
+
+
+def _anchor_chunk(
+    project_root: str, files: list[str], diff: DiffProvider | None,
+) -> list[tuple[AnchorResult, Entry | None]]:
+    """Worker entry point: re-anchor a batch of files with the project's own store."""
+    store = open_store(Path(project_root))
+    engine = SyncEngine(store, store.project_root, diff)
+    return [anchor_file(store, rel, engine) for rel in files]
+
+
+def _anchor_files(
+    store: FragmentStore, files: list[str], workers: int | None, diff: DiffProvider | None,
+) -> Iterator[tuple[AnchorResult, Entry | None]]:
+    # In this process, reuse the caller's store and one engine for every file
+    engine = SyncEngine(store, store.project_root, diff)
+    return map_batches(
+        partial(_anchor_chunk, str(store.project_root)),
+        files,
+        workers,
+        batch_args=lambda batch: (diff.restrict(batch) if diff is not None else None,),
+        local=lambda batch: [anchor_file(store, rel, engine) for rel in batch],
+    )
+
+
+def anchor_project(
+    store: FragmentStore,
+    files: Iterable[str] | None = None,
+    workers: int | None = None,
+    diff: DiffProvider | None = None,
+) -> AnchorReport:
+    """Re-anchor files (default: every file with fragments) that changed since their snapshot.
+
+    diff supplies the line edits (default: difflib on each file's texts).
+
+    Workers open the project's store themselves (open_store), so with more
+    than one worker the store's settings come from .pyweb/config.json.
+    Results are in the order of files.
+    """
+    t0 = time.perf_counter()
+    everything = files is None
+    files = store.list_files() if everything else list(files)
+    # Taken before the read, so a concurrent rewrite only makes it stricter
+    written = _index_mtime(store)
+    index = load_index(store)
+    entries: dict[str, Entry] = {}
+    results: dict[str, AnchorResult] = {}
+    report = AnchorReport([])
+
+    # stat: skip files unchanged since they last matched an unchanged snapshot
+    to_hash: list[tuple[str, str | None]] = []
+    racy = False
+    for rel in files:
+        digest = store.snapshots.digest(rel)
+        try:
+            st = (store.project_root / rel).stat()
+        except OSError:
+            results[rel] = AnchorResult(rel, UNREADABLE)
+            continue
+        entry = index.get(rel)
+        if digest is not None and entry == [*fingerprint(st), digest]:
+            if written is not None and entry[0] < written:
+                results[rel] = AnchorResult(rel, UNCHANGED)
+                entries[rel] = entry
+                report.stat_matched += 1
+                continue
+            # Racily clean: rewrite the index after hashing, so the entry can be trusted next time
+            racy = True
+        to_hash.append((rel, digest))
+    t1 = time.perf_counter()
+
+    # hash: changed stat but maybe not changed text
+    to_anchor: list[str] = []
+    for rel, digest in to_hash:
+        if digest is None:
+            # No snapshot, or an old plain-copy one: leave it to anchor_file
+            to_anchor.append(rel)
+            continue
+        try:
+            current, fp = text_digest(store.project_root / rel)
+        except OSError:
+            results[rel] = AnchorResult(rel, UNREADABLE)
+            continue
+        report.hashed += 1
+        if current == digest:
+            results[rel] = AnchorResult(rel, UNCHANGED)
+            entries[rel] = [*fp, digest]
+        else:
+            to_anchor.append(rel)
+    t2 = time.perf_counter()
+
+    # anchor: diff against the snapshot and shift the fragments, in parallel
+    for result, entry in _anchor_files(store, to_anchor, workers, diff):
+        results[result.file] = result
+        if entry is not None:
+            entries[result.file] = entry
+    t3 = time.perf_counter()
+
+    if everything:
+        new_index = entries
+    else:
+        new_index = {f: e for f, e in index.items() if f not in results}
+        new_index.update(entries)
+    if racy or new_index != index:
+        _save_index(store, new_index)
+
+    report.results = [results[rel] for rel in files]
+    report.timings = {"stat": t1 - t0, "hash": t2 - t1, "anchor": t3 - t2,
+                      "total": time.perf_counter() - t0}
+    return report
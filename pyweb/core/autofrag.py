@@ -0,0 +1,279 @@
+"""Automatic fragmentation: wrap classes, functions and methods in markers.
+
+Python files are read with the ast module; other languages fall back to an
+indentation scan that treats a named header line followed by a more
+indented body as a definition. Every region of a file is added through one
+writer.Batch, so each file is parsed once and written once.
+"""
+from __future__ import annotations
+
+import ast
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from pyweb.core.comments import CommentStyle, get_comment_style, known_extensions
+from pyweb.core.lineindex import LineIndex
+from pyweb.core.project import is_binary, map_batches
+from pyweb.core.writer import Batch
+
+# Extensions with a comment style that are markup or config rather than code
+_NOT_CODE = {
+    ".html", ".xml", ".svg", ".vue", ".css", ".scss", ".less",
+    ".yaml", ".yml", ".toml", ".bat", ".cmd", ".sql",
+}
+CODE_EXTENSIONS = known_extensions() - _NOT_CODE
+
+# Line breaks str.splitlines() knows about but the Python tokenizer does not
+_OTHER_BREAKS = re.compile("[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_AST_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# Indentation fallback: a header names a definition if it matches one of these
+_DEF_RE = re.compile(
+    r"\b(?:class|struct|interface|enum|trait|impl|module|object|namespace|"
+    r"function|func|fn|def|sub|proc|procedure|defn|defmodule)\s+([A-Za-z_$][\w$.:]*)"
+)
+_CALL_RE = re.compile(r"([A-Za-z_$][\w$.:]*)\s*\(")
+_CONTROL = {
+    "if", "else", "elif", "for", "foreach", "while", "do", "until", "unless",
+    "switch", "case", "match", "when", "select", "try", "catch", "except",
+    "finally", "with", "using", "lock", "return", "loop",
+}
+_COMMENT_STARTS = ("//", "#", "/*", "*", "--", ";", "%", "<!--", "(*", "!")
+_CLOSER_RE = re.compile(r"^(?:[})\]]|end\b)")
+
+
+@dataclass
+class Region:
+    name: str
+    start_line: int   # 0-indexed
+    end_line: int     # exclusive
+
+
+# --- region finders ---
+
+def python_regions(source: str) -> list[Region] | None:
+    """Classes, functions and methods (with decorators), outermost first.
+
+    Returns None if the source does not parse as Python.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    line_of = _ast_line_mapper(source)
+    regions: list[Region] = []
+
+    def visit(body: list[ast.stmt], prefix: str) -> None:
+        for node in body:
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            first = min([node, *node.decorator_list], key=lambda n: (n.lineno, n.col_offset))
+            regions.append(Region(
+                prefix + node.name,
+                line_of(first.lineno, first.col_offset),
+                line_of(node.end_lineno, node.end_col_offset) + 1,
+            ))
+            if isinstance(node, ast.ClassDef):
+                visit(node.body, f"{prefix}{node.name}.")
+
+    visit(tree.body, "")
+    return regions
+
+
+def _ast_line_mapper(source: str):
+    """Map an ast (lineno, col_offset) to a str.splitlines() line number."""
+    if not _OTHER_BREAKS.search(source):
+        return lambda lineno, col: lineno - 1
+
+    # Form feeds and friends split lines for the parser but not for ast
+    starts = [0] + [m.end() for m in _AST_LINE_BREAK.finditer(source)]
+    index = LineIndex(source)
+
+    def line_of(lineno: int, col: int) -> int:
+        start = starts[lineno - 1]
+        end = starts[lineno] if lineno < len(starts) else len(source)
+        # col_offset counts UTF-8 bytes
+        chars = len(source[start:end].encode()[:col].decode(errors="ignore"))
+        return index.position(start + chars)[0]
+
+    return line_of
+
+
+def _header_name(line: str) -> str | None:
+    """Name of the definition a header line opens, if it looks like one."""
+    text = line.strip()
+    if not text or text.startswith(_COMMENT_STARTS) or _CLOSER_RE.match(text) or "@pyweb:" in text:
+        return None
+    if text.split(None, 1)[0].rstrip("({:") in _CONTROL:
+        return None
+    m = _DEF_RE.search(text) or _CALL_RE.search(text)
+    if m is None or m.group(1) in _CONTROL:
+        return None
+    return m.group(1)
+
+
+def indent_regions(source: str, max_depth: int = 2) -> list[Region]:
+    """Definitions found by indentation, for languages without a parser here.
+
+    A header line that names a definition, followed by more indented lines,
+    is a region; a closing line (}, ), ], end) at the header's indentation
+    is included, and so is a lone "{" on the line after the header.
+    Regions are searched max_depth levels deep, outermost first.
+    """
+    lines = source.splitlines()
+    widths = [
+        len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip()) if line.strip() else -1
+        for line in lines
+    ]
+    regions: list[Region] = []
+
+    def next_code(i: int, hi: int) -> int:
+        while i < hi and widths[i] < 0:
+            i += 1
+        return i
+
+    def scan(lo: int, hi: int, depth: int) -> None:
+        i = next_code(lo, hi)
+        while i < hi:
+            indent = widths[i]
+            name = _header_name(lines[i])
+            body = i + 1
+            k = next_code(body, hi)
+            if k < hi and widths[k] == indent and lines[k].strip() == "{":
+                body = k + 1
+
+            # Body: everything more indented than the header
+            last = None
+            j = next_code(body, hi)
+            while j < hi and widths[j] > indent:
+                last = j
+                j = next_code(j + 1, hi)
+            if name is None or last is None:
+                i = next_code(i + 1, hi)
+                continue
+
+            end = last + 1
+            if j < hi and widths[j] == indent and _CLOSER_RE.match(lines[j].strip()):
+                end = j + 1
+            regions.append(Region(name, i, end))
+            if depth + 1 < max_depth:
+                scan(body, end, depth + 1)
+            i = next_code(end, hi)
+
+    scan(0, len(lines), 0)
+    return regions
+
+
+def find_regions(source: str, file_path: str = "") -> list[Region]:
+    """Definitions to wrap: ast for Python files that parse, indentation otherwise."""
+    if Path(file_path).suffix.lower() in (".py", ".pyw"):
+        regions = python_regions(source)
+        if regions is not None:
+            return regions
+    return indent_regions(source)
+
+
+# --- applying ---
+
+def autofrag_source(
+    source: str,
+    file_path: str = "",
+    comment_style: CommentStyle | None = None,
+    min_lines: int = 1,
+) -> tuple[str, int]:
+    """Wrap every definition in markers. Returns (new_source, fragments added).
+
+    Definitions already wrapped by a fragment (one whose content starts on
+    the definition's first line and covers it) are skipped, so running it
+    again adds nothing.
+    """
+    batch = Batch(source, file_path, comment_style)
+    # content start line -> furthest content end of fragments starting there
+    wrapped: dict[int, int] = {}
+    for f in batch.parsed.fragments:
+        wrapped[f.content_start_line] = max(wrapped.get(f.content_start_line, -1), f.content_end_line)
+    added = 0
+    for r in find_regions(source, file_path):
+        if r.end_line - r.start_line < min_lines or wrapped.get(r.start_line, -1) >= r.end_line:
+            continue
+        batch.add(r.name, r.start_line, r.end_line)
+        added += 1
+    if not added:
+        return source, 0
+    return batch.apply(), added
+
+
+def autofrag_file(
+    path: Path,
+    file_path: str = "",
+    comment_style: CommentStyle | None = None,
+    min_lines: int = 1,
+    dry_run: bool = False,
+) -> int | None:
+    """Auto-fragment one file in place, keeping its line endings.
+
+    Returns the number of fragments added, or None if the file was skipped
+    (binary, not UTF-8, or mixed line endings).
+    """
+    if is_binary(path):
+        return None
+    try:
+        with path.open(encoding="utf-8") as fh:
+            source = fh.read()
+            newlines = fh.newlines
+    except UnicodeDecodeError:
+        return None
+    if isinstance(newlines, tuple):
+        return None
+
+    new_source, added = autofrag_source(source, file_path or path.name, comment_style, min_lines)
+    if added and not dry_run:
+        with path.open("w", encoding="utf-8", newline=newlines) as fh:
+            fh.write(new_source)
+    return added
+
+
+def _autofrag_chunk(
+    project_root: str,
+    files: list[str],
+    overrides: dict[str, dict] | None,
+    prefix: str | None,
+    suffix: str | None,
+    min_lines: int,
+    dry_run: bool,
+) -> list[tuple[str, int | None]]:
+    """Worker entry point: auto-fragment a batch of files, skipping unreadable ones."""
+    root = Path(project_root)
+    out: list[tuple[str, int | None]] = []
+    for rel in files:
+        cs = get_comment_style(rel, overrides=overrides, prefix=prefix, suffix=suffix)
+        try:
+            out.append((rel, autofrag_file(root / rel, rel, cs, min_lines, dry_run)))
+        except OSError:
+            out.append((rel, None))
+    return out
+
+
+def autofrag_project(
+    project_root: Path,
+    files: list[str],
+    workers: int | None = None,
+    overrides: dict[str, dict] | None = None,
+    prefix: str | None = None,
+    suffix: str | None = None,
+    min_lines: int = 1,
+    dry_run: bool = False,
+) -> Iterator[tuple[str, int | None]]:
+    """Auto-fragment files across a process pool, yielding (file, added) as they finish.
+
+    added is None for skipped files. Completion order is not the input order.
+    """
+    return map_batches(
+        partial(_autofrag_chunk, str(project_root), overrides=overrides, prefix=prefix,
+                suffix=suffix, min_lines=min_lines, dry_run=dry_run),
+        files, workers,
+    )
@@ -92,6 +92,11 @@ def load_config_overrides(project_root: Path) -> dict[str, dict]:
         return {}
 
 
+def known_extensions() -> frozenset[str]:
+    """File extensions with a built-in comment style."""
+    return frozenset(_DEFAULTS)
+
+
 def get_comment_style(
     file_path: str,
     overrides: dict[str, dict] | None = None,
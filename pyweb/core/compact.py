@@ -0,0 +1,262 @@
+"""Struct-of-arrays parse results for files with very many fragments.
+
+CompactParseResult stores the fragment tree as parallel array('i') columns
+(line numbers, parent index), one shared string table for ids, names and
+prose, and CSR-style offset arrays for children and prose lines. A fragment
+costs a few dozen bytes instead of a dataclass with two lists of its own;
+ParsedFragment objects are only materialized when asked for.
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator
+from functools import cached_property
+
+from pyweb.core.parser import ParsedFragment, ParseResult, ParseWarning, feed_markers
+
+
+class CompactParseResult:
+    def __init__(
+        self,
+        strings: list[str],
+        ids: array,
+        names: array,
+        start_lines: array,
+        end_lines: array,
+        content_start_lines: array,
+        content_end_lines: array,
+        parents: array,
+        child_offsets: array,
+        child_index: array,
+        prose_offsets: array,
+        prose_index: array,
+        warnings: list[ParseWarning],
+        line_count: int,
+    ) -> None:
+        self.strings = strings
+        self.ids = ids
+        self.names = names
+        self.start_lines = start_lines
+        self.end_lines = end_lines
+        self.content_start_lines = content_start_lines
+        self.content_end_lines = content_end_lines
+        self.parents = parents                  # parent fragment index, -1 for roots
+        self.child_offsets = child_offsets      # children of i: child_index[co[i]:co[i+1]]
+        self.child_index = child_index
+        self.prose_offsets = prose_offsets      # prose of i: prose_index[po[i]:po[i+1]]
+        self.prose_index = prose_index
+        self.warnings = warnings
+        self.line_count = line_count
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> ParsedFragment:
+        return self.fragment(i)
+
+    def __iter__(self) -> Iterator[ParsedFragment]:
+        for i in range(len(self)):
+            yield self.fragment(i)
+
+    # --- column access without materializing ---
+
+    def id_of(self, i: int) -> str:
+        return self.strings[self.ids[i]]
+
+    def name_of(self, i: int) -> str:
+        return self.strings[self.names[i]]
+
+    def children_of(self, i: int) -> array:
+        return self.child_index[self.child_offsets[i]:self.child_offsets[i + 1]]
+
+    def prose_lines_of(self, i: int) -> list[str]:
+        strings = self.strings
+        return [strings[s] for s in self.prose_index[self.prose_offsets[i]:self.prose_offsets[i + 1]]]
+
+    @cached_property
+    def _index_by_id(self) -> dict[str, int]:
+        strings = self.strings
+        return {strings[s]: i for i, s in enumerate(self.ids)}
+
+    def find(self, fid: str) -> int:
+        """Index of the fragment with this id, or -1."""
+        return self._index_by_id.get(fid, -1)
+
+    def roots(self) -> list[int]:
+        return [i for i, p in enumerate(self.parents) if p == -1]
+
+    # --- materialization ---
+
+    def fragment(self, i: int) -> ParsedFragment:
+        parent = self.parents[i]
+        return ParsedFragment(
+            id=self.id_of(i),
+            name=self.name_of(i),
+            start_line=self.start_lines[i],
+            end_line=self.end_lines[i],
+            content_start_line=self.content_start_lines[i],
+            content_end_line=self.content_end_lines[i],
+            children=[self.id_of(c) for c in self.children_of(i)],
+            prose_lines=self.prose_lines_of(i),
+            parent_id=self.id_of(parent) if parent != -1 else None,
+        )
+
+    def get(self, fid: str) -> ParsedFragment | None:
+        i = self.find(fid)
+        return self.fragment(i) if i != -1 else None
+
+    def to_result(self) -> ParseResult:
+        return ParseResult(fragments=list(self), warnings=list(self.warnings),
+                           line_count=self.line_count)
+
+    @staticmethod
+    def from_result(result: ParseResult) -> CompactParseResult:
+        builder = _CompactBuilder()
+        for f in result.fragments:
+            i = builder._new(f.id, f.name, f.start_line,
+                             builder.index[f.parent_id] if f.parent_id is not None else -1)
+            builder.end_lines[i] = f.end_line
+            builder.content_start_lines[i] = f.content_start_line
+            builder.content_end_lines[i] = f.content_end_line
+            for line in f.prose_lines:
+                builder.prose_index.append(builder._intern(line))
+        builder.warnings = list(result.warnings)
+        return builder.finish(result.line_count)
+
+
+class _CompactBuilder:
+    """Same stack machine as parser.TreeBuilder, writing straight into columns."""
+
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self._interned: dict[str, int] = {}
+        self.index: dict[str, int] = {}  # fragment id -> row
+        self.ids = array("i")
+        self.names = array("i")
+        self.start_lines = array("i")
+        self.end_lines = array("i")
+        self.content_start_lines = array("i")
+        self.content_end_lines = array("i")
+        self.parents = array("i")
+        self.prose_offsets = array("i")
+        self.prose_index = array("i")
+        self.stack: list[int] = []
+        self.warnings: list[ParseWarning] = []
+        self.collecting_prose_for = -1
+
+    def _intern(self, s: str) -> int:
+        idx = self._interned.get(s)
+        if idx is None:
+            idx = self._interned[s] = len(self.strings)
+            self.strings.append(s)
+        return idx
+
+    def _new(self, fid: str, name: str, lineno: int, parent: int) -> int:
+        i = len(self.ids)
+        self.index[fid] = i
+        self.ids.append(self._intern(fid))
+        self.names.append(self._intern(name))
+        self.start_lines.append(lineno)
+        self.end_lines.append(-1)
+        self.content_start_lines.append(lineno + 1)
+        self.content_end_lines.append(-1)
+        self.parents.append(parent)
+        # Prose only ever attaches to the most recently started fragment, so
+        # each fragment's prose is one contiguous run of prose_index.
+        self.prose_offsets.append(len(self.prose_index))
+        return i
+
+    def feed(self, lineno: int, kind: str, value: str, name: str | None) -> None:
+        stack = self.stack
+
+        if kind == "start":
+            if value in self.index:
+                self.warnings.append(ParseWarning(lineno, f"Duplicate fragment ID '{value}'"))
+                return
+            i = self._new(value, name, lineno, stack[-1] if stack else -1)
+            stack.append(i)
+            self.collecting_prose_for = i
+
+        elif kind == "end":
+            self.collecting_prose_for = -1
+            i = self.index.get(value)
+            if i is None:
+                self.warnings.append(ParseWarning(lineno, f"End marker for unknown fragment '{value}'"))
+                return
+
+            self.end_lines[i] = lineno + 1
+            self.content_end_lines[i] = lineno
+            while stack:
+                popped = stack.pop()
+                if popped == i:
+                    break
+                if self.end_lines[popped] == -1:
+                    self.end_lines[popped] = lineno
+                    self.content_end_lines[popped] = lineno
+                    self.warnings.append(ParseWarning(
+                        lineno,
+                        f"Fragment '{self.strings[self.names[popped]]}' "
+                        f"({self.strings[self.ids[popped]]}) auto-closed at end of "
+                        f"'{self.strings[self.names[i]]}'"
+                    ))
+
+        elif self.collecting_prose_for != -1:
+            self.prose_index.append(self._intern(value))
+            self.content_start_lines[self.collecting_prose_for] = lineno + 1
+
+        else:
+            self.warnings.append(ParseWarning(lineno, "Prose marker outside any fragment"))
+
+    def finish(self, line_count: int) -> CompactParseResult:
+        stack = self.stack
+        while stack:
+            i = stack.pop()
+            if self.end_lines[i] == -1:
+                self.end_lines[i] = line_count
+                self.content_end_lines[i] = line_count
+                self.warnings.append(ParseWarning(
+                    line_count - 1,
+                    f"Fragment '{self.strings[self.names[i]]}' "
+                    f"({self.strings[self.ids[i]]}) never closed, extends to EOF"
+                ))
+
+        n = len(self.ids)
+        self.prose_offsets.append(len(self.prose_index))
+
+        # CSR children: counting sort on parent keeps creation order per parent
+        child_offsets = array("i", bytes(4 * (n + 1)))
+        for p in self.parents:
+            if p != -1:
+                child_offsets[p + 1] += 1
+        for i in range(n):
+            child_offsets[i + 1] += child_offsets[i]
+        fill = array("i", child_offsets)
+        child_index = array("i", bytes(4 * child_offsets[n]))
+        for i, p in enumerate(self.parents):
+            if p != -1:
+                child_index[fill[p]] = i
+                fill[p] += 1
+
+        return CompactParseResult(
+            strings=self.strings,
+            ids=self.ids,
+            names=self.names,
+            start_lines=self.start_lines,
+            end_lines=self.end_lines,
+            content_start_lines=self.content_start_lines,
+            content_end_lines=self.content_end_lines,
+            parents=self.parents,
+            child_offsets=child_offsets,
+            child_index=child_index,
+            prose_offsets=self.prose_offsets,
+            prose_index=self.prose_index,
+            warnings=self.warnings,
+            line_count=line_count,
+        )
+
+
+def parse_markers_compact(source: str, file_path: str = "") -> CompactParseResult:
+    """Parse markers straight into a CompactParseResult, never creating ParsedFragments."""
+    builder = _CompactBuilder()
+    line_count, _ = feed_markers(builder, source)
+    return builder.finish(line_count)
@@ -0,0 +1,249 @@
+"""Editable text document for long editing sessions.
+
+A Document keeps the text as a list of blocks of lines (a shallow rope)
+with Fenwick trees over the per-block line and character counts. Finding
+a line or offset is O(log blocks) plus a scan of one block, and a splice
+only rewrites the blocks it touches, so repeated small edits never copy
+the whole text. The str form is built lazily and cached until the next
+edit.
+
+Line boundaries follow str.splitlines(), the same as parse_markers() and
+LineIndex, and the line-query methods mirror LineIndex so a Document can
+be used wherever a LineIndex is read.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+from itertools import chain, islice
+from pathlib import Path
+
+# Characters str.splitlines() treats as line breaks
+_BREAKS = frozenset("\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029")
+
+# Lines per block after a rebuild; blocks are split once twice this size
+_BLOCK = 512
+
+
+class _Fenwick:
+    """Prefix sums over a fixed number of slots with point updates."""
+
+    def __init__(self, values: list[int]) -> None:
+        n = len(values)
+        tree = [0] + values
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self.tree = tree
+        self.n = n
+        self.top = 1 << n.bit_length() if n else 0
+
+    def add(self, i: int, delta: int) -> None:
+        i += 1
+        tree = self.tree
+        while i <= self.n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Sum of slots [0, i)."""
+        total = 0
+        tree = self.tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, target: int) -> tuple[int, int]:
+        """(slot, sum before slot) for the first slot whose running sum exceeds target."""
+        pos = 0
+        rest = target
+        tree = self.tree
+        step = self.top
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and tree[nxt] <= rest:
+                pos = nxt
+                rest -= tree[nxt]
+            step >>= 1
+        return pos, target - rest
+
+
+class Document:
+    def __init__(self, text: str = "") -> None:
+        self._set_lines(text.splitlines(keepends=True))
+        self._text: str | None = text
+
+    @classmethod
+    def from_file(cls, path: Path) -> Document:
+        return cls(path.read_text())
+
+    def _set_lines(self, lines: list[str]) -> None:
+        self._blocks = [lines[i:i + _BLOCK] for i in range(0, len(lines), _BLOCK)] or [[]]
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._line_counts = _Fenwick([len(b) for b in self._blocks])
+        self._char_counts = _Fenwick([sum(map(len, b)) for b in self._blocks])
+        self._line_total = self._line_counts.prefix(len(self._blocks))
+        self._char_total = self._char_counts.prefix(len(self._blocks))
+
+    # --- materialization ---
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = "".join(chain.from_iterable(self._blocks))
+        return self._text
+
+    text = property(__str__)
+
+    def __len__(self) -> int:
+        return self._char_total
+
+    def write(self, path: Path) -> None:
+        path.write_text(str(self))
+
+    # --- line queries (same interface as LineIndex) ---
+
+    @property
+    def line_count(self) -> int:
+        return self._line_total
+
+    def _locate(self, line: int) -> tuple[int, int]:
+        """(block, index in block) of a line; line_count maps past the last block."""
+        if line == self._line_total:
+            return len(self._blocks) - 1, len(self._blocks[-1])
+        if not 0 <= line < self._line_total:
+            raise IndexError("line out of range")
+        b, before = self._line_counts.find(line)
+        return b, line - before
+
+    def iter_lines(self, start: int = 0, end: int | None = None) -> Iterator[str]:
+        """Lines [start, end), with their line breaks."""
+        end = self._line_total if end is None else end
+        if start >= end:
+            return
+        b, k = self._locate(start)
+        yield from islice(
+            chain(self._blocks[b][k:], chain.from_iterable(self._blocks[b + 1:])),
+            end - start,
+        )
+
+    def line(self, line: int) -> str:
+        """Text of a line, including its line break."""
+        b, k = self._locate(line)
+        if k == len(self._blocks[b]):
+            raise IndexError("line out of range")
+        return self._blocks[b][k]
+
+    def line_span(self, start: int, end: int) -> str:
+        """Text of lines [start, end)."""
+        return "".join(self.iter_lines(start, end))
+
+    def offset(self, line: int, col: int = 0) -> int:
+        """Absolute offset of (line, col). line may equal line_count (EOF)."""
+        b, k = self._locate(line)
+        return self._char_counts.prefix(b) + sum(map(len, self._blocks[b][:k])) + col
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """(line, col) of an absolute offset.
+
+        The end of the text is the end of the last line when that line has
+        no line break, and (line_count, 0) otherwise.
+        """
+        if not 0 <= offset <= self._char_total:
+            raise IndexError("offset out of range")
+        if offset == self._char_total:
+            last = self._line_total - 1
+            if last >= 0 and self.line(last)[-1] not in _BREAKS:
+                return last, len(self.line(last))
+            return self._line_total, 0
+        b, before = self._char_counts.find(offset)
+        line = self._line_counts.prefix(b)
+        rest = offset - before
+        for text in self._blocks[b]:
+            if rest < len(text):
+                return line, rest
+            rest -= len(text)
+            line += 1
+        raise AssertionError("unreachable")
+
+    def indent(self, line: int) -> str:
+        """Leading whitespace of a line ("" past EOF)."""
+        if line >= self._line_total:
+            return ""
+        content = self.line(line)
+        return content[: len(content) - len(content.lstrip())]
+
+    def line_length(self, line: int) -> int:
+        """Length of a line without its line break."""
+        content = self.line(line)
+        return len(content.splitlines()[0]) if content else 0
+
+    # --- editing ---
+
+    def splice(self, start: int, end: int, text: str) -> None:
+        """Replace characters [start, end) with text."""
+        if not 0 <= start <= end <= self._char_total:
+            raise IndexError("splice range out of bounds")
+        if start == end and not text:
+            return
+        l0, c0 = self.position(start)
+        l1, c1 = self.position(end)
+
+        first, last = l0, l1 + 1 if c1 else l1
+        new = (self.line(l0)[:c0] if c0 else "") + text + (self.line(l1)[c1:] if c1 else "")
+        self._resplit(first, last, new)
+
+    def replace_lines(self, start_line: int, end_line: int, text: str) -> None:
+        """Replace lines [start_line, end_line) with text (clamped to the document)."""
+        start_line = min(start_line, self._line_total)
+        end_line = max(start_line, min(end_line, self._line_total))
+        if start_line == end_line and not text:
+            return
+        self._resplit(start_line, end_line, text)
+
+    def _resplit(self, first: int, last: int, new: str) -> None:
+        """Replace lines [first, last) with the lines of new.
+
+        The range is widened so new starts and ends on line boundaries of
+        the result, re-splitting only the lines the edit touches.
+        """
+        prev_end = self.line(first - 1)[-1] if first > 0 else "\n"
+        if prev_end == "\r" or prev_end not in _BREAKS:
+            # A CR that may pair with an LF, or an unterminated last line
+            first -= 1
+            new = self.line(first) + new
+        if new and last < self._line_total and (
+            new[-1] not in _BREAKS or (new[-1] == "\r" and self.line(last).startswith("\n"))
+        ):
+            new += self.line(last)
+            last += 1
+        self._replace(first, last, new.splitlines(keepends=True))
+
+    def _replace(self, first: int, last: int, new_lines: list[str]) -> None:
+        """Replace whole lines [first, last) with new_lines."""
+        self._text = None
+        b0, k0 = self._locate(first)
+        b1, k1 = self._locate(last)
+        if b0 == b1:
+            block = self._blocks[b0]
+            old_chars = sum(map(len, block[k0:k1]))
+            block[k0:k1] = new_lines
+            if len(block) <= 2 * _BLOCK and (block or len(self._blocks) == 1):
+                d_lines = len(new_lines) - (k1 - k0)
+                d_chars = sum(map(len, new_lines)) - old_chars
+                self._line_counts.add(b0, d_lines)
+                self._char_counts.add(b0, d_chars)
+                self._line_total += d_lines
+                self._char_total += d_chars
+                return
+            merged = block
+        else:
+            merged = self._blocks[b0][:k0] + new_lines + self._blocks[b1][k1:]
+        # Block structure changed: re-chunk the touched blocks and rebuild the sums
+        chunks = [merged[i:i + _BLOCK] for i in range(0, len(merged), _BLOCK)]
+        self._blocks[b0:b1 + 1] = chunks
+        if not self._blocks:
+            self._blocks = [[]]
+        self._reindex()
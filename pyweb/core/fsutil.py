@@ -0,0 +1,92 @@
+"""File helpers shared by the on-disk stores under .pyweb/."""
+from __future__ import annotations
+
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers are not serialized
+    fcntl = None
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Permissions for new files, as open() would create them (mkstemp uses 0600)
+FILE_MODE = 0o666 & ~_umask()
+
+
+def fingerprint(st: os.stat_result) -> tuple[int, int, int]:
+    """(mtime_ns, size, inode): what a stat-based "unchanged" check compares."""
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def atomic_write(path: Path, data: bytes, sync_dir: bool = False) -> None:
+    """Replace path with data: written to a temp file beside it, fsynced, renamed over it.
+
+    Readers see the old file or the new one, never a partial write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+    if sync_dir:
+        fsync_dir(path.parent)
+
+
+def fsync_dir(path: Path) -> None:
+    """Make renames and unlinks in a directory durable (a no-op where unsupported)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive fcntl lock on path (created if missing) for the block."""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# File timestamps are truncated to the filesystem's granularity (up to 2 s on
+# FAT, a clock tick on Linux), so a write just after a read can carry an mtime
+# older than the read itself.
+RACY_MARGIN_NS = 2_000_000_000
+
+
+def racily_clean(mtime_ns: int, read_ns: int) -> bool:
+    """Whether a file may have changed since it was read at read_ns (time.time_ns()).
+
+    A file whose mtime is not safely older than the read could have been
+    edited again within the same timestamp tick, so its stat cannot be
+    trusted and its content must be compared instead.
+    """
+    return mtime_ns + RACY_MARGIN_NS >= read_ns
@@ -0,0 +1,173 @@
+"""Line edits from `git diff`, for a whole tree in one subprocess call.
+
+GitDiffProvider runs `git diff -U0 <base>` once over the project and turns
+every hunk header straight into a LineEdit, so re-anchoring after a pull
+(base ORIG_HEAD) or over uncommitted work (base HEAD) needs no Python diff
+per file.
+
+git's hunks only apply if the snapshot being anchored from is the file's
+text at base and the text read now is what git diffed. Both are checked
+against the blob ids in the diff, and a file that fails (snapshot from
+another revision, CRLF or filtered checkouts, line breaks other than LF
+that str.splitlines() would also split on) is diffed with difflib instead.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from pyweb.core.anchorer import DiffProvider, LineEdit
+
+_HUNK = re.compile(rb"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Line breaks str.splitlines() honours that git does not (git splits on LF only)
+_OTHER_BREAKS = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+_ESCAPES = {b"a": 7, b"b": 8, b"t": 9, b"n": 10, b"v": 11, b"f": 12, b"r": 13,
+            b'"': 34, b"\\": 92}
+
+
+@dataclass
+class FileDiff:
+    old_id: str   # blob id at base ("000..." for a new file)
+    new_id: str   # blob id of the working tree file
+    edits: list[LineEdit] = field(default_factory=list)
+
+
+def blob_id(data: bytes, length: int = 40) -> str:
+    """git's object id for a blob with this content (sha1, or sha256 for 64-hex ids)."""
+    h = hashlib.sha256() if length == 64 else hashlib.sha1()
+    h.update(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def _unquote(path: bytes) -> bytes:
+    """A path as git prints it in ---/+++ lines: C-quoted if it has special characters."""
+    if not path.startswith(b'"'):
+        # Paths with spaces get a trailing tab
+        return path.rstrip(b"\t")
+    out = bytearray()
+    i, end = 1, path.rindex(b'"')
+    while i < end:
+        c = path[i:i + 1]
+        if c != b"\\":
+            out += c
+            i += 1
+        elif path[i + 1:i + 2] in _ESCAPES:
+            out.append(_ESCAPES[path[i + 1:i + 2]])
+            i += 2
+        else:
+            out.append(int(path[i + 1:i + 4], 8))
+            i += 4
+    return bytes(out)
+
+
+def parse_unified_diff(data: bytes) -> dict[str, FileDiff]:
+    """Parse `git diff --full-index -U0` output into each changed file's line edits.
+
+    Files are keyed by their path on the new side (a/ and b/ prefixes
+    stripped). Deleted and binary files are left out.
+    """
+    files: dict[str, FileDiff] = {}
+    ids: tuple[str, str] | None = None
+    current: FileDiff | None = None
+    old_left = new_left = 0
+    for line in data.split(b"\n"):
+        if old_left or new_left:
+            # Hunk body: with -U0 only removed and added lines
+            if line.startswith(b"-"):
+                old_left -= 1
+            elif line.startswith(b"+"):
+                new_left -= 1
+            elif line.startswith(b" "):
+                old_left -= 1
+                new_left -= 1
+            continue
+        if line.startswith(b"diff --git "):
+            ids = None
+            current = None
+        elif line.startswith(b"index "):
+            old, _, new = line[6:].split(b" ", 1)[0].partition(b"..")
+            ids = old.decode(), new.decode()
+        elif line.startswith(b"+++ "):
+            path = _unquote(line[4:])
+            if ids is not None and path.startswith(b"b/"):
+                current = FileDiff(*ids)
+                files[path[2:].decode("utf-8", "surrogateescape")] = current
+        elif line.startswith(b"@@ ") and current is not None:
+            m = _HUNK.match(line)
+            if m is None:
+                continue
+            old_start, old_count, _, new_count = m.groups()
+            old_left = 1 if old_count is None else int(old_count)
+            new_left = 1 if new_count is None else int(new_count)
+            # A pure insertion names the line it follows; anything else its first line
+            start = int(old_start) if old_left == 0 else int(old_start) - 1
+            current.edits.append(LineEdit(start, old_left, new_left))
+    return files
+
+
+def git_diff(project_root: Path, base: str = "HEAD", paths: list[str] | None = None) -> bytes:
+    """`git diff -U0` of the working tree under project_root against base, paths relative to it."""
+    cmd = [
+        "git", "-c", "core.quotePath=false", "diff", "--no-color", "--no-ext-diff",
+        "--no-textconv", "--no-renames", "--full-index", "--relative", "-U0",
+        "--src-prefix=a/", "--dst-prefix=b/", base, "--",
+    ]
+    if paths is not None:
+        cmd += paths
+    proc = subprocess.run(cmd, cwd=project_root, capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"git diff {base} failed: {proc.stderr.decode(errors='replace').strip()}"
+        )
+    return proc.stdout
+
+
+class GitDiffProvider(DiffProvider):
+    """Line edits from one `git diff` of the working tree against base.
+
+    Files git reports no usable hunks for, or whose texts do not match the
+    blobs git diffed, are diffed with difflib. hits and fallbacks count
+    both kinds of lookup.
+    """
+
+    def __init__(self, files: dict[str, FileDiff]) -> None:
+        self.files = files
+        self.hits = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_git(
+        cls, project_root: Path, base: str = "HEAD", paths: list[str] | None = None,
+    ) -> GitDiffProvider:
+        """Run git diff once for project_root (or just paths). Raises RuntimeError if git fails."""
+        try:
+            return cls(parse_unified_diff(git_diff(project_root, base, paths)))
+        except OSError as e:
+            raise RuntimeError(f"git is not available: {e}") from e
+
+    def line_edits(self, file_path: str, old_content: str, new_content: str) -> list[LineEdit]:
+        diff = self.files.get(file_path)
+        if diff is not None and self._matches(diff, old_content, new_content):
+            self.hits += 1
+            return diff.edits
+        self.fallbacks += 1
+        return super().line_edits(file_path, old_content, new_content)
+
+    @staticmethod
+    def _matches(diff: FileDiff, old_content: str, new_content: str) -> bool:
+        if _OTHER_BREAKS.search(old_content) or _OTHER_BREAKS.search(new_content):
+            return False
+        length = len(diff.old_id)
+        return (
+            blob_id(old_content.encode("utf-8", "surrogateescape"), length) == diff.old_id
+            and blob_id(new_content.encode("utf-8", "surrogateescape"), length) == diff.new_id
+        )
+
+    def restrict(self, files: list[str]) -> GitDiffProvider:
+        return GitDiffProvider({f: self.files[f] for f in files if f in self.files})
@@ -0,0 +1,53 @@
+"""Line-start offset table for mapping between lines, columns and offsets."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class LineIndex:
+    """Offsets of every line start in a text, built once with one splitlines() pass.
+
+    Line boundaries follow str.splitlines(), the same as parse_markers(), so
+    fragment line numbers map directly onto offsets. Offsets and columns are
+    in code points of `text`.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        # starts[i] is the offset of line i; starts[line_count] == len(text)
+        self.starts = array("q", accumulate(map(len, text.splitlines(keepends=True)), initial=0))
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts) - 1
+
+    def offset(self, line: int, col: int = 0) -> int:
+        """Absolute offset of (line, col). line may equal line_count (EOF)."""
+        return self.starts[line] + col
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """(line, col) of an absolute offset."""
+        line = min(bisect_right(self.starts, offset) - 1, max(self.line_count - 1, 0))
+        return line, offset - self.starts[line]
+
+    def line(self, line: int) -> str:
+        """Text of a line, including its line break."""
+        return self.text[self.starts[line]:self.starts[line + 1]]
+
+    def line_span(self, start: int, end: int) -> str:
+        """Text of lines [start, end), as one slice."""
+        return self.text[self.starts[start]:self.starts[end]]
+
+    def indent(self, line: int) -> str:
+        """Leading whitespace of a line ("" past EOF)."""
+        if line >= self.line_count:
+            return ""
+        content = self.line(line)
+        return content[: len(content) - len(content.lstrip())]
+
+    def line_length(self, line: int) -> int:
+        """Length of a line without its line break."""
+        content = self.line(line)
+        return len(content.splitlines()[0]) if content else 0
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import json
 import uuid
+from bisect import bisect_left, bisect_right, insort
 from dataclasses import dataclass, field
+from itertools import accumulate, chain, repeat
+from operator import attrgetter
 from pathlib import Path
 
 
@@ -54,6 +57,12 @@ class Range:
         )
 
 
+# Version written by FileFragments.to_columnar()
+COLUMNAR_VERSION = 1
+
+_RANGE_FIELDS = attrgetter("start_line", "start_col", "end_line", "end_col")
+
+
 def _new_id() -> str:
     return uuid.uuid4().hex[:8]
 
@@ -89,16 +98,296 @@ class Fragment:
         )
 
 
+# Sort key of a range: start position, then end position
+_RangeKey = tuple[int, int, int, int]
+
+
+def _key(r: Range) -> _RangeKey:
+    return (r.start_line, r.start_col, r.end_line, r.end_col)
+
+
+_COL = 1 << 32
+
+
+def _pos(line: int, col: int) -> int:
+    """(line, col) as one int with the same ordering (columns clamped to 32 bits)."""
+    return line * _COL + min(max(col, -_COL // 2), _COL // 2 - 1)
+
+
+def _overlap(a: _RangeKey, b: _RangeKey) -> bool:
+    """Range.overlaps() on range keys."""
+    return a[:2] < b[2:] and b[:2] < a[2:]
+
+
+class _FragmentIndex:
+    """Lookup tables over a fragment list.
+
+    siblings maps a parent ID (None for roots) to its children's
+    (range key, ID) pairs in range order. Non-overlapping siblings sorted
+    by start are also sorted by end, which is what makes the overlap
+    check a bisection; tangled counts overlapping neighbours and inverted
+    ranges per list, for lists where that does not hold.
+    """
+
+    def __init__(self, fragments: list[Fragment]) -> None:
+        self.fragments = fragments
+        self.size = len(fragments)
+        # First fragment wins on duplicate IDs, as in a linear search
+        self.by_id: dict[str, Fragment] = {f.id: f for f in reversed(fragments)}
+        parent: dict[str, str] = {}
+        for f in fragments:
+            for cid in f.children:
+                parent.setdefault(cid, f.id)
+        self.parent = parent
+        # Lists exist for roots and for fragments with children
+        siblings: dict[str | None, list[tuple[_RangeKey, str]]] = {None: []}
+        tangled: dict[str | None, int] = {}
+        for f in fragments:
+            key = _key(f.range)
+            pid = parent.get(f.id)
+            entries = siblings.get(pid)
+            if entries is None:
+                entries = siblings[pid] = []
+            entries.append((key, f.id))
+            if key[:2] > key[2:]:  # inverted ranges break the ordering too
+                tangled[pid] = tangled.get(pid, 0) + 1
+        for pid, entries in siblings.items():
+            if len(entries) > 1:
+                entries.sort()
+                bad = sum(_overlap(a[0], b[0]) for a, b in zip(entries, entries[1:]))
+                if bad:
+                    tangled[pid] = tangled.get(pid, 0) + bad
+        self.siblings = siblings
+        self.tangled = tangled
+        # Position lookup table, built by stab_table() and dropped on range changes
+        self.stab: tuple[list[int], list[Fragment | None]] | None = None
+
+    def _retangle(self, pid: str | None, entries: list, i: int, sign: int) -> None:
+        """Account for entries[i] joining (sign=1) or leaving (-1) its neighbours."""
+        key = entries[i][0]
+        before = entries[i - 1][0] if i > 0 else None
+        after = entries[i + 1][0] if i + 1 < len(entries) else None
+        delta = (before is not None and _overlap(before, key)) + (after is not None and _overlap(key, after))
+        delta += key[:2] > key[2:]  # inverted ranges break the ordering too
+        if before is not None and after is not None:
+            delta -= _overlap(before, after)
+        if delta:
+            self.tangled[pid] = self.tangled.get(pid, 0) + sign * delta
+
+    def stab_table(self) -> tuple[list[int], list[Fragment | None]]:
+        """(bounds, owners): owners[i] is the fragment at every position in [bounds[i], bounds[i+1]).
+
+        The bounds are all range starts and ends, as _pos() ints. Sweeping them with the set
+        of ranges open at each point gives each segment's owner: the first
+        containing fragment in list order, replaced by any later one strictly
+        inside it. That is the deepest fragment when ranges nest, and stays
+        well defined when they do not. Cost is O(n log n + n * depth).
+        """
+        if self.stab is not None:
+            return self.stab
+        frags = self.fragments
+        starts = [_pos(f.range.start_line, f.range.start_col) for f in frags]
+        ends = [_pos(f.range.end_line, f.range.end_col) for f in frags]
+        opens: dict[int, list[int]] = {}
+        closes: dict[int, list[int]] = {}
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            if start < end:
+                opens.setdefault(start, []).append(i)
+                closes.setdefault(end, []).append(i)
+        bounds = sorted(opens.keys() | closes.keys())
+
+        owners: list[Fragment | None] = []
+        active: list[int] = []  # list positions of the open ranges, ascending
+        for pos in bounds:
+            for i in closes.get(pos, ()):
+                del active[bisect_left(active, i)]
+            for i in opens.get(pos, ()):
+                insort(active, i)
+            if not active:
+                owners.append(None)
+                continue
+            best = active[0]
+            for i in active[1:]:
+                # i strictly inside best
+                if starts[best] <= starts[i] and ends[i] <= ends[best] and (
+                    starts[i] != starts[best] or ends[i] != ends[best]
+                ):
+                    best = i
+            owners.append(frags[best])
+        self.stab = (bounds, owners)
+        return self.stab
+
+    def unlink(self, fid: str, parent_id: str | None) -> None:
+        entries = self.siblings[parent_id]
+        i = bisect_left(entries, (_key(self.by_id[fid].range), fid))
+        self._retangle(parent_id, entries, i, -1)
+        del entries[i]
+
+    def link(self, fid: str, parent_id: str | None) -> None:
+        entries = self.siblings.setdefault(parent_id, [])
+        entry = (_key(self.by_id[fid].range), fid)
+        i = bisect_left(entries, entry)
+        entries.insert(i, entry)
+        self._retangle(parent_id, entries, i, 1)
+
+
 @dataclass
 class FileFragments:
     file: str
     content_hash: str
     fragments: list[Fragment] = field(default_factory=list)
+    # Bumped by every save, so writers can tell whether the file changed
+    # since they loaded it
+    generation: int = field(default=0, compare=False)
+    # Built on first lookup and kept up to date by the mutation methods
+    # below. Replacing or appending to `fragments` is noticed; any other
+    # direct change to ranges or children needs reindex().
+    _index: _FragmentIndex | None = field(default=None, init=False, repr=False, compare=False)
+
+    # --- indexed lookups ---
+
+    def _idx(self) -> _FragmentIndex:
+        idx = self._index
+        if idx is None or idx.fragments is not self.fragments or idx.size != len(self.fragments):
+            idx = self._index = _FragmentIndex(self.fragments)
+        return idx
+
+    def reindex(self) -> None:
+        """Drop the lookup index after editing fragments directly."""
+        self._index = None
+
+    def get(self, fragment_id: str) -> Fragment | None:
+        return self._idx().by_id.get(fragment_id)
+
+    def parent_of(self, fragment_id: str) -> Fragment | None:
+        idx = self._idx()
+        pid = idx.parent.get(fragment_id)
+        return idx.by_id.get(pid) if pid is not None else None
+
+    def roots(self) -> list[Fragment]:
+        """Fragments without a parent, in list order."""
+        parent = self._idx().parent
+        return [f for f in self.fragments if f.id not in parent]
+
+    def children_of(self, fragment_id: str) -> list[Fragment]:
+        idx = self._idx()
+        frag = idx.by_id.get(fragment_id)
+        if frag is None:
+            return []
+        return [idx.by_id[cid] for cid in frag.children if cid in idx.by_id]
+
+    def overlapping_sibling(
+        self, parent_id: str | None, range: Range, exclude: str | None = None,
+    ) -> Fragment | None:
+        """First child of parent_id (a root if None) overlapping range.
+
+        "First" is in children order, or list order for roots.
+        """
+        idx = self._idx()
+        entries = idx.siblings.get(parent_id, [])
+        key = _key(range)
+        if idx.tangled.get(parent_id):
+            hits = [fid for k, fid in entries if _overlap(k, key)]
+        else:
+            # Siblings starting before range ends; the ones that overlap are
+            # the tail of that prefix whose ends lie past range's start
+            hits = []
+            i = bisect_left(entries, (key[2:],))
+            while i > 0 and entries[i - 1][0][2:] > key[:2]:
+                i -= 1
+                hits.append(entries[i][1])
+        hits = [fid for fid in hits if fid != exclude]
+        if len(hits) <= 1:
+            return idx.by_id[hits[0]] if hits else None
+        order = idx.by_id[parent_id].children if parent_id is not None else [f.id for f in self.fragments]
+        rank = {fid: i for i, fid in reversed(list(enumerate(order)))}
+        return idx.by_id[min(hits, key=rank.__getitem__)]
+
+    def fragment_at(self, line: int, col: int) -> Fragment | None:
+        """Deepest fragment whose range contains (line, col), in O(log n)."""
+        bounds, owners = self._idx().stab_table()
+        i = bisect_right(bounds, _pos(line, col)) - 1
+        return owners[i] if i >= 0 else None
+
+    def fragments_at(self, positions: list[tuple[int, int]]) -> list[Fragment | None]:
+        """fragment_at() for many (line, col) positions, sharing one lookup table."""
+        bounds, owners = self._idx().stab_table()
+        result: list[Fragment | None] = []
+        for line, col in positions:
+            i = bisect_right(bounds, _pos(line, col)) - 1
+            result.append(owners[i] if i >= 0 else None)
+        return result
+
+    # --- mutations (keep the index consistent) ---
+
+    def add(self, frag: Fragment, parent_id: str | None = None) -> None:
+        """Append frag as the last child of parent_id, or as a root."""
+        idx = self._idx()
+        self.fragments.append(frag)
+        idx.size += 1
+        idx.by_id[frag.id] = frag
+        if parent_id is not None:
+            idx.by_id[parent_id].children.append(frag.id)
+            idx.parent[frag.id] = parent_id
+        idx.link(frag.id, parent_id)
+        idx.stab = None
+
+    def remove(self, fragment_id: str) -> None:
+        """Delete a fragment; its children take its place in its parent."""
+        idx = self._idx()
+        frag = idx.by_id[fragment_id]
+        parent_id = idx.parent.get(fragment_id)
+        if parent_id is not None:
+            parent = idx.by_id[parent_id]
+            i = parent.children.index(fragment_id)
+            parent.children[i:i + 1] = frag.children
+        i = next(i for i, f in enumerate(self.fragments) if f is frag)
+        del self.fragments[i]
+        if parent_id == fragment_id:
+            # Its own child: leave it to a full rebuild
+            self._index = None
+            return
+
+        idx.size -= 1
+        idx.unlink(fragment_id, parent_id)
+        idx.parent.pop(fragment_id, None)
+        for _, cid in idx.siblings.pop(fragment_id, ()):
+            if parent_id is None:
+                del idx.parent[cid]
+            else:
+                idx.parent[cid] = parent_id
+            idx.link(cid, parent_id)
+        idx.tangled.pop(fragment_id, None)
+        del idx.by_id[fragment_id]
+        idx.stab = None
+
+    def move(self, fragment_id: str, new_parent_id: str | None) -> None:
+        """Make a fragment the last child of new_parent_id, or a root."""
+        idx = self._idx()
+        old_parent_id = idx.parent.pop(fragment_id, None)
+        if old_parent_id is not None:
+            idx.by_id[old_parent_id].children.remove(fragment_id)
+        idx.unlink(fragment_id, old_parent_id)
+        if new_parent_id is not None:
+            idx.by_id[new_parent_id].children.append(fragment_id)
+            idx.parent[fragment_id] = new_parent_id
+        idx.link(fragment_id, new_parent_id)
+
+    def set_range(self, fragment_id: str, range: Range) -> None:
+        idx = self._idx()
+        parent_id = idx.parent.get(fragment_id)
+        idx.unlink(fragment_id, parent_id)
+        idx.by_id[fragment_id].range = range
+        idx.stab = None
+        idx.link(fragment_id, parent_id)
+
+    # --- serialization ---
 
     def to_dict(self) -> dict:
         return {
             "file": self.file,
             "content_hash": self.content_hash,
+            "generation": self.generation,
             "fragments": [f.to_dict() for f in self.fragments],
         }
 
@@ -108,6 +397,7 @@ class FileFragments:
             file=d["file"],
             content_hash=d["content_hash"],
             fragments=[Fragment.from_dict(f) for f in d.get("fragments", [])],
+            generation=d.get("generation", 0),
         )
 
     def to_json(self) -> str:
@@ -115,4 +405,60 @@ class FileFragments:
 
     @staticmethod
     def from_json(text: str) -> FileFragments:
-        return FileFragments.from_dict(json.loads(text))
+        """Read either sidecar encoding (to_json() or to_columnar())."""
+        d = json.loads(text)
+        if d.get("format") == "columnar":
+            return FileFragments._from_columnar(d)
+        return FileFragments.from_dict(d)
+
+    def to_columnar(self) -> str:
+        """Compact JSON: one array per field instead of one object per fragment.
+
+        Ranges are one flat array of four ints per fragment, children are
+        CSR-style (child_offsets[i]:child_offsets[i + 1] into child_ids),
+        and prose is sparse. Fragment files are only written when some
+        differ from the sidecar's file.
+        """
+        frags = self.fragments
+        ranges = [f.range for f in frags]
+        child_offsets = [0, *accumulate(len(f.children) for f in frags)]
+        prose_index = [i for i, f in enumerate(frags) if f.prose is not None]
+        d = {
+            "format": "columnar",
+            "version": COLUMNAR_VERSION,
+            "file": self.file,
+            "content_hash": self.content_hash,
+            "generation": self.generation,
+            "ids": [f.id for f in frags],
+            "names": [f.name for f in frags],
+            "ranges": list(chain.from_iterable(map(_RANGE_FIELDS, ranges))),
+            "child_offsets": child_offsets,
+            "child_ids": list(chain.from_iterable(f.children for f in frags)),
+            "prose_index": prose_index,
+            "prose": [frags[i].prose for i in prose_index],
+        }
+        if any(f.file != self.file for f in frags):
+            d["files"] = [f.file for f in frags]
+        return json.dumps(d, separators=(",", ":"))
+
+    @staticmethod
+    def _from_columnar(d: dict) -> FileFragments:
+        if d.get("version", 1) > COLUMNAR_VERSION:
+            raise ValueError(f"Unsupported columnar sidecar version {d['version']}")
+        ids = d["ids"]
+        flat = iter(d["ranges"])
+        offsets = d["child_offsets"]
+        child_ids = d["child_ids"]
+        prose: list[str | None] = [None] * len(ids)
+        for i, text in zip(d["prose_index"], d["prose"]):
+            prose[i] = text
+        fragments = list(map(
+            Fragment,
+            ids,
+            d["names"],
+            d.get("files") or repeat(d["file"]),
+            map(Range, flat, flat, flat, flat),
+            [child_ids[a:b] for a, b in zip(offsets, offsets[1:])],
+            prose,
+        ))
+        return FileFragments(d["file"], d["content_hash"], fragments, d.get("generation", 0))
@@ -0,0 +1,241 @@
+"""Persistent parse-result cache under .pyweb/cache/parse/.
+
+One compact JSON entry per source file holds the serialized ParseResult plus
+the file's stat fingerprint (mtime_ns, size, inode), content hash and the
+time it was read. A matching stat is trusted outright when the file's mtime is
+safely older than that read, so hits never read or decode the source;
+otherwise (a changed stat, or a racily clean file that may have been edited
+again in the same timestamp tick) the content hash decides. Entries are
+evicted least-recently-used once the directory grows past max_bytes; a
+running total of its size keeps writes from rescanning it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from pyweb.core.fsutil import fingerprint, racily_clean
+from pyweb.core.parser import ParsedFragment, ParseResult, ParseWarning, parse_markers
+
+FORMAT_VERSION = 4
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    total_bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+
+
+def _encode(result: ParseResult) -> dict:
+    return {
+        "line_count": result.line_count,
+        "fragments": [
+            [f.id, f.name, f.start_line, f.end_line, f.content_start_line,
+             f.content_end_line, f.parent_id, f.prose_lines]
+            for f in result.fragments
+        ],
+        "warnings": [[w.line, w.message] for w in result.warnings],
+        "markers": result.markers,
+        "offsets": list(result.offsets.items()) if result.offsets is not None else None,
+        "char_offsets": list(result.char_offsets.items()) if result.char_offsets is not None else None,
+        "columns": [[line, *cols] for line, cols in result.columns.items()]
+        if result.columns is not None else None,
+    }
+
+
+def _decode(d: dict) -> ParseResult:
+    fragments: list[ParsedFragment] = []
+    by_id: dict[str, ParsedFragment] = {}
+    for fid, name, start, end, cstart, cend, parent_id, prose_lines in d["fragments"]:
+        pf = ParsedFragment(
+            id=fid, name=name, start_line=start, end_line=end,
+            content_start_line=cstart, content_end_line=cend,
+            prose_lines=prose_lines, parent_id=parent_id,
+        )
+        # Children are recorded in creation order, which is fragment order
+        if parent_id is not None and parent_id in by_id:
+            by_id[parent_id].children.append(fid)
+        by_id[fid] = pf
+        fragments.append(pf)
+    markers = d.get("markers")
+    offsets = d.get("offsets")
+    char_offsets = d.get("char_offsets")
+    columns = d.get("columns")
+    return ParseResult(
+        fragments=fragments,
+        warnings=[ParseWarning(line, msg) for line, msg in d["warnings"]],
+        line_count=d["line_count"],
+        markers=[tuple(m) for m in markers] if markers is not None else None,
+        offsets=dict(offsets) if offsets is not None else None,
+        char_offsets=dict(char_offsets) if char_offsets is not None else None,
+        columns={line: (indent, length) for line, indent, length in columns}
+        if columns is not None else None,
+    )
+
+
+class ParseCache:
+    def __init__(self, project_root: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.project_root = project_root.resolve()
+        self.cache_dir = self.project_root / ".pyweb" / "cache" / "parse"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bytes in cache_dir, counted on the first write and kept up to date by put()
+        self._total: int | None = None
+
+    def _entry_path(self, file_path: str) -> Path:
+        key = hashlib.sha1(file_path.encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def _load_entry(self, file_path: str) -> dict | None:
+        p = self._entry_path(file_path)
+        try:
+            entry = json.loads(p.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if entry.get("v") != FORMAT_VERSION or entry.get("file") != file_path:
+            return None
+        return entry
+
+    def _write_entry(self, file_path: str, entry: dict) -> int:
+        """Write an entry, returning how many bytes it grew the cache by."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        p = self._entry_path(file_path)
+        try:
+            old_size = p.stat().st_size
+        except OSError:
+            old_size = 0
+        data = json.dumps(entry, separators=(",", ":")).encode()
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+        return len(data) - old_size
+
+    def _hash(self, source: Path) -> str:
+        return "sha256:" + hashlib.sha256(source.read_bytes()).hexdigest()
+
+    # --- lookups ---
+
+    def get(self, file_path: str) -> ParseResult | None:
+        """Return the cached result if the source file is unchanged, else None."""
+        source = self.project_root / file_path
+        entry = self._load_entry(file_path)
+        if entry is None:
+            return None
+        try:
+            st = source.stat()
+        except OSError:
+            return None
+
+        stat_matches = entry["stat"] == list(fingerprint(st))
+        if not stat_matches or racily_clean(st.st_mtime_ns, entry["read"]):
+            # Touched, copied or racily clean but maybe not modified: compare contents
+            if entry["stat"][1] != st.st_size:
+                return None
+            read_ns = time.time_ns()
+            if self._hash(source) != entry["hash"]:
+                return None
+            # Record the check, so the entry can be trusted on its stat next time
+            entry["stat"] = list(fingerprint(st))
+            entry["read"] = read_ns
+            self._grow(self._write_entry(file_path, entry))
+        else:
+            # Refresh recency for LRU eviction
+            try:
+                os.utime(self._entry_path(file_path))
+            except OSError:
+                pass
+        return _decode(entry["result"])
+
+    def put(
+        self, file_path: str, result: ParseResult, content_hash: str,
+        st: os.stat_result, read_ns: int,
+    ) -> None:
+        """Store a result parsed from content read at read_ns (time.time_ns()) with stat st."""
+        self._grow(self._write_entry(file_path, {
+            "v": FORMAT_VERSION,
+            "file": file_path,
+            "stat": list(fingerprint(st)),
+            "read": read_ns,
+            "hash": content_hash,
+            "result": _encode(result),
+        }))
+
+    def _grow(self, delta: int) -> None:
+        """Account for a write; evict once the cache outgrows max_bytes."""
+        if self._total is None:
+            # The first write of this cache object scans the directory once
+            self._total = sum(e.stat().st_size for e in self._entries())
+        else:
+            self._total += delta
+        if self._total > self.max_bytes:
+            self.prune()
+
+    def parse(self, file_path: str) -> ParseResult:
+        """Return the parse result for a file, from cache or by reading it once."""
+        cached = self.get(file_path)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        source = self.project_root / file_path
+        read_ns = time.time_ns()
+        with source.open("rb") as fh:
+            st = os.fstat(fh.fileno())
+            data = fh.read()
+        # the str scanner is faster than parse_markers_bytes() even counting
+        # the decode (benchmarks/bench_parser.py)
+        text = data.decode("utf-8", errors="surrogateescape")
+        result = parse_markers(text, file_path, with_offsets=True)
+        digest = hashlib.sha256(data).hexdigest()
+        self.put(file_path, result, "sha256:" + digest, st, read_ns)
+        return result
+
+    # --- maintenance ---
+
+    def _entries(self) -> list[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def prune(self, max_bytes: int | None = None) -> int:
+        """Evict least-recently-used entries until under max_bytes. Returns count evicted."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._total = total
+        return evicted
+
+    def clear(self) -> int:
+        """Delete every entry. Returns the number removed."""
+        return self.prune(max_bytes=0)
+
+    def stats(self) -> CacheStats:
+        entries = self._entries()
+        return CacheStats(
+            entries=len(entries),
+            total_bytes=sum(e.stat().st_size for e in entries),
+            max_bytes=self.max_bytes,
+            hits=self.hits,
+            misses=self.misses,
+        )
@@ -10,9 +10,19 @@ Handles partial/corrupted markers gracefully.
 """
 from __future__ import annotations
 
+import codecs
+import mmap
+import os
 import re
+from bisect import bisect_left
+from collections.abc import Iterable
 from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from itertools import chain
+from operator import itemgetter
+from pathlib import Path
 
+from pyweb.core.lineindex import LineIndex
 from pyweb.core.models import Range, Fragment
 
 # These regexes match anywhere in a line, regardless of comment syntax
@@ -57,46 +67,197 @@ class ParseWarning:
     message: str
 
 
+@dataclass
+class FragmentOffsets:
+    """Buffer offsets of a fragment's boundaries (start of the corresponding lines)."""
+    start: int          # start of the @pyweb:start marker line
+    content_start: int  # first byte of code after the start marker and prose
+    content_end: int    # start of the @pyweb:end marker line (code ends here)
+    end: int            # just past the @pyweb:end marker line
+
+
+# A classified marker line: (lineno, kind, value, name)
+Marker = tuple[int, str, str, str | None]
+
+
 @dataclass
 class ParseResult:
     fragments: list[ParsedFragment]
     warnings: list[ParseWarning]
+    line_count: int = field(default=0, compare=False)
+    # Marker lines in order. Only recorded when the source uses plain "\n" /
+    # "\r\n" line breaks, which is what reparse() needs to splice edits.
+    markers: list[Marker] | None = field(default=None, repr=False, compare=False)
+    # Line number -> byte offset of that line's start, for every line a
+    # fragment boundary refers to. Only filled in by parse_markers_bytes().
+    offsets: dict[int, int] | None = field(default=None, repr=False, compare=False)
+    # The same lines -> character offset in the decoded text (line breaks
+    # kept as they are), and marker line -> (indent, length without its line
+    # break) in characters. From parse_markers_bytes(), parse_text_file() and
+    # parse_markers(with_offsets=True).
+    char_offsets: dict[int, int] | None = field(default=None, repr=False, compare=False)
+    columns: dict[int, tuple[int, int]] | None = field(default=None, repr=False, compare=False)
+    # Line-start table of the parsed text, from parse_markers(with_index=True)
+    line_index: LineIndex | None = field(default=None, repr=False, compare=False)
+
+    # Lookup indexes, built on first use. They assume `fragments` is not
+    # mutated afterwards.
+
+    @cached_property
+    def by_id(self) -> dict[str, ParsedFragment]:
+        return {f.id: f for f in self.fragments}
+
+    @cached_property
+    def by_name(self) -> dict[str, list[ParsedFragment]]:
+        index: dict[str, list[ParsedFragment]] = {}
+        for f in self.fragments:
+            index.setdefault(f.name, []).append(f)
+        return index
+
+    @cached_property
+    def children_by_parent(self) -> dict[str, list[ParsedFragment]]:
+        by_id = self.by_id
+        return {
+            f.id: [by_id[cid] for cid in f.children if cid in by_id]
+            for f in self.fragments if f.children
+        }
+
+    @cached_property
+    def roots(self) -> list[ParsedFragment]:
+        return [f for f in self.fragments if f.parent_id is None]
+
+    def get(self, fid: str) -> ParsedFragment | None:
+        return self.by_id.get(fid)
+
+    def get_by_name(self, name: str) -> ParsedFragment | None:
+        """First fragment with this name, in source order."""
+        matches = self.by_name.get(name)
+        return matches[0] if matches else None
+
+    def children_of(self, fid: str) -> list[ParsedFragment]:
+        return self.children_by_parent.get(fid, [])
+
+    def offsets_of(self, fid: str) -> FragmentOffsets | None:
+        """Byte offsets of a fragment's marker and content boundaries."""
+        if self.offsets is None:
+            raise ValueError("Offsets are only recorded by parse_markers_bytes()")
+        f = self.get(fid)
+        if f is None:
+            return None
+        o = self.offsets
+        return FragmentOffsets(
+            start=o[f.start_line],
+            content_start=o[f.content_start_line],
+            content_end=o[f.content_end_line],
+            end=o[f.end_line],
+        )
 
 
-def parse_markers(source: str, file_path: str = "") -> ParseResult:
-    """Parse @pyweb markers from source text.
+# Every marker contains this sentinel; lines without it can never match
+SENTINEL = "@pyweb:"
 
-    Returns ParseResult with fragments and any warnings about malformed markers.
-    Handles partial/corrupted markers gracefully:
-    - Missing end → fragment extends to parent's end or EOF
-    - Orphaned end → ignored with warning
-    - Prose outside fragment → ignored with warning
+_BYTES_SENTINEL = SENTINEL.encode()
+
+# Line boundaries str.splitlines() honours besides "\n" and "\r\n"
+_OTHER_BREAKS = "\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+# A line holding a boundary that iterating a file does not split at
+_EXTRA_BREAK_RE = re.compile(f"[{_OTHER_BREAKS}]|\r(?!\n)")
+
+# Slice size used when counting inside buffers that lack count() (mmap)
+_COUNT_CHUNK = 1 << 20
+
+# Every byte except UTF-8 continuation bytes (0x80-0xbf)
+_NOT_CONTINUATION = bytes(range(0x80)) + bytes(range(0xC0, 0x100))
+
+
+@lru_cache
+def _byte_encoding(encoding: str) -> str:
+    """Canonical name of an encoding the bytes parsers can scan.
+
+    Markers are found by searching for their ASCII bytes, so the encoding
+    must encode ASCII as itself; others (UTF-16, UTF-32, ...) raise ValueError.
     """
-    lines = source.splitlines(keepends=True)
-    fragments: dict[str, ParsedFragment] = {}
-    stack: list[str] = []  # stack of fragment IDs (innermost on top)
-    warnings: list[ParseWarning] = []
+    name = codecs.lookup(encoding).name
+    ascii_chars = "".join(map(chr, range(128)))
+    try:
+        compatible = ascii_chars.encode(name) == ascii_chars.encode("ascii")
+    except UnicodeError:
+        compatible = False
+    if not compatible:
+        raise ValueError(
+            f"Encoding '{encoding}' is not ASCII-compatible; decode the text and use parse_markers()"
+        )
+    return name
 
-    # Track which fragment is currently collecting prose
-    collecting_prose_for: str | None = None
 
-    for lineno, line in enumerate(lines):
-        start_match = START_RE.search(line)
-        end_match = END_RE.search(line)
-        prose_match = PROSE_RE.search(line)
+@lru_cache
+def _encoded_breaks(encoding: str) -> tuple[bytes, ...]:
+    """_OTHER_BREAKS as they appear in undecoded text of this encoding."""
+    found = []
+    for ch in _OTHER_BREAKS:
+        try:
+            found.append(ch.encode(encoding))
+        except UnicodeEncodeError:
+            pass
+    return tuple(found)
+
+
+@lru_cache
+def _extra_break_re(encoding: str) -> re.Pattern[bytes]:
+    """_EXTRA_BREAK_RE for undecoded lines."""
+    return re.compile(b"|".join(map(re.escape, _encoded_breaks(encoding))) + rb"|\r(?!\n)")
+
+
+def classify_marker(line: str) -> tuple[str, str, str | None] | None:
+    """Match a single line against the marker regexes.
+
+    Returns (kind, value, name) where kind is "start", "end" or "prose",
+    or None if the line carries no marker. Start wins over end, end over prose.
+    """
+    m = START_RE.search(line)
+    if m:
+        return ("start", m.group("id"), m.group("name"))
+    m = END_RE.search(line)
+    if m:
+        return ("end", m.group("id"), None)
+    m = PROSE_RE.search(line)
+    if m:
+        return ("prose", m.group("text").rstrip(), None)
+    return None
+
 
-        if start_match:
-            fid = start_match.group("id")
-            fname = start_match.group("name")
+class TreeBuilder:
+    """Stack machine that turns marker events into a ParseResult.
 
+    Lines without markers never change parser state, so callers only need to
+    feed the marker lines (in order, as feed(lineno, *classify_marker(line)))
+    and then the total line count.
+    """
+
+    def __init__(self) -> None:
+        self.fragments: dict[str, ParsedFragment] = {}
+        self.markers: list[Marker] = []
+        self.stack: list[str] = []  # stack of fragment IDs (innermost on top)
+        self.warnings: list[ParseWarning] = []
+        # Track which fragment is currently collecting prose
+        self.collecting_prose_for: str | None = None
+
+    def feed(self, lineno: int, kind: str, value: str, name: str | None) -> None:
+        fragments = self.fragments
+        stack = self.stack
+        self.markers.append((lineno, kind, value, name))
+
+        if kind == "start":
+            fid = value
             if fid in fragments:
-                warnings.append(ParseWarning(lineno, f"Duplicate fragment ID '{fid}'"))
-                continue
+                self.warnings.append(ParseWarning(lineno, f"Duplicate fragment ID '{fid}'"))
+                return
 
             parent_id = stack[-1] if stack else None
             pf = ParsedFragment(
                 id=fid,
-                name=fname,
+                name=name,
                 start_line=lineno,
                 end_line=-1,  # will be set when end marker is found
                 content_start_line=lineno + 1,  # tentative, adjusted after prose
@@ -109,15 +270,15 @@ def parse_markers(source: str, file_path: str = "") -> ParseResult:
                 fragments[parent_id].children.append(fid)
 
             stack.append(fid)
-            collecting_prose_for = fid
+            self.collecting_prose_for = fid
 
-        elif end_match:
-            fid = end_match.group("id")
-            collecting_prose_for = None
+        elif kind == "end":
+            fid = value
+            self.collecting_prose_for = None
 
             if fid not in fragments:
-                warnings.append(ParseWarning(lineno, f"End marker for unknown fragment '{fid}'"))
-                continue
+                self.warnings.append(ParseWarning(lineno, f"End marker for unknown fragment '{fid}'"))
+                return
 
             pf = fragments[fid]
             pf.end_line = lineno + 1  # exclusive
@@ -134,48 +295,427 @@ def parse_markers(source: str, file_path: str = "") -> ParseResult:
                 if inner.end_line == -1:
                     inner.end_line = lineno
                     inner.content_end_line = lineno
-                    warnings.append(ParseWarning(
+                    self.warnings.append(ParseWarning(
                         lineno,
                         f"Fragment '{inner.name}' ({popped}) auto-closed at end of '{pf.name}'"
                     ))
 
-        elif prose_match and collecting_prose_for:
-            pf = fragments[collecting_prose_for]
-            pf.prose_lines.append(prose_match.group("text").rstrip())
+        elif self.collecting_prose_for:
+            pf = fragments[self.collecting_prose_for]
+            pf.prose_lines.append(value)
             pf.content_start_line = lineno + 1
 
-        elif prose_match and not collecting_prose_for:
-            warnings.append(ParseWarning(lineno, "Prose marker outside any fragment"))
+        else:
+            self.warnings.append(ParseWarning(lineno, "Prose marker outside any fragment"))
+
+    def finish(self, line_count: int, keep_markers: bool = True) -> ParseResult:
+        """Close any unclosed fragments at EOF and return the result."""
+        stack = self.stack
+        while stack:
+            fid = stack.pop()
+            pf = self.fragments[fid]
+            if pf.end_line == -1:
+                pf.end_line = line_count
+                pf.content_end_line = line_count
+                self.warnings.append(ParseWarning(
+                    line_count - 1,
+                    f"Fragment '{pf.name}' ({fid}) never closed, extends to EOF"
+                ))
+
+        return ParseResult(
+            fragments=list(self.fragments.values()),
+            warnings=self.warnings,
+            line_count=line_count,
+            markers=self.markers if keep_markers else None,
+        )
+
+
+def _count(buf, sub, start: int, end: int) -> int:
+    """buf.count(sub, start, end), in bounded chunks for buffers without count() (mmap)."""
+    if isinstance(buf, (str, bytes)):
+        return buf.count(sub, start, end)
+    # Windows overlap by len(sub) - 1 so matches straddling a boundary count
+    # exactly once (none of the patterns counted here can overlap themselves).
+    extra = len(sub) - 1
+    total = 0
+    for i in range(start, end, _COUNT_CHUNK):
+        total += buf[i:min(i + _COUNT_CHUNK + extra, end)].count(sub)
+    return total
+
+
+def _is_ascii(buf) -> bool:
+    if isinstance(buf, bytes):
+        return buf.isascii()
+    return all(buf[i:i + _COUNT_CHUNK].isascii() for i in range(0, len(buf), _COUNT_CHUNK))
+
 
-    # Close any unclosed fragments at EOF
-    while stack:
-        fid = stack.pop()
-        pf = fragments[fid]
-        if pf.end_line == -1:
-            pf.end_line = len(lines)
-            pf.content_end_line = len(lines)
-            warnings.append(ParseWarning(
-                len(lines) - 1,
-                f"Fragment '{pf.name}' ({fid}) never closed, extends to EOF"
-            ))
+def _char_count(buf, start: int, end: int, encoding: str) -> int:
+    """Number of characters buf[start:end] decodes to.
 
-    result_frags = list(fragments.values())
-    return ParseResult(fragments=result_frags, warnings=warnings)
+    For UTF-8 this counts the bytes that start a character, slice by slice,
+    without decoding.
+    """
+    if encoding != "utf-8":
+        return len(bytes(buf[start:end]).decode(encoding, errors="surrogateescape"))
+    count = end - start
+    for i in range(start, end, _COUNT_CHUNK):
+        chunk = buf[i:min(i + _COUNT_CHUNK, end)]
+        if not chunk.isascii():
+            count -= len(chunk.translate(None, _NOT_CONTINUATION))
+    return count
+
+
+def _scan_marker_lines(
+    buf, encoding: str = "utf-8",
+) -> tuple[list[tuple[int, int, int, str | bytes]], int] | None:
+    """Find the lines containing SENTINEL without splitting the whole buffer.
+
+    Works on str, bytes or mmap. Jumps from sentinel to sentinel with find()
+    and counts the newlines in between, so marker-free lines are never
+    materialized. Returns ([(lineno, start, end, line), ...], line_count),
+    where start/end are the line's offsets in `buf`, or None when the buffer
+    contains line boundaries that newline counting would get wrong (lone
+    "\r", form feeds and unicode separators, in bytes as encoded with
+    `encoding`); callers then fall back to str.splitlines().
+    """
+    size = len(buf)
+    if not size:
+        return [], 0
+    if isinstance(buf, str):
+        nl, cr, crlf, sentinel = "\n", "\r", "\r\n", SENTINEL
+        if any(ch in buf for ch in _OTHER_BREAKS):
+            return None
+    else:
+        nl, cr, crlf, sentinel = b"\n", b"\r", b"\r\n", _BYTES_SENTINEL
+        if any(buf.find(seq) != -1 for seq in _encoded_breaks(encoding)):
+            return None
+    if buf.find(cr) != -1 and _count(buf, cr, 0, size) != _count(buf, crlf, 0, size):
+        return None
+
+    found: list[tuple[int, int, int, str | bytes]] = []
+    lineno = 0
+    cursor = 0  # offset of the start of line `lineno`
+    pos = buf.find(sentinel)
+    while pos != -1:
+        line_start = buf.rfind(nl, cursor, pos) + 1 or cursor
+        lineno += _count(buf, nl, cursor, line_start)
+        line_end = buf.find(nl, pos)
+        line_end = size if line_end == -1 else line_end + 1
+        found.append((lineno, line_start, line_end, buf[line_start:line_end]))
+        lineno += 1
+        cursor = line_end
+        pos = buf.find(sentinel, line_end)
+
+    line_count = lineno + _count(buf, nl, cursor, size)
+    if cursor < size and buf[size - 1:size] != nl:
+        line_count += 1  # unterminated last line
+    return found, line_count
+
+
+def _marker_columns(line: str) -> tuple[int, int]:
+    """(indent, length without its line break) of a marker line."""
+    return len(line) - len(line.lstrip()), len(line.splitlines()[0])
+
+
+def feed_markers(
+    builder,
+    source: str,
+    fast: bool = True,
+    char_offsets: dict[int, int] | None = None,
+    columns: dict[int, tuple[int, int]] | None = None,
+) -> tuple[int, bool]:
+    """Feed every marker line of `source` to a builder, in order.
+
+    The builder is a TreeBuilder or anything with the same feed(). Given
+    char_offsets and columns dicts, also fills them in as ParseResult
+    describes them.
+
+    Returns (line_count, plain) where plain is True when the sentinel scanner
+    was used, i.e. the text only has "\n" / "\r\n" line breaks.
+    """
+    scanned = _scan_marker_lines(source) if fast else None
+    if scanned is not None:
+        marker_lines, line_count = scanned
+        for lineno, start, end, line in marker_lines:
+            marker = classify_marker(line)
+            if marker is not None:
+                builder.feed(lineno, *marker)
+                if char_offsets is not None:
+                    char_offsets[lineno] = start
+                    char_offsets[lineno + 1] = end
+                    columns[lineno] = _marker_columns(line)
+        if char_offsets is not None:
+            char_offsets[line_count] = len(source)
+        return line_count, True
 
+    lines = source.splitlines(keepends=True)
+    pos = 0
+    for lineno, line in enumerate(lines):
+        marker = classify_marker(line)
+        if marker is not None:
+            builder.feed(lineno, *marker)
+            if char_offsets is not None:
+                char_offsets[lineno] = pos
+                char_offsets[lineno + 1] = pos + len(line)
+                columns[lineno] = _marker_columns(line)
+        pos += len(line)
+    if char_offsets is not None:
+        char_offsets[len(lines)] = len(source)
+    return len(lines), False
+
+
+def parse_markers(
+    source: str,
+    file_path: str = "",
+    *,
+    fast: bool = True,
+    with_index: bool = False,
+    with_offsets: bool = False,
+) -> ParseResult:
+    """Parse @pyweb markers from source text.
 
-def get_roots(fragments: list[ParsedFragment]) -> list[ParsedFragment]:
+    Returns ParseResult with fragments and any warnings about malformed markers.
+    Handles partial/corrupted markers gracefully:
+    - Missing end → fragment extends to parent's end or EOF
+    - Orphaned end → ignored with warning
+    - Prose outside fragment → ignored with warning
+
+    With fast=True (the default) only lines containing "@pyweb:" are matched
+    against the marker regexes; fast=False runs them on every line. Both
+    produce identical results. with_index=True also builds the line-start
+    offset table (result.line_index) for offset/column lookups and splicing;
+    with_offsets=True only records result.char_offsets and result.columns,
+    from the marker lines the scan finds anyway.
+    """
+    builder = TreeBuilder()
+    char_offsets: dict[int, int] | None = {} if with_offsets else None
+    columns: dict[int, tuple[int, int]] | None = {} if with_offsets else None
+    line_count, plain = feed_markers(builder, source, fast, char_offsets, columns)
+    result = builder.finish(line_count, keep_markers=plain)
+    result.char_offsets = char_offsets
+    result.columns = columns
+    if with_index:
+        result.line_index = LineIndex(source)
+    return result
+
+
+def parse_text_file(path: str | Path, file_path: str = "", encoding: str = "utf-8") -> ParseResult:
+    """Read a text file whole and parse it with the str scanner, with char offsets.
+
+    Line breaks are kept as they are and undecodable bytes escaped, so
+    result.char_offsets address the file as an editor holds it. This is
+    faster than the bytes parser (benchmarks/bench_parser.py); use
+    parse_file() when byte offsets are needed.
+    """
+    with open(path, encoding=encoding, errors="surrogateescape", newline="") as fh:
+        return parse_markers(fh.read(), file_path, with_offsets=True)
+
+
+def parse_markers_bytes(data, file_path: str = "", encoding: str = "utf-8") -> ParseResult:
+    """Parse @pyweb markers from undecoded bytes, a bytearray or an mmap.
+
+    The buffer is never decoded as a whole: the sentinel scanner locates
+    marker lines with bytes.find and only those lines are decoded. Lines end
+    where str.splitlines() would end them in the decoded text, the same as
+    parse_markers() and the writer; a buffer with boundaries other than
+    "\n" and "\r\n" is decoded and split whole. The result's `offsets` map
+    every line a fragment boundary refers to onto its byte offset, so callers
+    can seek straight to fragments (see ParseResult.offsets_of). `char_offsets`
+    and `columns` give the same positions in characters, for editors that
+    address the decoded text.
+
+    The encoding must encode ASCII as itself; UTF-16 and UTF-32 raise
+    ValueError.
+    """
+    encoding = _byte_encoding(encoding)
+    builder = TreeBuilder()
+    scanned = _scan_marker_lines(data, encoding)
+    if scanned is None:
+        # Lone "\r", form feeds or unicode separators: split the decoded text
+        marker_lines = []
+        pos = 0
+        lines = bytes(data).decode(encoding, errors="surrogateescape").splitlines(keepends=True)
+        for lineno, line in enumerate(lines):
+            size = len(line.encode(encoding, errors="surrogateescape"))
+            if SENTINEL in line:
+                marker_lines.append((lineno, pos, pos + size, line))
+            pos += size
+        line_count = len(lines)
+    else:
+        marker_lines, line_count = scanned
+
+    offsets: dict[int, int] = {line_count: len(data)}
+    char_offsets: dict[int, int] = {}
+    columns: dict[int, tuple[int, int]] = {}
+    # ASCII text has a character per byte; otherwise characters are counted
+    # gap by gap from one marker line to the next
+    all_ascii = encoding == "utf-8" and _is_ascii(data)
+    byte_pos = char_pos = 0
+    for lineno, start, end, line in marker_lines:
+        if all_ascii:
+            char_start, char_pos = start, end
+        else:
+            char_start = char_pos + _char_count(data, byte_pos, start, encoding)
+            char_pos = char_start + _char_count(data, start, end, encoding)
+            byte_pos = end
+        if isinstance(line, bytes):
+            line = line.decode(encoding, errors="replace")
+        marker = classify_marker(line)
+        if marker is not None:
+            builder.feed(lineno, *marker)
+            offsets[lineno] = start
+            offsets[lineno + 1] = end
+            char_offsets[lineno] = char_start
+            char_offsets[lineno + 1] = char_pos
+            columns[lineno] = (len(line) - len(line.lstrip()), len(line.splitlines()[0]))
+    if all_ascii:
+        char_offsets[line_count] = len(data)
+    else:
+        char_offsets[line_count] = char_pos + _char_count(data, byte_pos, len(data), encoding)
+
+    result = builder.finish(line_count, keep_markers=False)
+    result.offsets = offsets
+    result.char_offsets = char_offsets
+    result.columns = columns
+    return result
+
+
+def parse_file(path: str | Path, file_path: str = "", encoding: str = "utf-8") -> ParseResult:
+    """Parse a file on disk in bytes mode, memory-mapping it instead of reading it."""
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return parse_markers_bytes(b"", file_path, encoding)
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_markers_bytes(mm, file_path, encoding)
+
+
+def parse_stream(
+    lines: Iterable[str] | Iterable[bytes],
+    file_path: str = "",
+    encoding: str = "utf-8",
+) -> ParseResult:
+    """Parse @pyweb markers from a text/binary file object or any line iterator.
+
+    Lines are consumed one at a time and only those containing "@pyweb:" are
+    kept long enough to be matched (and, for bytes, decoded), so memory is
+    bounded by the marker stack and fragment count rather than the file size.
+    Fragments still open at EOF are closed at the number of lines seen.
+
+    Each item is split further wherever str.splitlines() would split it (file
+    iteration only splits at "\n"), so line numbers match parse_markers() on
+    the whole source.
+    """
+    builder = TreeBuilder()
+    it = iter(lines)
+    first = next(it, None)
+    if first is None:
+        return builder.finish(0, keep_markers=False)
+
+    line_count = 0
+    if isinstance(first, str):
+        sentinel, extra_break = SENTINEL, _EXTRA_BREAK_RE
+    else:
+        encoding = _byte_encoding(encoding)
+        sentinel, extra_break = _BYTES_SENTINEL, _extra_break_re(encoding)
+    for item in chain((first,), it):
+        if extra_break.search(item):
+            if not isinstance(item, str):
+                item = bytes(item).decode(encoding, errors="replace")
+            parts = item.splitlines(keepends=True)
+        elif sentinel in item:
+            parts = (item if isinstance(item, str) else bytes(item).decode(encoding, errors="replace"),)
+        else:
+            line_count += 1
+            continue
+        for line in parts:
+            if SENTINEL in line:
+                marker = classify_marker(line)
+                if marker is not None:
+                    builder.feed(line_count, *marker)
+            line_count += 1
+
+    return builder.finish(line_count, keep_markers=False)
+
+
+def reparse(
+    previous: ParseResult,
+    source: str,
+    edit_range: tuple[int, int],
+    new_text: str,
+) -> ParseResult:
+    """Update a ParseResult after lines [start, end) of `source` are replaced by `new_text`.
+
+    `source` is the text `previous` was parsed from; `new_text` replaces whole
+    lines and should end with a newline unless the edit runs to EOF. Only
+    `new_text` is scanned. An edit that keeps the line count and adds or
+    removes no marker (typing within lines) changes nothing the result
+    holds, so `previous`'s fragments are reused as they are. Otherwise
+    markers before the edit are reused as-is and markers after it are
+    shifted, but the stack machine is replayed over every marker of the
+    file, so the call costs O(len(new_text) + markers): it saves the scan
+    of unchanged text, not the work per marker, and on a densely marked file
+    it is only a few times faster than parse_markers()
+    (benchmarks/bench_reparse.py). Every fragment after such an edit moves,
+    so resuming from a checkpoint could only skip the markers before it.
+
+    Falls back to a full parse when the edit could merge lines across its
+    boundaries or when `previous` carries no marker log. The result is always
+    identical to parse_markers() on the edited text.
+    """
+    start, end = edit_range
+    if not 0 <= start <= end <= previous.line_count:
+        raise ValueError(f"Edit range {edit_range} outside 0..{previous.line_count}")
+
+    markers = previous.markers
+    scanned = _scan_marker_lines(new_text) if markers is not None else None
+    joins_before = start == previous.line_count and source and not source.endswith("\n")
+    joins_after = end < previous.line_count and new_text and not new_text.endswith("\n")
+    if scanned is None or joins_before or joins_after:
+        lines = source.splitlines(keepends=True)
+        return parse_markers("".join(lines[:start]) + new_text + "".join(lines[end:]))
+
+    new_lines, new_count = scanned
+    delta = new_count - (end - start)
+    lo = bisect_left(markers, start, key=itemgetter(0))
+    hi = bisect_left(markers, end, lo, key=itemgetter(0))
+    new_markers = [
+        (start + lineno, *marker)
+        for lineno, _, _, line in new_lines
+        if (marker := classify_marker(line)) is not None
+    ]
+    if delta == 0 and lo == hi and not new_markers:
+        # Same marker events at the same lines: nothing to rebuild
+        return ParseResult(previous.fragments, previous.warnings, previous.line_count, markers)
+
+    builder = TreeBuilder()
+    for marker in markers[:lo]:
+        builder.feed(*marker)
+    for marker in new_markers:
+        builder.feed(*marker)
+    for lineno, kind, value, name in markers[hi:]:
+        builder.feed(lineno + delta, kind, value, name)
+    return builder.finish(previous.line_count + delta)
+
+
+def get_roots(fragments: list[ParsedFragment] | ParseResult) -> list[ParsedFragment]:
     """Get root fragments (those with no parent)."""
+    if isinstance(fragments, ParseResult):
+        return fragments.roots
     return [f for f in fragments if f.parent_id is None]
 
 
-def get_fragment_by_id(fragments: list[ParsedFragment], fid: str) -> ParsedFragment | None:
+def get_fragment_by_id(fragments: list[ParsedFragment] | ParseResult, fid: str) -> ParsedFragment | None:
+    if isinstance(fragments, ParseResult):
+        return fragments.get(fid)
     for f in fragments:
         if f.id == fid:
             return f
     return None
 
 
-def get_fragment_by_name(fragments: list[ParsedFragment], name: str) -> ParsedFragment | None:
+def get_fragment_by_name(fragments: list[ParsedFragment] | ParseResult, name: str) -> ParsedFragment | None:
+    if isinstance(fragments, ParseResult):
+        return fragments.get_by_name(name)
     for f in fragments:
         if f.name == name:
             return f
@@ -0,0 +1,132 @@
+"""Project-wide operations: enumerate source files and parse them in parallel."""
+from __future__ import annotations
+
+import os
+import subprocess
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+from typing import TypeVar
+
+from pyweb.core.parser import ParseResult, parse_text_file
+
+# Directories never worth descending into when git is not available
+_SKIP_DIRS = {"__pycache__", "node_modules", "venv", "build", "dist"}
+
+# Bytes sniffed to decide whether a file is binary
+_SNIFF_SIZE = 8192
+
+# Most files sent to a worker in one task
+_MAX_BATCH = 64
+
+T = TypeVar("T")
+
+
+def iter_project_files(project_root: Path) -> Iterator[str]:
+    """Yield project-relative POSIX paths of candidate source files.
+
+    Inside a git work tree this is every tracked or untracked-but-not-ignored
+    file (`git ls-files --exclude-standard`). Otherwise the tree is walked,
+    skipping hidden directories and common build/dependency directories.
+    """
+    try:
+        proc = subprocess.run(
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            cwd=project_root, capture_output=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        proc = None
+
+    if proc is not None:
+        seen: set[str] = set()
+        for raw in proc.stdout.split(b"\0"):
+            rel = raw.decode("utf-8", errors="surrogateescape")
+            if rel and rel not in seen and (project_root / rel).is_file():
+                seen.add(rel)
+                yield rel
+        return
+
+    for dirpath, dirnames, filenames in os.walk(project_root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d not in _SKIP_DIRS)
+        rel_dir = Path(dirpath).relative_to(project_root)
+        for name in sorted(filenames):
+            yield (rel_dir / name).as_posix()
+
+
+def is_binary(path: Path) -> bool:
+    """Whether a file looks binary (has a NUL byte near the start)."""
+    with path.open("rb") as fh:
+        return b"\0" in fh.read(_SNIFF_SIZE)
+
+
+def parse_path(path: Path, file_path: str = "") -> ParseResult | None:
+    """Parse one file with char offsets. Returns None for binary (NUL-containing) files."""
+    if is_binary(path):
+        return None
+    return parse_text_file(path, file_path)
+
+
+def _parse_chunk(project_root: str, files: list[str]) -> list[tuple[str, ParseResult | None]]:
+    """Worker entry point: parse a batch of files, skipping unreadable ones."""
+    root = Path(project_root)
+    out: list[tuple[str, ParseResult | None]] = []
+    for rel in files:
+        try:
+            out.append((rel, parse_path(root / rel, rel)))
+        except OSError:
+            out.append((rel, None))
+    return out
+
+
+def map_batches(
+    fn: Callable[[list[str]], list[T]],
+    files: list[str],
+    workers: int | None = None,
+    batch_args: Callable[[list[str]], tuple] | None = None,
+    local: Callable[[list[str]], list[T]] | None = None,
+) -> Iterator[T]:
+    """Run fn on batches of files, yielding the items of each list it returns.
+
+    With one worker (one per core by default) or one file, each file is its
+    own batch, run in this process, so items stream in input order; there
+    `local(batch)`, if given, runs instead of fn and need not be picklable.
+    Otherwise batches are fanned out across a ProcessPoolExecutor and
+    yielded as they complete, so fn must be picklable (a module-level
+    function or a partial of one). batch_args(batch), if given, returns
+    extra arguments for each call of fn.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(files) <= 1:
+        for rel in files:
+            if local is not None:
+                yield from local([rel])
+            else:
+                yield from fn([rel], *(batch_args([rel]) if batch_args else ()))
+        return
+
+    # Batch files so per-task IPC overhead stays small on large trees
+    size = max(1, min(_MAX_BATCH, len(files) // (workers * 4)))
+    batches = [files[i:i + size] for i in range(0, len(files), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, batch, *(batch_args(batch) if batch_args else ()))
+                   for batch in batches]
+        for fut in as_completed(futures):
+            yield from fut.result()
+
+
+def parse_project(
+    project_root: Path,
+    files: list[str] | None = None,
+    workers: int | None = None,
+) -> Iterator[tuple[str, ParseResult | None]]:
+    """Parse every project file, yielding (file, result) as results complete.
+
+    Files are fanned out in batches across a process pool (map_batches).
+    The result is None for skipped (binary or unreadable) files.
+    Completion order is not the input order.
+    """
+    if files is None:
+        files = list(iter_project_files(project_root))
+    return map_batches(partial(_parse_chunk, str(project_root)), files, workers)
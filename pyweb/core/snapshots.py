@@ -0,0 +1,225 @@
+"""Content-addressed snapshots of source files, under .pyweb/cache/.
+
+Each distinct text is stored once, zlib-compressed, in blobs/ under the
+sha256 of its UTF-8 bytes (the digest FragmentStore.content_hash() gives).
+refs/<file>.ref holds the digest of each file's snapshot, so saving one
+file rewrites one small pointer, however many files the project has.
+A file whose text matches
+another file, or one of its own earlier versions, reuses the existing
+blob; saving an unchanged file writes nothing at all. gc() deletes the
+blobs no file points to.
+
+Snapshots written by older versions as plain copies (.pyweb/cache/<file>)
+are still read until the file is saved again, and gc() removes them then.
+An older single index (snapshots.json) is still read, and is split into
+refs/ by the first save or gc() that finds it.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from collections.abc import Iterable
+from contextlib import suppress
+from pathlib import Path
+
+from pyweb.core.fsutil import FILE_MODE, atomic_write, file_lock, fingerprint, fsync_dir
+
+INDEX_VERSION = 1
+
+# Names directly under the cache directory that are not plain-copy snapshots
+_RESERVED = {"blobs", "parse", "refs", "snapshots.json", "snapshots.lock", "anchor.json"}
+
+_REF_SUFFIX = ".ref"
+
+# Read size when snapshotting a file from disk
+_CHUNK = 1 << 20
+
+
+class SnapshotCache:
+    def __init__(self, cache_dir: Path, fsync: bool = False, level: int = 6) -> None:
+        self.cache_dir = cache_dir
+        self.blobs_dir = cache_dir / "blobs"
+        self.refs_dir = cache_dir / "refs"
+        self.index_path = cache_dir / "snapshots.json"
+        self.lock_path = cache_dir / "snapshots.lock"
+        self.fsync = fsync
+        self.level = level
+        self._index: tuple[tuple[int, int, int], dict[str, str]] | None = None
+
+    def _blob_path(self, digest: str) -> Path:
+        hexdigest = digest.removeprefix("sha256:")
+        return self.blobs_dir / hexdigest[:2] / (hexdigest[2:] + ".z")
+
+    def _legacy_path(self, file_path: str) -> Path | None:
+        if file_path.split("/", 1)[0] in _RESERVED:
+            return None
+        return self.cache_dir / file_path
+
+    def _ref_path(self, file_path: str) -> Path:
+        return self.refs_dir / (file_path + _REF_SUFFIX)
+
+    # --- index ---
+
+    def _read_ref(self, file_path: str) -> str | None:
+        try:
+            digest = self._ref_path(file_path).read_text()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+        return digest if digest.startswith("sha256:") else None
+
+    def _legacy_index(self) -> dict[str, str]:
+        """file path -> digest from an older snapshots.json, re-read only when it changes."""
+        try:
+            st = self.index_path.stat()
+        except FileNotFoundError:
+            self._index = None
+            return {}
+        if self._index is not None and self._index[0] == fingerprint(st):
+            return self._index[1]
+        try:
+            files = json.loads(self.index_path.read_bytes()).get("files", {})
+        except ValueError:
+            files = {}
+        self._index = (fingerprint(st), files)
+        return files
+
+    def _migrate(self) -> None:
+        """Split an older snapshots.json into refs/ (caller holds the lock)."""
+        files = self._legacy_index()
+        for file_path, digest in files.items():
+            if self._read_ref(file_path) is None:
+                atomic_write(self._ref_path(file_path), digest.encode(), self.fsync)
+        if self.index_path.exists():
+            self.index_path.unlink()
+            self._index = None
+
+    def _files(self) -> dict[str, str]:
+        """file path -> digest of every snapshot, from a walk of refs/."""
+        files = dict(self._legacy_index())
+        if self.refs_dir.is_dir():
+            for ref in self.refs_dir.rglob("*" + _REF_SUFFIX):
+                file_path = ref.relative_to(self.refs_dir).as_posix()[:-len(_REF_SUFFIX)]
+                digest = self._read_ref(file_path)
+                if digest is not None:
+                    files[file_path] = digest
+        return files
+
+    def digest(self, file_path: str) -> str | None:
+        """Digest of a file's snapshot, or None if it has none in the index."""
+        digest = self._read_ref(file_path)
+        if digest is None:
+            digest = self._legacy_index().get(file_path)
+        return digest
+
+    # --- reading ---
+
+    def load(self, file_path: str) -> str | None:
+        digest = self.digest(file_path)
+        if digest is not None:
+            return self.load_blob(digest)
+        legacy = self._legacy_path(file_path)
+        if legacy is None or not legacy.is_file():
+            return None
+        return legacy.read_text()
+
+    def load_blob(self, digest: str) -> str | None:
+        """The text stored under a digest, if there is a blob for it."""
+        try:
+            data = self._blob_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+        return zlib.decompress(data).decode("utf-8", "surrogateescape")
+
+    # --- writing ---
+
+    def save(self, file_path: str, content: str) -> str:
+        """Snapshot content as file_path's text. Returns its digest."""
+        data = content.encode("utf-8", "surrogateescape")
+        digest = "sha256:" + hashlib.sha256(data).hexdigest()
+        if self.digest(file_path) == digest and self._blob_path(digest).exists():
+            return digest
+        with file_lock(self.lock_path):
+            blob = self._blob_path(digest)
+            if not blob.exists():
+                atomic_write(blob, zlib.compress(data, self.level), self.fsync)
+            self._point(file_path, digest)
+        return digest
+
+    def save_file(self, file_path: str, source: Path) -> str:
+        """Snapshot a text file on disk, as read_text() would read it, without loading it whole."""
+        hasher = hashlib.sha256()
+        compressor = zlib.compressobj(self.level)
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.blobs_dir, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, \
+                    source.open(encoding="utf-8", errors="surrogateescape") as src:
+                while chunk := src.read(_CHUNK):
+                    data = chunk.encode("utf-8", "surrogateescape")
+                    hasher.update(data)
+                    out.write(compressor.compress(data))
+                out.write(compressor.flush())
+                out.flush()
+                os.fsync(out.fileno())
+            os.chmod(tmp, FILE_MODE)
+            digest = "sha256:" + hasher.hexdigest()
+            with file_lock(self.lock_path):
+                blob = self._blob_path(digest)
+                if blob.exists():
+                    os.unlink(tmp)
+                else:
+                    blob.parent.mkdir(exist_ok=True)
+                    os.replace(tmp, blob)
+                    if self.fsync:
+                        fsync_dir(blob.parent)
+                self._point(file_path, digest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return digest
+
+    def _point(self, file_path: str, digest: str) -> None:
+        """Map file_path to digest (caller holds the lock)."""
+        if self.index_path.exists():
+            self._migrate()
+        if self._read_ref(file_path) != digest:
+            atomic_write(self._ref_path(file_path), digest.encode(), self.fsync)
+
+    # --- maintenance ---
+
+    def gc(self, keep: Iterable[str] | None = None) -> int:
+        """Delete blobs no file points to, and plain copies the index replaced.
+
+        With keep, snapshots of files not in it are forgotten first.
+        Returns the number of files deleted.
+        """
+        removed = 0
+        with file_lock(self.lock_path):
+            self._migrate()
+            files = self._files()
+            if keep is not None:
+                wanted = set(keep)
+                for file_path in [f for f in files if f not in wanted]:
+                    ref = self._ref_path(file_path)
+                    ref.unlink()
+                    del files[file_path]
+                    # Drop directories of refs/ the forgotten file leaves empty
+                    with suppress(OSError):
+                        for parent in ref.relative_to(self.refs_dir).parents[:-1]:
+                            (self.refs_dir / parent).rmdir()
+            live = {self._blob_path(d) for d in files.values()}
+            if self.blobs_dir.is_dir():
+                for blob in self.blobs_dir.glob("*/*.z"):
+                    if blob not in live:
+                        blob.unlink()
+                        removed += 1
+            for file_path in files:
+                legacy = self._legacy_path(file_path)
+                if legacy is not None and legacy.is_file():
+                    legacy.unlink()
+                    removed += 1
+        return removed
@@ -0,0 +1,264 @@
+"""FragmentStore backed by one SQLite database instead of JSON sidecars.
+
+All files' fragments live in .pyweb/fragments.db, with indexes on name,
+file and start line, so project-wide queries (a name anywhere, every
+orphaned fragment) are one indexed query instead of a read of every
+sidecar. The database runs in WAL mode: readers in other processes see
+the last committed state and never block the writer.
+
+Fragments are kept in list order (seq) and child IDs in children order,
+so a FileFragments loaded from the database is the one that was saved.
+import_sidecars() and export_sidecars() copy everything from and to the
+JSON layout of the same project, so a project can switch backends.
+"""
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+
+from pyweb.core.models import FileFragments, Fragment, Range
+from pyweb.core.store import JOURNAL_COMPACT_BYTES, ConflictError, FragmentStore, iter_saved
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path         TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    generation   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fragments (
+    file       TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    seq        INTEGER NOT NULL,
+    id         TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    start_col  INTEGER NOT NULL,
+    end_line   INTEGER NOT NULL,
+    end_col    INTEGER NOT NULL,
+    prose      TEXT,
+    PRIMARY KEY (file, seq)
+);
+CREATE TABLE IF NOT EXISTS children (
+    file       TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    parent_seq INTEGER NOT NULL,
+    position   INTEGER NOT NULL,
+    child_id   TEXT NOT NULL,
+    PRIMARY KEY (file, parent_seq, position)
+);
+CREATE INDEX IF NOT EXISTS fragments_name ON fragments(name);
+CREATE INDEX IF NOT EXISTS fragments_start ON fragments(file, start_line);
+CREATE INDEX IF NOT EXISTS fragments_orphaned ON fragments(start_line) WHERE start_line = -1;
+"""
+
+
+class SqliteFragmentStore(FragmentStore):
+    """FragmentStore with the same methods, stored in .pyweb/fragments.db.
+
+    Each save gives the file a new generation (one counter for the whole
+    database), which plays the part of the sidecar's stat fingerprint for
+    the in-memory cache: a load costs one indexed lookup while nothing has
+    changed. SQLite's own locking keeps concurrent saves whole. Source snapshots
+    (save_cache/load_cache) use the same blob cache under .pyweb/cache/.
+
+    Takes FragmentStore's arguments, so open_store() passes the same ones
+    to either backend. sidecar_format, journal and journal_compact_bytes
+    only concern sidecars and have no effect here; fsync=True also runs
+    the database with synchronous=FULL.
+    """
+
+    def __init__(
+        self,
+        project_root: Path,
+        max_cached_files: int | None = None,
+        sidecar_format: str | None = None,
+        journal: bool | None = None,
+        journal_compact_bytes: int = JOURNAL_COMPACT_BYTES,
+        fsync: bool = False,
+    ) -> None:
+        super().__init__(project_root, max_cached_files, sidecar_format, journal,
+                         journal_compact_bytes, fsync)
+        self.db_path = self.pyweb_dir / "fragments.db"
+        self._con: sqlite3.Connection | None = None
+
+    def init(self) -> None:
+        super().init()
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.pyweb_dir.mkdir(exist_ok=True)
+            # Autocommit; transactions are opened explicitly
+            con = sqlite3.connect(self.db_path, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            con.execute("PRAGMA foreign_keys=ON")
+            con.executescript(_SCHEMA)
+            self._con = con
+        return self._con
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    # --- persistence ---
+
+    def load_file(self, file_path: str) -> FileFragments | None:
+        if not self.db_path.exists():
+            self._files.pop(file_path, None)
+            return None
+        con = self._connect()
+        # One read transaction, so a concurrent save is seen whole or not at all
+        con.execute("BEGIN")
+        try:
+            row = con.execute(
+                "SELECT content_hash, generation FROM files WHERE path = ?", (file_path,)
+            ).fetchone()
+            if row is None:
+                self._files.pop(file_path, None)
+                return None
+            content_hash, generation = row
+            cached = self._files.get(file_path)
+            if cached is not None and cached[0] == (generation,):
+                self.hits += 1
+                self._files.move_to_end(file_path)
+                return cached[1]
+
+            self.misses += 1
+            fragments = [
+                Fragment(fid, name, file_path, Range(sl, sc, el, ec), [], prose)
+                for fid, name, sl, sc, el, ec, prose in con.execute(
+                    "SELECT id, name, start_line, start_col, end_line, end_col, prose "
+                    "FROM fragments WHERE file = ? ORDER BY seq",
+                    (file_path,),
+                )
+            ]
+            for parent_seq, child_id in con.execute(
+                "SELECT parent_seq, child_id FROM children WHERE file = ? "
+                "ORDER BY parent_seq, position",
+                (file_path,),
+            ):
+                fragments[parent_seq].children.append(child_id)
+        finally:
+            con.execute("COMMIT")
+        ff = FileFragments(file_path, content_hash, fragments, generation)
+        self._remember(file_path, (generation,), ff)
+        return ff
+
+    def save_file(self, file_frags: FileFragments, expected_generation: int | None = None) -> None:
+        con = self._connect()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if expected_generation is not None:
+                row = con.execute(
+                    "SELECT generation FROM files WHERE path = ?", (file_frags.file,)
+                ).fetchone()
+                current = row[0] if row is not None else 0
+                if current != expected_generation:
+                    raise ConflictError(
+                        f"{file_frags.file} is at generation {current}, expected {expected_generation}"
+                    )
+            generation = self._write(con, file_frags)
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        file_frags.generation = generation
+        self._remember(file_frags.file, (generation,), file_frags)
+
+    def _persist(self, ff: FileFragments, record: dict) -> None:
+        # A save only rewrites this file's rows; no journal needed
+        self.save_file(ff)
+
+    def save_files(self, files: Iterable[FileFragments]) -> int:
+        """Save many files' fragments in one transaction. Returns the number saved."""
+        con = self._connect()
+        count = 0
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for ff in files:
+                self._write(con, ff)
+                self.invalidate(ff.file)
+                count += 1
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        return count
+
+    @staticmethod
+    def _write(con: sqlite3.Connection, ff: FileFragments) -> int:
+        """Replace one file's rows inside the caller's transaction; returns its generation."""
+        (generation,) = con.execute(
+            "SELECT coalesce(max(generation), 0) + 1 FROM files"
+        ).fetchone()
+        con.execute("DELETE FROM fragments WHERE file = ?", (ff.file,))
+        con.execute("DELETE FROM children WHERE file = ?", (ff.file,))
+        con.execute(
+            "INSERT INTO files (path, content_hash, generation) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET "
+            "content_hash = excluded.content_hash, generation = excluded.generation",
+            (ff.file, ff.content_hash, generation),
+        )
+        con.executemany(
+            "INSERT INTO fragments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (ff.file, seq, f.id, f.name, f.range.start_line, f.range.start_col,
+                 f.range.end_line, f.range.end_col, f.prose)
+                for seq, f in enumerate(ff.fragments)
+            ],
+        )
+        con.executemany(
+            "INSERT INTO children VALUES (?, ?, ?, ?)",
+            [
+                (ff.file, seq, position, cid)
+                for seq, f in enumerate(ff.fragments)
+                for position, cid in enumerate(f.children)
+            ],
+        )
+        return generation
+
+    # --- project-wide queries ---
+
+    def list_files(self) -> list[str]:
+        if not self.db_path.exists():
+            return []
+        return [path for (path,) in self._connect().execute("SELECT path FROM files ORDER BY path")]
+
+    def _fragments_where(self, condition: str, params: tuple) -> list[Fragment]:
+        """Fragments matching a condition on the fragments table, by file and list order."""
+        if not self.db_path.exists():
+            return []
+        rows = self._connect().execute(
+            f"SELECT file, seq FROM fragments WHERE {condition} ORDER BY file, seq", params
+        ).fetchall()
+        found: list[Fragment] = []
+        for file_path, seq in rows:
+            ff = self.load_file(file_path)
+            # Skip rows from a file saved again since the query
+            if ff is not None and seq < len(ff.fragments):
+                found.append(ff.fragments[seq])
+        return found
+
+    def find_fragments(self, name: str) -> list[Fragment]:
+        return [f for f in self._fragments_where("name = ?", (name,)) if f.name == name]
+
+    def orphaned_fragments(self) -> list[Fragment]:
+        return [
+            f for f in self._fragments_where(
+                "start_line = -1 AND start_col = -1 AND end_line = -1 AND end_col = -1", ()
+            )
+            if f.range.is_orphaned()
+        ]
+
+    # --- JSON layout ---
+
+    def import_sidecars(self) -> int:
+        """Copy every JSON sidecar of the project into the database. Returns files copied."""
+        sidecars = FragmentStore(self.project_root, max_cached_files=1)
+        return self.save_files(iter_saved(sidecars))
+
+    def export_sidecars(self) -> int:
+        """Write every file in the database out as a JSON sidecar. Returns files written."""
+        sidecars = FragmentStore(self.project_root, max_cached_files=1)
+        return sidecars.save_files(iter_saved(self))
@@ -1,23 +1,270 @@
 from __future__ import annotations
 
 import hashlib
+import heapq
 import json
+import os
 import shutil
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 
+from pyweb.core.fsutil import atomic_write, file_lock, fingerprint
 from pyweb.core.models import FileFragments, Fragment, Range, _new_id
+from pyweb.core.snapshots import SnapshotCache
 
 
 class ValidationError(Exception):
     pass
 
 
+class ConflictError(Exception):
+    """Another writer saved the file after it was loaded."""
+
+
+# Times update_file() re-runs a change that lost a race before giving up
+UPDATE_RETRIES = 5
+
+
+# Journal size at which it is folded into the sidecar, if the sidecar is smaller
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+# Sidecar encodings, by the name used for "sidecar_format" in .pyweb/config.json.
+# load_file() reads either, whatever the setting.
+SIDECAR_FORMATS = {
+    "json": FileFragments.to_json,
+    "columnar": FileFragments.to_columnar,
+}
+
+
+def load_config(project_root: Path) -> dict:
+    """.pyweb/config.json, or {} if it is missing or unreadable."""
+    try:
+        return json.loads((project_root / ".pyweb" / "config.json").read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+@dataclass
+class StoreCacheStats:
+    entries: int
+    max_entries: int | None
+    hits: int
+    misses: int
+
+
+def _digest(data: bytes) -> str:
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _apply(ff: FileFragments, record: dict) -> None:
+    """Replay one journal record onto ff. Raises KeyError if it does not fit."""
+    op = record["op"]
+    if op == "add":
+        parent_id = record["parent"]
+        if parent_id is not None and ff.get(parent_id) is None:
+            raise KeyError(parent_id)
+        ff.add(Fragment.from_dict(record["fragment"]), parent_id)
+        return
+    frag = ff.get(record["id"])
+    if frag is None:
+        raise KeyError(record["id"])
+    if op == "remove":
+        ff.remove(frag.id)
+    elif op == "rename":
+        frag.name = record["name"]
+    elif op == "prose":
+        frag.prose = record["prose"]
+    elif op == "range":
+        ff.set_range(frag.id, Range(*record["range"]))
+    elif op == "move":
+        parent_id = record["parent"]
+        if parent_id is not None and ff.get(parent_id) is None:
+            raise KeyError(parent_id)
+        ff.move(frag.id, parent_id)
+    else:
+        raise KeyError(op)
+
+
+def _overlapping_pairs(ranges: list[Range]) -> list[tuple[int, int]]:
+    """Index pairs (i, j), i < j, of ranges that overlap, in sorted order.
+
+    A sweep over the ranges sorted by start, keeping a heap of the ones
+    still open: O(n log n) plus the number of pairs. Inverted ranges
+    (start after end) are compared against everything directly.
+    """
+    keys = [((r.start_line, r.start_col), (r.end_line, r.end_col)) for r in ranges]
+    # Common case: already in order, each ending before the next starts
+    if not keys or (
+        all(a[0] <= a[1] <= b[0] for a, b in zip(keys, keys[1:])) and keys[-1][0] <= keys[-1][1]
+    ):
+        return []
+    normal = sorted((k, i) for i, k in enumerate(keys) if k[0] <= k[1])
+    pairs: list[tuple[int, int]] = []
+
+    open_: list[tuple[tuple[int, int], tuple[int, int], int]] = []  # (end, start, index)
+    for (start, end), i in normal:
+        while open_ and open_[0][0] <= start:
+            heapq.heappop(open_)
+        for _, other_start, j in open_:
+            # An empty range only overlaps ranges open on both sides of it
+            if start < end or other_start < start:
+                pairs.append((min(i, j), max(i, j)))
+        if start < end:
+            heapq.heappush(open_, (end, start, i))
+
+    for i, (start, end) in enumerate(keys):
+        if start > end:
+            for j, (s, e) in enumerate(keys):
+                if j != i and start < e and s < end:
+                    pairs.append((min(i, j), max(i, j)))
+    return sorted(set(pairs))
+
+
+def _cyclic_ids(fragments: list[Fragment]) -> set[str]:
+    """IDs of fragments that are their own ancestors (via children lists).
+
+    With one parent per fragment this colours parent chains, visiting each
+    fragment once; a child listed by several parents falls back to
+    Tarjan's strongly connected components.
+    """
+    parent = {cid: f.id for f in fragments for cid in f.children}
+    if len(parent) != sum(len(f.children) for f in fragments):
+        # Some child is listed more than once
+        edges: dict[str, list[str]] = {}
+        for f in fragments:
+            edges.setdefault(f.id, []).extend(f.children)
+        return _cyclic_ids_scc(edges)
+
+    # walk[fid] is the walk that first reached fid; a walk that runs into
+    # itself has found a cycle. Walks stop at roots and at missing IDs.
+    walk: dict[str, int] = {}
+    cyclic: set[str] = set()
+    get_parent = parent.get
+    for n, f in enumerate(fragments):
+        node: str | None = f.id
+        if node in walk:
+            continue
+        path = []
+        while node is not None and node not in walk:
+            walk[node] = n
+            path.append(node)
+            node = get_parent(node)
+        if node is not None and walk[node] == n:
+            cyclic.update(path[path.index(node):])
+    return cyclic
+
+
+def _cyclic_ids_scc(edges: dict[str, list[str]]) -> set[str]:
+    """_cyclic_ids() for any child lists, as one iterative DFS (Tarjan)."""
+    order: dict[str, int] = {}
+    low: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    cyclic: set[str] = set()
+    for root in edges:
+        if root in order:
+            continue
+        work = [(root, iter(edges[root]))]
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, it = work[-1]
+            for child in it:
+                if child not in edges:
+                    continue
+                if child == node:
+                    cyclic.add(node)
+                if child not in order:
+                    order[child] = low[child] = len(order)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges[child])))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], order[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cyclic.update(component)
+    return cyclic
+
+
 class FragmentStore:
-    def __init__(self, project_root: Path) -> None:
+    """Sidecar fragment storage under .pyweb/.
+
+    Loaded sidecars are kept in memory and reused for as long as the file's
+    stat fingerprint (mtime_ns, size, inode) is unchanged, so repeated
+    queries cost one stat() instead of a read and a JSON parse. The cached
+    FileFragments is shared with callers: changes to it must be written
+    with save_file(), or dropped with invalidate(). max_cached_files bounds
+    the number of files kept, least recently used first out.
+
+    Sidecars are written in sidecar_format ("json" or the smaller, faster
+    "columnar"), by default the "sidecar_format" of .pyweb/config.json;
+    either is read back.
+
+    With journal (default: "journal" in config.json), each mutation appends
+    one JSON line to <sidecar>.log instead of rewriting the sidecar, and
+    loads replay the log. The log's first line names the sidecar it applies
+    to by content hash, so a log left behind by an interrupted compaction
+    is discarded, and a torn last record is cut off. Once the log outgrows
+    the sidecar (or journal_compact_bytes) it is compacted into a full
+    save. fsync makes appends and full saves durable before returning.
+
+    Several processes may share a project. Sidecars are replaced atomically
+    (temp file, fsync, rename), so readers never see a partial write and
+    never lock. Writers take an exclusive fcntl lock per file (the .lock
+    beside the sidecar) around each mutation and save. Every save bumps the
+    file's generation: save_file(expected_generation=...) and update_file()
+    use it to detect a save by someone else since the file was loaded.
+    """
+
+    def __init__(
+        self,
+        project_root: Path,
+        max_cached_files: int | None = None,
+        sidecar_format: str | None = None,
+        journal: bool | None = None,
+        journal_compact_bytes: int = JOURNAL_COMPACT_BYTES,
+        fsync: bool = False,
+    ) -> None:
         self.project_root = project_root.resolve()
         self.pyweb_dir = self.project_root / ".pyweb"
         self.fragments_dir = self.pyweb_dir / "fragments"
         self.cache_dir = self.pyweb_dir / "cache"
+        self.max_cached_files = max_cached_files
+        config = load_config(self.project_root)
+        if sidecar_format is None:
+            sidecar_format = config.get("sidecar_format", "json")
+        if sidecar_format not in SIDECAR_FORMATS:
+            raise ValueError(
+                f"Unknown sidecar format '{sidecar_format}' (expected one of {', '.join(SIDECAR_FORMATS)})"
+            )
+        self.sidecar_format = sidecar_format
+        self.journal = bool(config.get("journal", False)) if journal is None else journal
+        self.journal_compact_bytes = journal_compact_bytes
+        self.fsync = fsync
+        self.snapshots = SnapshotCache(self.cache_dir, fsync)
+        self._files: OrderedDict[str, tuple[tuple, FileFragments]] = OrderedDict()
+        self._held: dict[str, int] = {}  # files this store has locked, with nesting depth
+        self.hits = 0
+        self.misses = 0
 
     def is_initialized(self) -> bool:
         return self.pyweb_dir.exists() and (self.pyweb_dir / "config.json").exists()
@@ -35,30 +282,234 @@ class FragmentStore:
     def _frag_path(self, file_path: str) -> Path:
         return self.fragments_dir / (file_path + ".json")
 
-    def _cache_path(self, file_path: str) -> Path:
-        return self.cache_dir / file_path
+    def _journal_path(self, file_path: str) -> Path:
+        return self.fragments_dir / (file_path + ".json.log")
+
+    def _lock_path(self, file_path: str) -> Path:
+        return self.fragments_dir / (file_path + ".json.lock")
+
+    @contextmanager
+    def _lock(self, file_path: str) -> Iterator[None]:
+        """Hold the exclusive writer lock on one file's fragments (re-entrant)."""
+        depth = self._held.get(file_path, 0)
+        with ExitStack() as stack:
+            if depth == 0:
+                stack.enter_context(file_lock(self._lock_path(file_path)))
+            self._held[file_path] = depth + 1
+            try:
+                yield
+            finally:
+                if depth:
+                    self._held[file_path] = depth
+                else:
+                    del self._held[file_path]
+
+    def _journal_fingerprint(self, file_path: str) -> tuple[int, int, int] | None:
+        try:
+            return fingerprint(self._journal_path(file_path).stat())
+        except FileNotFoundError:
+            return None
 
     def load_file(self, file_path: str) -> FileFragments | None:
         p = self._frag_path(file_path)
-        if not p.exists():
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            self._files.pop(file_path, None)
             return None
-        return FileFragments.from_json(p.read_text())
+        key = (fingerprint(st), self._journal_fingerprint(file_path))
+        cached = self._files.get(file_path)
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            self._files.move_to_end(file_path)
+            return cached[1]
+
+        self.misses += 1
+        # Read after the stat: the content is at least as new as the fingerprint
+        data = p.read_bytes()
+        ff = FileFragments.from_json(data.decode())
+        if key[1] is not None:
+            repaired = self._replay(file_path, ff, data)
+            if repaired is None:
+                # Left for the next writer to repair; until then, not cached
+                self._files.pop(file_path, None)
+                return ff
+            if repaired:
+                key = (key[0], self._journal_fingerprint(file_path))
+        self._remember(file_path, key, ff)
+        return ff
+
+    def _replay(self, file_path: str, ff: FileFragments, base: bytes) -> bool | None:
+        """Apply the journal to ff, loaded from the sidecar bytes base.
+
+        A journal written against another sidecar is ignored and a torn
+        tail is skipped. A writer holding the lock also removes them and
+        gets True back; anyone else gets None, as the journal still needs
+        repair. False means the journal was clean.
+        """
+        j = self._journal_path(file_path)
+        try:
+            data = j.read_bytes()
+        except FileNotFoundError:
+            return False
+        repair = file_path in self._held
+        # Records end with a newline; whatever follows the last one is torn
+        lines = data.split(b"\n")
+        try:
+            header = json.loads(lines[0]) if len(lines) > 1 else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("base") != _digest(base):
+            if not repair:
+                return None
+            j.unlink(missing_ok=True)
+            return True
+
+        valid = len(lines[0]) + 1
+        for line in lines[1:-1]:
+            try:
+                _apply(ff, json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                break
+            ff.generation += 1
+            valid += len(line) + 1
+        if valid == len(data):
+            return False
+        if not repair:
+            return None
+        with j.open("r+b") as fh:
+            fh.truncate(valid)
+        return True
+
+    def save_file(self, file_frags: FileFragments, expected_generation: int | None = None) -> None:
+        """Write a file's fragments in full, replacing the sidecar atomically.
+
+        With expected_generation, raises ConflictError if the saved file is
+        no longer at that generation (someone else saved it since).
+        """
+        with self._lock(file_frags.file):
+            current = self.load_file(file_frags.file)
+            generation = current.generation if current is not None else 0
+            if expected_generation is not None and expected_generation != generation:
+                raise ConflictError(
+                    f"{file_frags.file} is at generation {generation}, expected {expected_generation}"
+                )
+            file_frags.generation = generation + 1
+            p = self._frag_path(file_frags.file)
+            atomic_write(p, SIDECAR_FORMATS[self.sidecar_format](file_frags).encode(), self.fsync)
+            # Everything in the journal is in the new sidecar now
+            self._journal_path(file_frags.file).unlink(missing_ok=True)
+            self._remember(file_frags.file, (fingerprint(p.stat()), None), file_frags)
+
+    def update_file(
+        self,
+        file_path: str,
+        change: Callable[[FileFragments], None],
+        retries: int = UPDATE_RETRIES,
+    ) -> FileFragments:
+        """Apply change to a copy of a file's fragments and save it, optimistically.
+
+        change runs without the lock, so it may be slow. If another writer
+        saved the file meanwhile, it is run again on a fresh copy, up to
+        retries more times before ConflictError. Returns what was saved.
+        """
+        for _ in range(retries + 1):
+            current = self.load_file(file_path)
+            if current is None:
+                raise ValidationError(f"No fragments for {file_path}")
+            ff = FileFragments.from_dict(current.to_dict())
+            change(ff)
+            try:
+                self.save_file(ff, expected_generation=current.generation)
+            except ConflictError:
+                continue
+            return ff
+        raise ConflictError(f"{file_path} kept changing; gave up after {retries + 1} attempts")
+
+    def _commit(self, ff: FileFragments, record: dict) -> None:
+        """Persist one mutation, already applied to ff.
+
+        Called with the file locked and ff freshly loaded. ff is the cached
+        copy, changed in place; if persisting fails it is dropped from the
+        cache, so the next load reads what actually reached disk.
+        """
+        try:
+            self._persist(ff, record)
+        except BaseException:
+            self._files.pop(ff.file, None)
+            raise
+
+    def _persist(self, ff: FileFragments, record: dict) -> None:
+        """Write one mutation of ff: a journal record, or a full save."""
+        p = self._frag_path(ff.file)
+        if not self.journal or not p.exists():
+            self.save_file(ff)
+            return
+        j = self._journal_path(ff.file)
+        with j.open("ab") as fh:
+            if fh.tell() == 0:
+                fh.write(json.dumps({"base": _digest(p.read_bytes())}).encode() + b"\n")
+            fh.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            if self.fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+            size = fh.tell()
+        ff.generation += 1
+        st = p.stat()
+        self._remember(ff.file, (fingerprint(st), fingerprint(j.stat())), ff)
+        if size > max(self.journal_compact_bytes, st.st_size):
+            self.save_file(ff)
+
+    def save_files(self, files: Iterable[FileFragments]) -> int:
+        """Save many files' fragments, e.g. an import. Returns the number saved.
+
+        The saved files are not kept in memory.
+        """
+        count = 0
+        for ff in files:
+            self.save_file(ff)
+            self.invalidate(ff.file)
+            count += 1
+        return count
+
+    def _remember(self, file_path: str, fingerprint: tuple, ff: FileFragments) -> None:
+        self._files[file_path] = (fingerprint, ff)
+        self._files.move_to_end(file_path)
+        if self.max_cached_files is not None:
+            while len(self._files) > self.max_cached_files:
+                self._files.popitem(last=False)
+
+    def invalidate(self, file_path: str | None = None) -> None:
+        """Forget the in-memory copy of one sidecar, or of all of them."""
+        if file_path is None:
+            self._files.clear()
+        else:
+            self._files.pop(file_path, None)
+
+    def cache_stats(self) -> StoreCacheStats:
+        return StoreCacheStats(
+            entries=len(self._files),
+            max_entries=self.max_cached_files,
+            hits=self.hits,
+            misses=self.misses,
+        )
 
-    def save_file(self, file_frags: FileFragments) -> None:
-        p = self._frag_path(file_frags.file)
-        p.parent.mkdir(parents=True, exist_ok=True)
-        p.write_text(file_frags.to_json())
+    # --- source snapshots ---
 
     def load_cache(self, file_path: str) -> str | None:
-        p = self._cache_path(file_path)
-        if not p.exists():
-            return None
-        return p.read_text()
+        """The text of a file when its fragments were last anchored."""
+        return self.snapshots.load(file_path)
 
     def save_cache(self, file_path: str, content: str) -> None:
-        p = self._cache_path(file_path)
-        p.parent.mkdir(parents=True, exist_ok=True)
-        p.write_text(content)
+        self.snapshots.save(file_path, content)
+
+    def save_cache_file(self, file_path: str, source: Path) -> None:
+        """save_cache() with the text of a file on disk, streamed rather than read whole."""
+        self.snapshots.save_file(file_path, source)
+
+    def gc_cache(self) -> int:
+        """Delete snapshots no file with fragments refers to. Returns files deleted."""
+        return self.snapshots.gc(keep=self.list_files())
 
     @staticmethod
     def content_hash(content: str) -> str:
@@ -70,10 +521,7 @@ class FragmentStore:
         ff = self.load_file(file_path)
         if ff is None:
             return None
-        for f in ff.fragments:
-            if f.id == fragment_id:
-                return f
-        return None
+        return ff.get(fragment_id)
 
     def get_fragment_by_name(self, file_path: str, name: str) -> Fragment | None:
         ff = self.load_file(file_path)
@@ -88,51 +536,56 @@ class FragmentStore:
         ff = self.load_file(file_path)
         if ff is None:
             return []
-        child_ids: set[str] = set()
-        for f in ff.fragments:
-            child_ids.update(f.children)
-        return [f for f in ff.fragments if f.id not in child_ids]
+        return ff.roots()
 
     def get_children(self, file_path: str, fragment_id: str) -> list[Fragment]:
         ff = self.load_file(file_path)
         if ff is None:
             return []
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            return []
-        by_id = {f.id: f for f in ff.fragments}
-        return [by_id[cid] for cid in frag.children if cid in by_id]
+        return ff.children_of(fragment_id)
 
     def fragment_at(self, file_path: str, line: int, col: int) -> Fragment | None:
+        """The deepest fragment containing (line, col)."""
         ff = self.load_file(file_path)
         if ff is None:
             return None
-        best: Fragment | None = None
-        for f in ff.fragments:
-            r = f.range
-            start = (r.start_line, r.start_col)
-            end = (r.end_line, r.end_col)
-            pos = (line, col)
-            if start <= pos < end:
-                if best is None or f.range.contains(best.range):
-                    pass  # best is more specific
-                elif best.range.contains(f.range):
-                    best = f  # f is more specific (smaller)
-                else:
-                    best = f
-        # Actually, we want the deepest (most specific) fragment
-        best = None
-        for f in ff.fragments:
-            r = f.range
-            start = (r.start_line, r.start_col)
-            end = (r.end_line, r.end_col)
-            pos = (line, col)
-            if start <= pos < end:
-                if best is None:
-                    best = f
-                elif best.range.contains(f.range) and f.range != best.range:
-                    best = f  # f is strictly inside best, so more specific
-        return best
+        return ff.fragment_at(line, col)
+
+    def fragments_at(self, file_path: str, positions: list[tuple[int, int]]) -> list[Fragment | None]:
+        """fragment_at() for many positions at once, e.g. every line of a gutter."""
+        ff = self.load_file(file_path)
+        if ff is None:
+            return [None] * len(positions)
+        return ff.fragments_at(positions)
+
+    # --- project-wide queries ---
+
+    def list_files(self) -> list[str]:
+        """Source files with saved fragments, sorted."""
+        if not self.fragments_dir.is_dir():
+            return []
+        return sorted(
+            p.relative_to(self.fragments_dir).as_posix()[:-len(".json")]
+            for p in self.fragments_dir.rglob("*.json")
+        )
+
+    def find_fragments(self, name: str) -> list[Fragment]:
+        """Fragments called name, in any file."""
+        found: list[Fragment] = []
+        for file_path in self.list_files():
+            ff = self.load_file(file_path)
+            if ff is not None:
+                found.extend(f for f in ff.fragments if f.name == name)
+        return found
+
+    def orphaned_fragments(self) -> list[Fragment]:
+        """Fragments whose code could not be re-anchored, in any file."""
+        found: list[Fragment] = []
+        for file_path in self.list_files():
+            ff = self.load_file(file_path)
+            if ff is not None:
+                found.extend(f for f in ff.fragments if f.range.is_orphaned())
+        return found
 
     # --- mutations ---
 
@@ -144,194 +597,178 @@ class FragmentStore:
         parent_id: str | None = None,
         prose: str | None = None,
     ) -> Fragment:
-        ff = self.load_file(file_path)
-        if ff is None:
-            source_path = self.project_root / file_path
-            content = source_path.read_text() if source_path.exists() else ""
-            ff = FileFragments(
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                source_path = self.project_root / file_path
+                content = source_path.read_text() if source_path.exists() else ""
+                ff = FileFragments(
+                    file=file_path,
+                    content_hash=self.content_hash(content),
+                    fragments=[],
+                )
+
+            # Validate unique name
+            for f in ff.fragments:
+                if f.name == name:
+                    raise ValidationError(f"Fragment name '{name}' already exists in {file_path}")
+
+            frag = Fragment(
+                id=_new_id(),
+                name=name,
                 file=file_path,
-                content_hash=self.content_hash(content),
-                fragments=[],
+                range=range,
+                children=[],
+                prose=prose,
             )
 
-        # Validate unique name
-        for f in ff.fragments:
-            if f.name == name:
-                raise ValidationError(f"Fragment name '{name}' already exists in {file_path}")
-
-        frag = Fragment(
-            id=_new_id(),
-            name=name,
-            file=file_path,
-            range=range,
-            children=[],
-            prose=prose,
-        )
-
-        if parent_id is not None:
-            parent = self._find_fragment(ff, parent_id)
-            if parent is None:
-                raise ValidationError(f"Parent fragment '{parent_id}' not found")
-            if not parent.range.contains(range):
-                raise ValidationError(
-                    f"Child range {range} not contained by parent range {parent.range}"
-                )
-            # Check no overlap with existing siblings
-            by_id = {f.id: f for f in ff.fragments}
-            for sib_id in parent.children:
-                sib = by_id.get(sib_id)
-                if sib and sib.range.overlaps(range):
+            if parent_id is not None:
+                parent = ff.get(parent_id)
+                if parent is None:
+                    raise ValidationError(f"Parent fragment '{parent_id}' not found")
+                if not parent.range.contains(range):
+                    raise ValidationError(
+                        f"Child range {range} not contained by parent range {parent.range}"
+                    )
+                # Check no overlap with existing siblings
+                sib = ff.overlapping_sibling(parent_id, range)
+                if sib is not None:
                     raise ValidationError(
                         f"New fragment overlaps with sibling '{sib.name}'"
                     )
-            parent.children.append(frag.id)
-        else:
-            # Root fragment — check no overlap with other roots
-            roots = self._get_roots(ff)
-            for root in roots:
-                if root.range.overlaps(range):
+            else:
+                # Root fragment — check no overlap with other roots
+                root = ff.overlapping_sibling(None, range)
+                if root is not None:
                     raise ValidationError(
                         f"New fragment overlaps with root fragment '{root.name}'"
                     )
 
-        ff.fragments.append(frag)
-        self.save_file(ff)
-        return frag
+            ff.add(frag, parent_id)
+            self._commit(ff, {"op": "add", "fragment": frag.to_dict(), "parent": parent_id})
+            return frag
 
     def delete_fragment(self, file_path: str, fragment_id: str) -> None:
-        ff = self.load_file(file_path)
-        if ff is None:
-            raise ValidationError(f"No fragments for {file_path}")
-
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            raise ValidationError(f"Fragment '{fragment_id}' not found")
-
-        # Reparent children to parent (or make them roots)
-        parent = self._find_parent(ff, fragment_id)
-        if parent is not None:
-            idx = parent.children.index(fragment_id)
-            parent.children = (
-                parent.children[:idx] + frag.children + parent.children[idx + 1:]
-            )
-        # else children become roots (no action needed, they're just not in any parent's children list)
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                raise ValidationError(f"No fragments for {file_path}")
 
-        # Remove the fragment
-        ff.fragments = [f for f in ff.fragments if f.id != fragment_id]
-        self.save_file(ff)
+            if ff.get(fragment_id) is None:
+                raise ValidationError(f"Fragment '{fragment_id}' not found")
+
+            # Children take the fragment's place in its parent (or become roots)
+            ff.remove(fragment_id)
+            self._commit(ff, {"op": "remove", "id": fragment_id})
 
     def rename_fragment(self, file_path: str, fragment_id: str, new_name: str) -> None:
-        ff = self.load_file(file_path)
-        if ff is None:
-            raise ValidationError(f"No fragments for {file_path}")
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                raise ValidationError(f"No fragments for {file_path}")
 
-        # Check unique name
-        for f in ff.fragments:
-            if f.name == new_name and f.id != fragment_id:
-                raise ValidationError(f"Fragment name '{new_name}' already exists")
+            # Check unique name
+            for f in ff.fragments:
+                if f.name == new_name and f.id != fragment_id:
+                    raise ValidationError(f"Fragment name '{new_name}' already exists")
 
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            raise ValidationError(f"Fragment '{fragment_id}' not found")
+            frag = ff.get(fragment_id)
+            if frag is None:
+                raise ValidationError(f"Fragment '{fragment_id}' not found")
 
-        frag.name = new_name
-        self.save_file(ff)
+            frag.name = new_name
+            self._commit(ff, {"op": "rename", "id": fragment_id, "name": new_name})
 
     def resize_fragment(self, file_path: str, fragment_id: str, new_range: Range) -> None:
-        ff = self.load_file(file_path)
-        if ff is None:
-            raise ValidationError(f"No fragments for {file_path}")
-
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            raise ValidationError(f"Fragment '{fragment_id}' not found")
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                raise ValidationError(f"No fragments for {file_path}")
+
+            frag = ff.get(fragment_id)
+            if frag is None:
+                raise ValidationError(f"Fragment '{fragment_id}' not found")
+
+            # Validate: new range must still contain all children
+            for child in ff.children_of(fragment_id):
+                if not new_range.contains(child.range):
+                    raise ValidationError(
+                        f"New range does not contain child '{child.name}'"
+                    )
 
-        # Validate: new range must still contain all children
-        by_id = {f.id: f for f in ff.fragments}
-        for cid in frag.children:
-            child = by_id.get(cid)
-            if child and not new_range.contains(child.range):
+            # Validate: new range must still be within parent (if any)
+            parent = ff.parent_of(fragment_id)
+            if parent is not None and not parent.range.contains(new_range):
                 raise ValidationError(
-                    f"New range does not contain child '{child.name}'"
+                    f"New range not contained by parent '{parent.name}'"
                 )
 
-        # Validate: new range must still be within parent (if any)
-        parent = self._find_parent(ff, fragment_id)
-        if parent is not None and not parent.range.contains(new_range):
-            raise ValidationError(
-                f"New range not contained by parent '{parent.name}'"
-            )
-
-        # Validate: no overlap with siblings
-        if parent is not None:
-            for sib_id in parent.children:
-                if sib_id == fragment_id:
-                    continue
-                sib = by_id.get(sib_id)
-                if sib and sib.range.overlaps(new_range):
+            # Validate: no overlap with siblings
+            if parent is not None:
+                sib = ff.overlapping_sibling(parent.id, new_range, exclude=fragment_id)
+                if sib is not None:
                     raise ValidationError(
                         f"New range overlaps with sibling '{sib.name}'"
                     )
-        else:
-            # Check root siblings
-            roots = self._get_roots(ff)
-            for root in roots:
-                if root.id == fragment_id:
-                    continue
-                if root.range.overlaps(new_range):
+            else:
+                # Check root siblings
+                root = ff.overlapping_sibling(None, new_range, exclude=fragment_id)
+                if root is not None:
                     raise ValidationError(
                         f"New range overlaps with root '{root.name}'"
                     )
 
-        frag.range = new_range
-        self.save_file(ff)
+            ff.set_range(fragment_id, new_range)
+            self._commit(ff, {"op": "range", "id": fragment_id, "range": [
+                new_range.start_line, new_range.start_col, new_range.end_line, new_range.end_col,
+            ]})
 
     def move_fragment(self, file_path: str, fragment_id: str, new_parent_id: str | None) -> None:
-        ff = self.load_file(file_path)
-        if ff is None:
-            raise ValidationError(f"No fragments for {file_path}")
-
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            raise ValidationError(f"Fragment '{fragment_id}' not found")
-
-        # Remove from old parent
-        old_parent = self._find_parent(ff, fragment_id)
-        if old_parent is not None:
-            old_parent.children.remove(fragment_id)
-
-        if new_parent_id is not None:
-            new_parent = self._find_fragment(ff, new_parent_id)
-            if new_parent is None:
-                raise ValidationError(f"New parent '{new_parent_id}' not found")
-            if not new_parent.range.contains(frag.range):
-                raise ValidationError("Fragment range not contained by new parent")
-            # Check no overlap with new siblings
-            by_id = {f.id: f for f in ff.fragments}
-            for sib_id in new_parent.children:
-                sib = by_id.get(sib_id)
-                if sib and sib.range.overlaps(frag.range):
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                raise ValidationError(f"No fragments for {file_path}")
+
+            frag = ff.get(fragment_id)
+            if frag is None:
+                raise ValidationError(f"Fragment '{fragment_id}' not found")
+
+            # Validate before touching the (possibly cached) fragments
+            if new_parent_id is not None:
+                new_parent = ff.get(new_parent_id)
+                if new_parent is None:
+                    raise ValidationError(f"New parent '{new_parent_id}' not found")
+                if not new_parent.range.contains(frag.range):
+                    raise ValidationError("Fragment range not contained by new parent")
+                # Check no overlap with new siblings
+                sib = ff.overlapping_sibling(new_parent_id, frag.range, exclude=fragment_id)
+                if sib is not None:
                     raise ValidationError(f"Overlaps with sibling '{sib.name}'")
-            new_parent.children.append(fragment_id)
 
-        self.save_file(ff)
+            ff.move(fragment_id, new_parent_id)
+            self._commit(ff, {"op": "move", "id": fragment_id, "parent": new_parent_id})
 
     def set_prose(self, file_path: str, fragment_id: str, prose: str | None) -> None:
-        ff = self.load_file(file_path)
-        if ff is None:
-            raise ValidationError(f"No fragments for {file_path}")
+        with self._lock(file_path):
+            ff = self.load_file(file_path)
+            if ff is None:
+                raise ValidationError(f"No fragments for {file_path}")
 
-        frag = self._find_fragment(ff, fragment_id)
-        if frag is None:
-            raise ValidationError(f"Fragment '{fragment_id}' not found")
+            frag = ff.get(fragment_id)
+            if frag is None:
+                raise ValidationError(f"Fragment '{fragment_id}' not found")
 
-        frag.prose = prose
-        self.save_file(ff)
+            frag.prose = prose
+            self._commit(ff, {"op": "prose", "id": fragment_id, "prose": prose})
 
     # --- validation ---
 
     def validate(self, file_path: str) -> list[str]:
-        """Returns list of validation error messages. Empty = valid."""
+        """Returns list of validation error messages. Empty = valid.
+
+        Errors come grouped by check (names, children, sibling overlaps,
+        root overlaps, cycles), each in fragment and children order.
+        """
         ff = self.load_file(file_path)
         if ff is None:
             return []
@@ -360,33 +797,23 @@ class FragmentStore:
 
         # Check sibling overlaps
         for f in ff.fragments:
+            if len(f.children) < 2:
+                continue
             children = [by_id[cid] for cid in f.children if cid in by_id]
-            for i, a in enumerate(children):
-                for b in children[i + 1:]:
-                    if a.range.overlaps(b.range):
-                        errors.append(f"Siblings '{a.name}' and '{b.name}' overlap")
+            for i, j in _overlapping_pairs([c.range for c in children]):
+                errors.append(f"Siblings '{children[i].name}' and '{children[j].name}' overlap")
 
         # Check root overlaps
-        roots = self._get_roots(ff)
-        for i, a in enumerate(roots):
-            for b in roots[i + 1:]:
-                if a.range.overlaps(b.range):
-                    errors.append(f"Root fragments '{a.name}' and '{b.name}' overlap")
-
-        # Check no cycles (child is not an ancestor)
-        def ancestors(fid: str) -> set[str]:
-            result: set[str] = set()
-            for f in ff.fragments:
-                if fid in f.children:
-                    result.add(f.id)
-                    result.update(ancestors(f.id))
-            return result
+        child_ids = {cid for f in ff.fragments for cid in f.children}
+        roots = [f for f in ff.fragments if f.id not in child_ids]
+        for i, j in _overlapping_pairs([r.range for r in roots]):
+            errors.append(f"Root fragments '{roots[i].name}' and '{roots[j].name}' overlap")
 
+        # Check no cycles (a fragment is its own ancestor)
+        cyclic = _cyclic_ids(ff.fragments)
         for f in ff.fragments:
-            for cid in f.children:
-                if f.id in ancestors(f.id):
-                    errors.append(f"Cycle detected involving fragment '{f.name}'")
-                    break
+            if f.children and f.id in cyclic:
+                errors.append(f"Cycle detected involving fragment '{f.name}'")
 
         return errors
 
@@ -423,25 +850,24 @@ class FragmentStore:
 
         return errors
 
-    # --- helpers ---
 
-    @staticmethod
-    def _find_fragment(ff: FileFragments, fragment_id: str) -> Fragment | None:
-        for f in ff.fragments:
-            if f.id == fragment_id:
-                return f
-        return None
+def iter_saved(store: FragmentStore) -> Iterator[FileFragments]:
+    """Every file's fragments in store, read one at a time and not kept in memory."""
+    for file_path in store.list_files():
+        ff = store.load_file(file_path)
+        if ff is not None:
+            store.invalidate(file_path)
+            yield ff
 
-    @staticmethod
-    def _find_parent(ff: FileFragments, fragment_id: str) -> Fragment | None:
-        for f in ff.fragments:
-            if fragment_id in f.children:
-                return f
-        return None
 
-    @staticmethod
-    def _get_roots(ff: FileFragments) -> list[Fragment]:
-        child_ids: set[str] = set()
-        for f in ff.fragments:
-            child_ids.update(f.children)
-        return [f for f in ff.fragments if f.id not in child_ids]
+def open_store(project_root: Path, **kwargs) -> FragmentStore:
+    """The project's store, using the backend named in .pyweb/config.json.
+
+    "backend": "sqlite" selects SqliteFragmentStore; anything else (or no
+    config) the JSON sidecars.
+    """
+    if load_config(project_root).get("backend") == "sqlite":
+        from pyweb.core.sqlstore import SqliteFragmentStore
+
+        return SqliteFragmentStore(project_root, **kwargs)
+    return FragmentStore(project_root, **kwargs)
@@ -0,0 +1,173 @@
+"""Strip @pyweb marker and prose lines from sources, streaming.
+
+Files are read and written one line at a time, so memory stays bounded by
+the fragment tree rather than the file size. Everything except the marker
+lines passes through byte for byte (line endings and undecodable bytes
+included). The fragments can be emitted at the same time as sidecar
+FileFragments, with ranges mapped onto the stripped file's lines, so the
+tree can be loaded into a FragmentStore over the stripped sources.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import shutil
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import TextIO
+
+from pyweb.core.models import FileFragments, Fragment, Range
+from pyweb.core.parser import SENTINEL, ParseWarning, TreeBuilder, classify_marker
+from pyweb.core.project import is_binary, map_batches
+from pyweb.core.store import FragmentStore
+
+# Line breaks str.splitlines() honours that newline="" text iteration does not
+_OTHER_BREAKS = re.compile("[\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+@dataclass
+class StripResult:
+    file: str
+    dropped: int                            # marker and prose lines removed
+    fragments: FileFragments | None = None  # None for copied (binary) files
+    warnings: list[ParseWarning] = field(default_factory=list)
+
+
+def strip_lines(lines: Iterable[str], write, file_path: str = "") -> StripResult:
+    """Pass every non-marker line of `lines` to `write`, in one pass.
+
+    Lines are numbered as str.splitlines() would number the whole text, so
+    fragment ranges agree with parse_markers() and the FragmentStore.
+    """
+    builder = TreeBuilder()
+    # Lines that do not start a stripped line: dropped markers, and a line
+    # starting with LF that joins a CR-terminated line once the markers
+    # between them are gone
+    shifts: list[int] = []
+    dropped = 0
+    digest = hashlib.sha256()
+    after_cr = False
+    n = 0
+    for chunk in lines:
+        for line in chunk.splitlines(keepends=True) if _OTHER_BREAKS.search(chunk) else (chunk,):
+            if SENTINEL in line:
+                marker = classify_marker(line)
+                if marker is not None:
+                    builder.feed(n, *marker)
+                    shifts.append(n)
+                    dropped += 1
+                    n += 1
+                    continue
+            write(line)
+            hashed = line
+            if after_cr and line[0] == "\n":
+                shifts.append(n)
+                hashed = line[1:]
+            after_cr = line[-1] == "\r"
+            # Hash as FragmentStore.content_hash() sees the text (universal newlines)
+            if "\r" in hashed[-2:]:
+                hashed = hashed.rstrip("\r\n") + "\n"
+            digest.update(hashed.encode("utf-8", "surrogateescape"))
+            n += 1
+
+    result = builder.finish(n, keep_markers=False)
+
+    def stripped(line: int) -> int:
+        return line - bisect_left(shifts, line)
+
+    ff = FileFragments(
+        file=file_path,
+        content_hash="sha256:" + digest.hexdigest(),
+        fragments=[
+            Fragment(
+                id=f.id,
+                name=f.name,
+                file=file_path,
+                range=Range(stripped(f.content_start_line), 0, stripped(f.content_end_line), 0),
+                children=list(f.children),
+                prose=f.prose,
+            )
+            for f in result.fragments
+        ],
+    )
+    return StripResult(file=file_path, dropped=dropped, fragments=ff, warnings=result.warnings)
+
+
+def _open_text(path: Path, mode: str = "r") -> TextIO:
+    # newline="" keeps line endings as they are; surrogateescape keeps any bytes
+    return path.open(mode, encoding="utf-8", errors="surrogateescape", newline="")
+
+
+def strip_file(path: Path, out: TextIO, file_path: str = "") -> StripResult:
+    """Stream one text file into `out` without its marker lines."""
+    with _open_text(path) as src:
+        return strip_lines(src, out.write, file_path or path.name)
+
+
+def strip_to_mirror(
+    project_root: Path,
+    file_path: str,
+    out_root: Path,
+    sidecars: bool = False,
+) -> StripResult:
+    """Strip project_root/file_path into out_root/file_path (binary files are copied).
+
+    With sidecars, the fragments and a cache snapshot of the stripped file
+    are saved to out_root's FragmentStore.
+    """
+    src = project_root / file_path
+    dst = out_root / file_path
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if is_binary(src):
+        shutil.copyfile(src, dst)
+        return StripResult(file=file_path, dropped=0)
+
+    with _open_text(dst, "w") as out:
+        result = strip_file(src, out, file_path)
+    if sidecars and result.fragments.fragments:
+        store = FragmentStore(out_root)
+        store.save_file(result.fragments)
+        store.save_cache_file(file_path, dst)
+    return result
+
+
+def _strip_chunk(
+    project_root: str,
+    files: list[str],
+    out_root: str,
+    sidecars: bool,
+) -> list[tuple[str, StripResult | None]]:
+    """Worker entry point: strip a batch of files, skipping unreadable ones."""
+    root, out = Path(project_root), Path(out_root)
+    results: list[tuple[str, StripResult | None]] = []
+    for rel in files:
+        try:
+            results.append((rel, strip_to_mirror(root, rel, out, sidecars)))
+        except OSError:
+            results.append((rel, None))
+    return results
+
+
+def strip_project(
+    project_root: Path,
+    files: list[str],
+    out_root: Path,
+    workers: int | None = None,
+    sidecars: bool = False,
+) -> Iterator[tuple[str, StripResult | None]]:
+    """Strip files into a mirror tree across a process pool.
+
+    Yields (file, result) as files finish; result is None for unreadable
+    files. With sidecars, out_root is set up as a pyweb project and each
+    file's fragments are saved to its FragmentStore.
+    """
+    if sidecars:
+        out_root.mkdir(parents=True, exist_ok=True)
+        FragmentStore(out_root).init()
+    return map_batches(
+        partial(_strip_chunk, str(project_root), out_root=str(out_root), sidecars=sidecars),
+        files, workers,
+    )
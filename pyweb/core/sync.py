@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
 
 from pyweb.core.models import Fragment, Range, FileFragments
 from pyweb.core.store import FragmentStore
-from pyweb.core.anchorer import DiffAnchorer
+from pyweb.core.anchorer import DiffAnchorer, DiffProvider, LineEdit
+from pyweb.core.document import Document
+from pyweb.core.fsutil import fingerprint, racily_clean
 from pyweb.core.sourcemap import SourceMap
 
 
@@ -16,10 +19,61 @@ class HierarchicalNode:
     children: list[HierarchicalNode] = field(default_factory=list)
 
 
+@dataclass
+class _OpenDocument:
+    fingerprint: tuple[int, int, int]   # (mtime_ns, size, inode) when read or written
+    read_ns: int                        # wall clock just before the read or write
+    digest: str                         # content hash of the text read or written
+    doc: Document
+
+
 class SyncEngine:
-    def __init__(self, store: FragmentStore, project_root: Path) -> None:
+    def __init__(
+        self, store: FragmentStore, project_root: Path, diff: DiffProvider | None = None,
+    ) -> None:
         self.store = store
         self.project_root = project_root
+        # Line edits for on_source_changed
+        self.diff = diff if diff is not None else DiffProvider()
+        # Open documents, keyed by file
+        self._documents: dict[str, _OpenDocument] = {}
+
+    def document(self, file_path: str) -> Document:
+        """The source file as a Document, reused across edits until the file changes on disk.
+
+        A stat match is trusted only when the file's mtime is safely older
+        than the read; a racily clean file (possibly edited again in the same
+        timestamp tick) is hashed again first.
+        """
+        source_path = self.project_root / file_path
+        st = source_path.stat()
+        cached = self._documents.get(file_path)
+        if cached is not None and cached.fingerprint == fingerprint(st):
+            if not racily_clean(st.st_mtime_ns, cached.read_ns):
+                return cached.doc
+            read_ns = time.time_ns()
+            if FragmentStore.content_hash(source_path.read_text()) == cached.digest:
+                cached.read_ns = read_ns
+                return cached.doc
+        read_ns = time.time_ns()
+        text = source_path.read_text()
+        doc = Document(text)
+        # The stat from before the read: a change during it shows up next time
+        self._documents[file_path] = _OpenDocument(
+            fingerprint(st), read_ns, FragmentStore.content_hash(text), doc,
+        )
+        return doc
+
+    def _write_document(self, file_path: str, doc: Document) -> str:
+        source_path = self.project_root / file_path
+        content = str(doc)
+        written_ns = time.time_ns()
+        source_path.write_text(content)
+        st = source_path.stat()
+        self._documents[file_path] = _OpenDocument(
+            fingerprint(st), written_ns, FragmentStore.content_hash(content), doc,
+        )
+        return content
 
     def expanded_view(self, file_path: str) -> str:
         """Returns the source file content (this IS the expanded view)."""
@@ -40,9 +94,7 @@ class SyncEngine:
         smap = SourceMap(ff)
 
         def build_node(frag: Fragment) -> HierarchicalNode:
-            by_id = {f.id: f for f in ff.fragments}
-            child_frags = [by_id[cid] for cid in frag.children
-                           if cid in by_id and not by_id[cid].range.is_orphaned()]
+            child_frags = [c for c in ff.children_of(frag.id) if not c.range.is_orphaned()]
             child_frags.sort(key=lambda f: (f.range.start_line, f.range.start_col))
 
             # Extract code owned by this fragment (lines within range, excluding child ranges)
@@ -75,14 +127,20 @@ class SyncEngine:
         if ff is None:
             return
 
-        edits = DiffAnchorer.compute_line_edits(old_content, new_content)
+        edits = self.diff.line_edits(file_path, old_content, new_content)
         if not edits:
             return
+        self._reanchor(file_path, edits, new_content)
+
+    def _reanchor(self, file_path: str, edits: list[LineEdit], new_content: str) -> None:
+        content_hash = self.store.content_hash(new_content)
+
+        def reanchor(ff: FileFragments) -> None:
+            ff.fragments = DiffAnchorer.apply_edits(ff.fragments, edits)
+            ff.content_hash = content_hash
 
-        updated = DiffAnchorer.apply_edits(ff.fragments, edits)
-        ff.fragments = updated
-        ff.content_hash = self.store.content_hash(new_content)
-        self.store.save_file(ff)
+        # Re-run on the latest fragments if another writer saved meanwhile
+        self.store.update_file(file_path, reanchor)
         self.store.save_cache(file_path, new_content)
 
     def on_fragment_content_changed(self, file_path: str, fragment_id: str, new_code: str) -> str:
@@ -104,26 +162,27 @@ class SyncEngine:
         if frag is None:
             raise ValueError(f"Fragment '{fragment_id}' not found")
 
-        source_path = self.project_root / file_path
-        old_content = source_path.read_text()
-        old_lines = old_content.splitlines(keepends=True)
-
+        doc = self.document(file_path)
         r = frag.range
-        # Build new content: lines before fragment + new code + lines after fragment
-        before = old_lines[:r.start_line]
-        after = old_lines[r.end_line:]
+        start = min(r.start_line, doc.line_count)
+        end = max(start, min(r.end_line, doc.line_count))
 
         # Ensure new_code ends with newline for clean joining
         if new_code and not new_code.endswith("\n"):
             new_code += "\n"
 
-        new_content = "".join(before) + new_code + "".join(after)
+        # Only the fragment's lines changed, so diff just those to re-anchor
+        old_code = doc.line_span(start, end)
+        edits = [
+            LineEdit(e.line + start, e.old_count, e.new_count)
+            for e in DiffAnchorer.compute_line_edits(old_code, new_code)
+        ]
 
-        # Write the new content
-        source_path.write_text(new_content)
+        doc.replace_lines(start, end, new_code)
+        new_content = self._write_document(file_path, doc)
 
-        # Re-anchor all fragments
-        self.on_source_changed(file_path, old_content, new_content)
+        if edits:
+            self._reanchor(file_path, edits, new_content)
 
         return new_content
 
@@ -176,10 +235,7 @@ class SyncEngine:
                 continue
 
             all_lines = source_path.read_text().splitlines(keepends=True)
-            by_id = {frag.id: frag for frag in ff.fragments}
-
-            child_frags = [by_id[cid] for cid in f.children
-                           if cid in by_id and not by_id[cid].range.is_orphaned()]
+            child_frags = [c for c in ff.children_of(f.id) if not c.range.is_orphaned()]
             child_frags.sort(key=lambda cf: (cf.range.start_line, cf.range.start_col))
 
             child_nodes_by_id = {cn.fragment.id: cn for cn in node.children}
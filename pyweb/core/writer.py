@@ -1,8 +1,13 @@
 """Insert, remove, and modify @pyweb markers in source files."""
 from __future__ import annotations
 
+import re
+from dataclasses import dataclass
+
 from pyweb.core.comments import CommentStyle, get_comment_style
-from pyweb.core.parser import parse_markers, get_fragment_by_id, ParsedFragment
+from pyweb.core.document import Document
+from pyweb.core.lineindex import LineIndex
+from pyweb.core.parser import parse_markers, parse_stream, get_fragment_by_id, ParsedFragment
 from pyweb.core.models import _new_id
 
 
@@ -33,14 +38,7 @@ def add_fragment(
         content = lines[start_line]
         indent = content[: len(content) - len(content.lstrip())]
 
-    start_marker = indent + comment_style.wrap(f'@pyweb:start id="{fid}" name="{name}"') + "\n"
-
-    prose_lines: list[str] = []
-    if prose:
-        for pl in prose.split("\n"):
-            prose_lines.append(indent + comment_style.wrap(f"@pyweb:prose {pl}") + "\n")
-
-    end_marker = indent + comment_style.wrap(f'@pyweb:end id="{fid}"') + "\n"
+    start_marker, prose_lines, end_marker = _marker_lines(fid, name, indent, comment_style, prose)
 
     new_lines = (
         lines[:start_line]
@@ -54,15 +52,24 @@ def add_fragment(
     return "".join(new_lines), fid
 
 
+def _drop_lines(index: LineIndex, remove_lines: set[int]) -> str:
+    """Join the text of every line not in remove_lines, one slice per kept run."""
+    parts: list[str] = []
+    pos = 0
+    for line in sorted(remove_lines):
+        parts.append(index.line_span(pos, line))
+        pos = line + 1
+    parts.append(index.line_span(pos, index.line_count))
+    return "".join(parts)
+
+
 def remove_fragment(source: str, fragment_id: str) -> str:
     """Remove all markers (start, prose, end) for a fragment. Keeps the code."""
-    result = parse_markers(source)
-    frag = get_fragment_by_id(result.fragments, fragment_id)
+    result = parse_markers(source, with_index=True)
+    frag = get_fragment_by_id(result, fragment_id)
     if frag is None:
         raise ValueError(f"Fragment '{fragment_id}' not found")
 
-    lines = source.splitlines(keepends=True)
-
     # Collect line numbers to remove (markers and prose)
     remove_lines: set[int] = set()
     remove_lines.add(frag.start_line)
@@ -75,26 +82,27 @@ def remove_fragment(source: str, fragment_id: str) -> str:
         # end_line is exclusive, so the actual end marker is at end_line - 1
         remove_lines.add(frag.end_line - 1)
 
-    new_lines = [ln for i, ln in enumerate(lines) if i not in remove_lines]
-    return "".join(new_lines)
+    return _drop_lines(result.line_index, remove_lines)
 
 
 def rename_fragment(source: str, fragment_id: str, new_name: str) -> str:
     """Change the name in a fragment's start marker."""
-    result = parse_markers(source)
-    frag = get_fragment_by_id(result.fragments, fragment_id)
+    result = parse_markers(source, with_index=True)
+    frag = get_fragment_by_id(result, fragment_id)
     if frag is None:
         raise ValueError(f"Fragment '{fragment_id}' not found")
 
-    lines = source.splitlines(keepends=True)
-    old_line = lines[frag.start_line]
+    index = result.line_index
+    old_line = index.line(frag.start_line)
 
     # Replace name="old" with name="new"
-    import re
     new_line = re.sub(r'name="[^"]*"', f'name="{new_name}"', old_line)
-    lines[frag.start_line] = new_line
 
-    return "".join(lines)
+    return (
+        source[:index.offset(frag.start_line)]
+        + new_line
+        + source[index.offset(frag.start_line + 1):]
+    )
 
 
 def set_prose(
@@ -108,34 +116,110 @@ def set_prose(
     if comment_style is None:
         comment_style = get_comment_style(file_path)
 
-    result = parse_markers(source)
-    frag = get_fragment_by_id(result.fragments, fragment_id)
+    result = parse_markers(source, with_index=True)
+    frag = get_fragment_by_id(result, fragment_id)
     if frag is None:
         raise ValueError(f"Fragment '{fragment_id}' not found")
 
-    lines = source.splitlines(keepends=True)
+    index = result.line_index
 
     # Detect indentation from start marker
-    start_content = lines[frag.start_line]
-    indent = start_content[: len(start_content) - len(start_content.lstrip())]
+    indent = index.indent(frag.start_line)
 
-    # Remove existing prose lines
-    old_prose_lines: set[int] = set()
-    for i in range(frag.start_line + 1, frag.content_start_line):
-        old_prose_lines.add(i)
+    # Replace the existing prose lines (between start marker and content)
+    new_prose_lines = []
+    if prose:
+        for pl in prose.split("\n"):
+            new_prose_lines.append(indent + comment_style.wrap(f"@pyweb:prose {pl}") + "\n")
 
-    filtered = [ln for i, ln in enumerate(lines) if i not in old_prose_lines]
+    return (
+        source[:index.offset(frag.start_line + 1)]
+        + "".join(new_prose_lines)
+        + source[index.offset(frag.content_start_line):]
+    )
+
+
+class _LinesWithout:
+    """The source's lines with some line ranges removed, without copying them.
+
+    Supports len(), indexing and slice-to-text with list semantics (negative
+    and out-of-range indices behave as for a list of lines).
+    """
 
+    def __init__(self, index: LineIndex, removed: list[tuple[int, int]]) -> None:
+        self.index = index
+        # Kept runs of original lines, in order: (orig_start, orig_end)
+        self.runs: list[tuple[int, int]] = []
+        pos = 0
+        for lo, hi in removed:
+            if lo > pos:
+                self.runs.append((pos, lo))
+            pos = max(pos, hi)
+        if pos < index.line_count:
+            self.runs.append((pos, index.line_count))
+        self.length = sum(hi - lo for lo, hi in self.runs)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, k: int) -> str:
+        if k < 0:
+            k += self.length
+        if not 0 <= k < self.length:
+            raise IndexError("list index out of range")
+        for lo, hi in self.runs:
+            if k < hi - lo:
+                return self.index.line(lo + k)
+            k -= hi - lo
+        raise AssertionError("unreachable")
+
+    def text(self, start: int | None, stop: int | None) -> str:
+        """"".join(lines[start:stop]) as at most one slice per kept run."""
+        start, stop, _ = slice(start, stop).indices(self.length)
+        parts: list[str] = []
+        k = 0
+        for lo, hi in self.runs:
+            a = max(start - k, 0)
+            b = min(stop - k, hi - lo)
+            if a < b:
+                parts.append(self.index.line_span(lo + a, lo + b))
+            k += hi - lo
+        return "".join(parts)
+
+
+class _LineList:
+    """List-of-lines counterpart of _LinesWithout, for sources with lone CRs."""
+
+    def __init__(self, text: str) -> None:
+        self.lines = text.splitlines(keepends=True)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __getitem__(self, k: int) -> str:
+        return self.lines[k]
+
+    def text(self, start: int | None, stop: int | None) -> str:
+        return "".join(self.lines[start:stop])
+
+
+def _marker_lines(
+    fid: str,
+    name: str,
+    indent: str,
+    comment_style: CommentStyle,
+    prose: str | None,
+) -> tuple[str, list[str], str]:
+    """Build the (start marker, prose lines, end marker) for a fragment."""
+    start_marker = indent + comment_style.wrap(f'@pyweb:start id="{fid}" name="{name}"') + "\n"
+
+    prose_lines: list[str] = []
     if prose:
-        # Insert new prose after start marker
-        # Find where start marker is in filtered list
-        insert_at = frag.start_line + 1 - 0  # offset from removed lines above start is 0
-        new_prose_lines = []
         for pl in prose.split("\n"):
-            new_prose_lines.append(indent + comment_style.wrap(f"@pyweb:prose {pl}") + "\n")
-        filtered = filtered[:insert_at] + new_prose_lines + filtered[insert_at:]
+            prose_lines.append(indent + comment_style.wrap(f"@pyweb:prose {pl}") + "\n")
 
-    return "".join(filtered)
+    end_marker = indent + comment_style.wrap(f'@pyweb:end id="{fid}"') + "\n"
+    return start_marker, prose_lines, end_marker
 
 
 def resize_fragment(
@@ -150,94 +234,315 @@ def resize_fragment(
 
     new_start_line/new_end_line are the desired content boundaries (0-indexed, end exclusive).
     The markers will be placed around this range.
+
+    Works in one pass over the line index: the old start, prose and end
+    marker lines are skipped and the new markers spliced in while copying
+    the remaining lines as a handful of slices.
     """
     if comment_style is None:
         comment_style = get_comment_style(file_path)
 
-    result = parse_markers(source)
-    frag = get_fragment_by_id(result.fragments, fragment_id)
+    result = parse_markers(source, with_index=True)
+    frag = get_fragment_by_id(result, fragment_id)
     if frag is None:
         raise ValueError(f"Fragment '{fragment_id}' not found")
 
-    # Step 1: Remove old markers
-    source_no_markers = remove_fragment(source, fragment_id)
-
-    # Step 2: Re-parse to get clean line numbers
-    # But we need to account for line shifts from removing markers.
-    # Simpler: just re-add at the new positions.
-    # The positions need adjustment for removed lines above them.
-    lines_removed_before_start = 0
-    lines_removed_before_end = 0
+    # Old marker lines: start marker + prose, and the end marker
+    removed = [(frag.start_line, frag.content_start_line)]
+    if frag.end_line > 0 and frag.end_line - 1 >= frag.content_start_line:
+        removed.append((frag.end_line - 1, frag.end_line))
 
-    old_lines = source.splitlines(keepends=True)
-    remove_set: set[int] = {frag.start_line}
-    for i in range(frag.start_line + 1, frag.content_start_line):
-        remove_set.add(i)
-    if frag.end_line > 0:
-        remove_set.add(frag.end_line - 1)
+    if result.markers is None:
+        # Lone CRs: dropping a line can join its neighbours, so re-split the
+        # text exactly as removing the markers and re-reading it would.
+        lines = _LineList(_drop_lines(result.line_index, {
+            i for lo, hi in removed for i in range(lo, hi)
+        }))
+    else:
+        lines = _LinesWithout(result.line_index, removed)
 
-    for rl in sorted(remove_set):
-        if rl < new_start_line:
-            lines_removed_before_start += 1
-        if rl < new_end_line:
-            lines_removed_before_end += 1
+    # Shift the requested positions for marker lines that disappear above them
+    def adjust(line: int) -> int:
+        return line - sum(max(0, min(hi, line) - lo) for lo, hi in removed)
 
-    adj_start = new_start_line - lines_removed_before_start
-    adj_end = new_end_line - lines_removed_before_end
-
-    # Step 3: Re-add markers at adjusted positions
-    new_source, _ = add_fragment(
-        source_no_markers, file_path, frag.name,
-        adj_start, adj_end, comment_style, frag.prose,
-    )
-
-    # Fix the ID to keep the original
-    new_source = new_source.replace(
-        new_source.split('@pyweb:start id="')[1].split('"')[0] if '@pyweb:start' in new_source else "",
-        "",  # this approach is fragile
-    )
-
-    # Actually, let's do this more carefully: remove, then re-insert with original ID
-    return _add_fragment_with_id(
-        source_no_markers, file_path, frag.id, frag.name,
-        adj_start, adj_end, comment_style, frag.prose,
-    )
-
-
-def _add_fragment_with_id(
-    source: str,
-    file_path: str,
-    fid: str,
-    name: str,
-    start_line: int,
-    end_line: int,
-    comment_style: CommentStyle,
-    prose: str | None = None,
-) -> str:
-    """Insert markers with a specific ID (used by resize to preserve ID)."""
-    lines = source.splitlines(keepends=True)
+    adj_start = adjust(new_start_line)
+    adj_end = adjust(new_end_line)
 
     indent = ""
-    if start_line < len(lines):
-        content = lines[start_line]
+    if adj_start < len(lines):
+        content = lines[adj_start]
         indent = content[: len(content) - len(content.lstrip())]
 
-    start_marker = indent + comment_style.wrap(f'@pyweb:start id="{fid}" name="{name}"') + "\n"
-
-    prose_lines: list[str] = []
-    if prose:
-        for pl in prose.split("\n"):
-            prose_lines.append(indent + comment_style.wrap(f"@pyweb:prose {pl}") + "\n")
-
-    end_marker = indent + comment_style.wrap(f'@pyweb:end id="{fid}"') + "\n"
-
-    new_lines = (
-        lines[:start_line]
-        + [start_marker]
-        + prose_lines
-        + lines[start_line:end_line]
-        + [end_marker]
-        + lines[end_line:]
+    start_marker, prose_lines, end_marker = _marker_lines(
+        frag.id, frag.name, indent, comment_style, frag.prose,
     )
 
-    return "".join(new_lines)
+    return "".join([
+        lines.text(None, adj_start),
+        start_marker,
+        *prose_lines,
+        lines.text(adj_start, adj_end),
+        end_marker,
+        lines.text(adj_end, None),
+    ])
+
+
+@dataclass
+class _PendingFragment:
+    """Queued state of one fragment in a Batch."""
+
+    id: str
+    name: str
+    prose: str | None
+    frag: ParsedFragment | None = None      # None for fragments added by the batch
+    start: int = 0                          # new content range, when placed
+    end: int = 0
+    placed: bool = False                    # markers (re)inserted at start/end
+    renamed: bool = False
+    prose_set: bool = False
+    removed: bool = False
+    seq: int = 0
+
+
+class Batch:
+    """Queue marker edits against one parse and apply them as one splice.
+
+    All line numbers refer to the source the batch was created from,
+    whatever else is queued. Operations are validated when queued (unknown
+    ids, out-of-range lines, editing a removed fragment raise ValueError),
+    and apply() checks that the new ranges nest with each other and with the
+    fragments left in place (ValueError if two cross) before building the
+    new source in one pass over the line index.
+
+        with Batch(source, "main.py") as batch:
+            fid = batch.add("setup", 0, 4)
+            batch.set_prose(fid, "Build the fixtures")
+            batch.remove(old_id)
+        new_source = batch.result
+
+    The source may also be a Document, which apply_in_place() (and the
+    context manager) edits directly instead of building a new string.
+    """
+
+    def __init__(
+        self,
+        source: str | Document,
+        file_path: str = "",
+        comment_style: CommentStyle | None = None,
+    ) -> None:
+        self.source = source
+        self.file_path = file_path
+        self.comment_style = comment_style if comment_style is not None else get_comment_style(file_path)
+        self.index: LineIndex | Document
+        if isinstance(source, Document):
+            self.parsed = parse_stream(source.iter_lines(), file_path)
+            self.index = source
+        else:
+            self.parsed = parse_markers(source, file_path, with_index=True)
+            self.index = self.parsed.line_index
+        self.pending: dict[str, _PendingFragment] = {}
+        self.result: str | None = None
+
+    def __enter__(self) -> Batch:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            return
+        if isinstance(self.source, Document):
+            self.apply_in_place()
+        else:
+            self.result = self.apply()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def _fragment(self, fragment_id: str) -> _PendingFragment:
+        p = self.pending.get(fragment_id)
+        if p is None:
+            frag = self.parsed.get(fragment_id)
+            if frag is None:
+                raise ValueError(f"Fragment '{fragment_id}' not found")
+            p = self.pending[fragment_id] = _PendingFragment(
+                id=frag.id, name=frag.name, prose=frag.prose, frag=frag, seq=len(self.pending),
+            )
+        if p.removed:
+            raise ValueError(f"Fragment '{fragment_id}' is already removed in this batch")
+        return p
+
+    def _check_range(self, start_line: int, end_line: int) -> None:
+        if not 0 <= start_line <= end_line <= self.index.line_count:
+            raise ValueError(
+                f"Invalid line range [{start_line} - {end_line}] "
+                f"for {self.index.line_count} lines"
+            )
+
+    # --- queued operations ---
+
+    def add(self, name: str, start_line: int, end_line: int, prose: str | None = None) -> str:
+        """Queue new markers around [start_line, end_line). Returns the new fragment id."""
+        self._check_range(start_line, end_line)
+        fid = _new_id()
+        self.pending[fid] = _PendingFragment(
+            id=fid, name=name, prose=prose, start=start_line, end=end_line,
+            placed=True, seq=len(self.pending),
+        )
+        return fid
+
+    def remove(self, fragment_id: str) -> None:
+        p = self._fragment(fragment_id)
+        if p.frag is None:
+            del self.pending[fragment_id]
+        else:
+            p.removed = True
+
+    def rename(self, fragment_id: str, new_name: str) -> None:
+        p = self._fragment(fragment_id)
+        p.name = new_name
+        p.renamed = True
+
+    def set_prose(self, fragment_id: str, prose: str | None) -> None:
+        p = self._fragment(fragment_id)
+        p.prose = prose
+        p.prose_set = True
+
+    def resize(self, fragment_id: str, start_line: int, end_line: int) -> None:
+        """Move a fragment's markers around [start_line, end_line) of the batch's source."""
+        self._check_range(start_line, end_line)
+        p = self._fragment(fragment_id)
+        p.start, p.end = start_line, end_line
+        p.placed = True
+
+    # --- application ---
+
+    def _check_nesting(self) -> None:
+        """Raise ValueError if a queued add or resize crosses another fragment.
+
+        Every fragment is an interval on a doubled line axis: a queued range
+        [start, end) puts its markers before lines start and end (2*start,
+        2*end); a fragment left in place spans from just after its start
+        marker to just after its last content line, so queued markers land
+        inside it exactly when they are in its content. Properly nested
+        intervals pass a single stack sweep.
+        """
+        placed = [p for p in self.pending.values() if p.placed and not p.removed]
+        if not placed:
+            return
+        touched = {p.id for p in self.pending.values() if p.removed or p.placed}
+        intervals: list[tuple[int, int, str]] = [(2 * p.start, 2 * p.end, p.name) for p in placed]
+        # Between a start marker and its last prose line: no room for markers
+        inside_markers: dict[int, str] = {}
+        for f in self.parsed.fragments:
+            if f.id in touched:
+                continue
+            intervals.append((2 * f.start_line + 1, 2 * f.content_end_line + 1, f.name))
+            for line in range(f.start_line + 1, f.content_start_line):
+                inside_markers[line] = f.name
+        for p in placed:
+            for line in (p.start, p.end):
+                if line in inside_markers:
+                    raise ValueError(
+                        f"Fragment '{p.name}' [{p.start} - {p.end}] puts a marker inside "
+                        f"the markers of '{inside_markers[line]}'"
+                    )
+
+        intervals.sort(key=lambda iv: (iv[0], -iv[1]))
+        stack: list[tuple[int, int, str]] = []
+        for iv in intervals:
+            while stack and stack[-1][1] <= iv[0]:
+                stack.pop()
+            if stack and iv[1] > stack[-1][1]:
+                raise ValueError(f"Fragments '{stack[-1][2]}' and '{iv[2]}' cross")
+            stack.append(iv)
+
+    def _splices(self) -> list[tuple[int, str, bool]]:
+        """(line, text, replaces_line) edits in line order.
+
+        text goes before the original line, which is dropped when
+        replaces_line is set.
+        """
+        self._check_nesting()
+        index = self.index
+        cs = self.comment_style
+        deleted: set[int] = set()
+        replaced: dict[int, str] = {}
+        # position -> [(sort key, text)] inserted before that original line
+        inserts: dict[int, list[tuple[tuple, str]]] = {}
+
+        for p in self.pending.values():
+            f = p.frag
+            if f is not None and (p.removed or p.placed):
+                deleted.update(range(f.start_line, f.content_start_line))
+                if f.end_line > 0:
+                    deleted.add(f.end_line - 1)
+
+        def content_indent(line: int) -> str:
+            """Indent of the first line at or after `line` that survives, as resize_fragment takes it."""
+            while line in deleted:
+                line += 1
+            return index.indent(line)
+
+        for p in self.pending.values():
+            f = p.frag
+            if p.removed:
+                continue
+
+            if p.placed:
+                start_marker, prose_lines, end_marker = _marker_lines(
+                    p.id, p.name, content_indent(p.start), cs, p.prose,
+                )
+                # At one position: ends (inner first), then empty fragments,
+                # then starts (outer first), so the markers nest
+                if p.start < p.end:
+                    start_key: tuple = (2, -p.end, p.seq)
+                    end_key: tuple = (0, -p.start, -p.seq)
+                else:
+                    start_key, end_key = (1, p.seq, 0), (1, p.seq, 1)
+                inserts.setdefault(p.start, []).append((start_key, start_marker + "".join(prose_lines)))
+                inserts.setdefault(p.end, []).append((end_key, end_marker))
+                continue
+
+            if p.renamed or p.prose_set:
+                line = index.line(f.start_line)
+                if p.renamed:
+                    line = re.sub(r'name="[^"]*"', f'name="{p.name}"', line)
+                if p.prose_set:
+                    _, prose_lines, _ = _marker_lines(
+                        p.id, p.name, index.indent(f.start_line), cs, p.prose,
+                    )
+                    line += "".join(prose_lines)
+                    deleted.update(range(f.start_line + 1, f.content_start_line))
+                replaced[f.start_line] = line
+
+        splices: list[tuple[int, str, bool]] = []
+        for line in sorted(deleted | replaced.keys() | inserts.keys()):
+            text = "".join(t for _, t in sorted(inserts.get(line, ()), key=lambda kt: kt[0]))
+            drop = line < index.line_count and (line in deleted or line in replaced)
+            splices.append((line, text + replaced.get(line, "") if drop else text, drop))
+        return splices
+
+    def apply(self) -> str:
+        """Return the source with every queued operation applied."""
+        index = self.index
+        parts: list[str] = []
+        pos = 0
+        for line, text, drop in self._splices():
+            parts.append(index.line_span(pos, line))
+            parts.append(text)
+            pos = line + 1 if drop else line
+        parts.append(index.line_span(pos, index.line_count))
+        return "".join(parts)
+
+    def apply_in_place(self) -> Document:
+        """Apply every queued operation to the batch's Document, bottom-up."""
+        doc = self.source
+        if not isinstance(doc, Document):
+            raise TypeError("apply_in_place() needs a Batch created from a Document")
+        # Offsets are taken before editing; a splice never moves text above it
+        edits = [
+            (doc.offset(line), doc.offset(line + 1) if drop else doc.offset(line), text)
+            for line, text, drop in self._splices()
+        ]
+        for start, end, text in reversed(edits):
+            doc.splice(start, end, text)
+        return doc
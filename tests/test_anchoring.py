@@ -0,0 +1,130 @@
+"""Tests for project-wide anchoring with stat-based change detection."""
+import os
+
+import pytest
+
+from pyweb.core import anchoring
+from pyweb.core.anchoring import (
+    ANCHORED, NO_SNAPSHOT, UNCHANGED, UNREADABLE, anchor_project, load_index,
+)
+from pyweb.core.models import Range
+from pyweb.core.store import FragmentStore
+
+TEXT = "".join(f"line{i}\n" for i in range(10))
+
+
+def _write(path, text):
+    """Write text as an edit made a while ago: a fresh mtime is racily clean."""
+    path.write_text(text)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - 10**10))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FragmentStore(tmp_path)
+    store.init()
+    for name in ("a.py", "b.py", "c.py"):
+        _write(tmp_path / name, TEXT)
+        store.create_fragment(name, "head", Range(0, 0, 2, 0))
+        store.create_fragment(name, "tail", Range(5, 0, 8, 0))
+        store.save_cache(name, TEXT)
+    return store
+
+
+def _range(store, file_path, name):
+    r = store.get_fragment_by_name(file_path, name).range
+    return r.start_line, r.end_line
+
+
+class TestAnchorProject:
+    def test_first_pass_hashes_then_stat_skips(self, store):
+        report = anchor_project(store, workers=1)
+        assert [r.status for r in report.results] == [UNCHANGED] * 3
+        assert report.hashed == 3 and report.stat_matched == 0
+        assert set(load_index(store)) == {"a.py", "b.py", "c.py"}
+
+        report = anchor_project(store, workers=1)
+        assert report.hashed == 0 and report.stat_matched == 3
+        assert set(report.timings) == {"stat", "hash", "anchor", "total"}
+
+    def test_changed_file_is_anchored(self, store, tmp_path):
+        anchor_project(store, workers=1)
+        _write(tmp_path / "b.py", "new\nnew\n" + TEXT)
+
+        report = anchor_project(store, workers=1)
+        [result] = report.with_status(ANCHORED)
+        assert (result.file, result.shifted, result.orphaned) == ("b.py", 2, 0)
+        assert report.hashed == 1 and report.stat_matched == 2
+        assert _range(store, "b.py", "tail") == (7, 10)
+        assert store.load_cache("b.py") == "new\nnew\n" + TEXT
+
+        report = anchor_project(store, workers=1)
+        assert report.stat_matched == 3 and not report.with_status(ANCHORED)
+
+    def test_orphaned_counted(self, store, tmp_path):
+        (tmp_path / "a.py").write_text(TEXT.replace("line0\nline1\n", ""))
+        [result] = anchor_project(store, ["a.py"], workers=1).results
+        assert (result.status, result.shifted, result.orphaned) == (ANCHORED, 1, 1)
+        assert store.get_fragment_by_name("a.py", "head").range.is_orphaned()
+
+    def test_touched_file_is_hashed_not_anchored(self, store, tmp_path, monkeypatch):
+        anchor_project(store, workers=1)
+        st = (tmp_path / "a.py").stat()
+        os.utime(tmp_path / "a.py", ns=(st.st_atime_ns, st.st_mtime_ns - 10**9))
+        monkeypatch.setattr(anchoring, "anchor_file", pytest.fail)
+
+        report = anchor_project(store, workers=1)
+        assert report.hashed == 1 and report.stat_matched == 2
+        assert [r.status for r in report.results] == [UNCHANGED] * 3
+        assert anchor_project(store, workers=1).stat_matched == 3
+
+    def test_racily_clean_edit_is_hashed(self, store, tmp_path):
+        anchor_project(store, workers=1)
+        path = tmp_path / "a.py"
+        st = path.stat()
+        # Index written in the same timestamp tick as the file's mtime
+        index = tmp_path / ".pyweb" / "cache" / anchoring.INDEX_NAME
+        os.utime(index, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # A same-size edit that leaves the mtime (and inode) as recorded
+        path.write_text(TEXT.replace("line0", "LINE0"))
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert path.stat().st_ino == st.st_ino
+
+        report = anchor_project(store, workers=1)
+        assert report.stat_matched == 0
+        assert [r.status for r in report.results] == [ANCHORED, UNCHANGED, UNCHANGED]
+        assert store.load_cache("a.py") == TEXT.replace("line0", "LINE0")
+        # The rewritten index is newer than every mtime in it
+        assert anchor_project(store, workers=1).stat_matched == 3
+
+    def test_new_snapshot_invalidates_fingerprint(self, store, tmp_path):
+        anchor_project(store, workers=1)
+        # The snapshot moves on without the file changing, e.g. another tool saved it
+        store.save_cache("c.py", "line0\n" + TEXT)
+        report = anchor_project(store, workers=1)
+        assert report.stat_matched == 2
+        assert report.results[2].status == ANCHORED
+
+    def test_missing_snapshot_and_source(self, store, tmp_path):
+        store.snapshots.gc(keep=["a.py", "b.py"])
+        (tmp_path / "b.py").unlink()
+        report = anchor_project(store, workers=1)
+        assert [r.status for r in report.results] == [UNCHANGED, UNREADABLE, NO_SNAPSHOT]
+        assert set(load_index(store)) == {"a.py"}
+
+    def test_subset_keeps_other_entries(self, store):
+        anchor_project(store, workers=1)
+        report = anchor_project(store, ["b.py"], workers=1)
+        assert [r.file for r in report.results] == ["b.py"]
+        assert set(load_index(store)) == {"a.py", "b.py", "c.py"}
+
+    def test_parallel(self, store, tmp_path):
+        for name in ("a.py", "b.py", "c.py"):
+            _write(tmp_path / name, "x\n" + TEXT)
+        report = anchor_project(store, workers=2)
+        assert [r.status for r in report.results] == [ANCHORED] * 3
+        assert report.shifted == 6
+        for name in ("a.py", "b.py", "c.py"):
+            assert _range(store, name, "tail") == (6, 9)
+        assert anchor_project(store, workers=2).stat_matched == 3
@@ -0,0 +1,130 @@
+"""Tests for AST/indentation-driven automatic fragmentation."""
+import pytest
+
+from pyweb.core.autofrag import (
+    autofrag_file, autofrag_project, autofrag_source, indent_regions, python_regions,
+)
+from pyweb.core.parser import parse_markers
+
+
+PY_SRC = '''import os
+
+
+@decorator
+class Foo(Base):
+    """Doc."""
+
+    def a(self):
+        return 1
+
+    @property
+    async def b(self):
+        def inner():
+            pass
+        return inner
+
+
+def top(x):
+    return x
+'''
+
+JS_SRC = '''import x from "y";
+
+export function foo(a, b) {
+  if (a) {
+    return b;
+  }
+  return a;
+}
+
+class Bar {
+  method(x) {
+    return x;
+  }
+}
+
+void main(int argc)
+{
+    return 0;
+}
+'''
+
+
+def _tree(source: str) -> list[tuple[str, str | None]]:
+    result = parse_markers(source)
+    assert result.warnings == []
+    return [(f.name, result.get(f.parent_id).name if f.parent_id else None) for f in result.fragments]
+
+
+class TestPythonRegions:
+    def test_classes_functions_methods(self):
+        regions = python_regions(PY_SRC)
+        assert [(r.name, r.start_line, r.end_line) for r in regions] == [
+            ("Foo", 3, 15), ("Foo.a", 7, 9), ("Foo.b", 10, 15), ("top", 17, 19),
+        ]
+
+    def test_syntax_error_is_none(self):
+        assert python_regions("def broken(:\n") is None
+
+    def test_form_feed_lines(self):
+        src = "def a():\n    pass\n\x0c\ndef b():\n    return 1\n"
+        regions = python_regions(src)
+        lines = src.splitlines()
+        assert [lines[r.start_line] for r in regions] == ["def a():", "def b():"]
+
+
+class TestIndentRegions:
+    def test_braces_and_nesting(self):
+        regions = indent_regions(JS_SRC)
+        lines = JS_SRC.splitlines()
+        assert [r.name for r in regions] == ["foo", "Bar", "method", "main"]
+        assert all(lines[r.end_line - 1].strip() == "}" for r in regions)
+
+    def test_control_blocks_are_not_definitions(self):
+        assert indent_regions("if (x) {\n  y();\n}\nfor (;;) {\n  z();\n}\n") == []
+
+
+class TestAutofragSource:
+    def test_nested_markers_in_one_pass(self):
+        new, added = autofrag_source(PY_SRC, "m.py")
+        assert added == 4
+        assert _tree(new) == [("Foo", None), ("Foo.a", "Foo"), ("Foo.b", "Foo"), ("top", None)]
+        compile(new, "m.py", "exec")
+
+    def test_idempotent(self):
+        new, _ = autofrag_source(PY_SRC, "m.py")
+        assert autofrag_source(new, "m.py") == (new, 0)
+
+    def test_comment_style_from_extension(self):
+        new, added = autofrag_source(JS_SRC, "m.js")
+        assert added == 4
+        assert '// @pyweb:start id="' in new
+        assert _tree(new)[2] == ("method", "Bar")
+
+    def test_min_lines(self):
+        _, added = autofrag_source(PY_SRC, "m.py", min_lines=4)
+        assert added == 2   # Foo and Foo.b
+
+
+class TestAutofragFiles:
+    def test_keeps_crlf(self, tmp_path):
+        p = tmp_path / "a.js"
+        p.write_bytes(b"function f() {\r\n  return 1;\r\n}\r\n")
+        assert autofrag_file(p, "a.js") == 1
+        data = p.read_bytes()
+        assert data.count(b"\r\n") == 5 and b"\n" not in data.replace(b"\r\n", b"")
+
+    def test_skips_binary_and_dry_run(self, tmp_path):
+        (tmp_path / "b.py").write_bytes(b"def f():\x00\n")
+        assert autofrag_file(tmp_path / "b.py") is None
+        (tmp_path / "c.py").write_text(PY_SRC)
+        assert autofrag_file(tmp_path / "c.py", dry_run=True) == 4
+        assert (tmp_path / "c.py").read_text() == PY_SRC
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_project(self, tmp_path, workers):
+        for i in range(4):
+            (tmp_path / f"m{i}.py").write_text(PY_SRC)
+        files = [f"m{i}.py" for i in range(4)]
+        assert dict(autofrag_project(tmp_path, files, workers=workers)) == {f: 4 for f in files}
+        assert dict(autofrag_project(tmp_path, files, workers=workers)) == {f: 0 for f in files}
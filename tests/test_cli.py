@@ -156,6 +156,18 @@ class TestCheck:
         assert result.exit_code == 0
 
 
+class TestView:
+    def test_form_feed_above_fragment(self, runner, project):
+        (project / ".pyweb").mkdir()
+        (project / "m.py").write_text(
+            'a = 0\n\x0c\n# @pyweb:start id="f1" name="blk"\nx = 1\n# @pyweb:end id="f1"\n'
+        )
+        invoke(runner, project, ["ls", "m.py"])  # fill the parse cache
+        result = invoke(runner, project, ["view", "m.py"])
+        assert result.exit_code == 0
+        assert result.output == "=== blk ===\nx = 1\n"
+
+
 class TestExpand:
     def test_expand(self, runner, project):
         invoke(runner, project, ["init"])
@@ -214,8 +226,239 @@ class TestAnchor:
         assert "no cached content" in result.output
 
 
+class TestAnchorAll:
+    def test_reports_changed_files_and_phases(self, runner, project):
+        from pyweb.core.models import Range
+
+        store = FragmentStore(project)
+        store.init()
+        content = (project / "main.py").read_text()
+        for name in ("main.py", "other.py"):
+            (project / name).write_text(content)
+            store.create_fragment(name, "block", Range(5, 0, 8, 0))
+            store.save_cache(name, content)
+        (project / "main.py").write_text("new1\nnew2\n" + content)
+
+        result = invoke(runner, project, ["anchor", "--all", "-j", "1"])
+        assert result.exit_code == 0
+        assert "main.py: shifted 1 fragment, 0 orphaned" in result.output
+        assert "other.py" not in result.output
+        assert "Anchored 1 of 2 files" in result.output
+        assert "stat " in result.output and "hash " in result.output
+        assert store.get_fragment_by_name("main.py", "block").range.start_line == 7
+
+        result = invoke(runner, project, ["anchor", "--all"])
+        assert "Anchored 0 of 2 files" in result.output
+        assert "2 unchanged" in result.output
+
+    def test_anchor_requires_file_or_all(self, runner, project):
+        result = invoke(runner, project, ["anchor"])
+        assert result.exit_code == 1
+
+
 class TestRequireInit:
     def test_add_without_init(self, runner, project):
         result = invoke(runner, project, ["add", "main.py", "block", "0", "5"])
         assert result.exit_code == 1
         assert "init" in result.output.lower()
+
+
+class TestParseAll:
+    def test_streams_ndjson_and_summary(self, runner, project):
+        (project / "marked.py").write_text(
+            '# @pyweb:start id="f1" name="block"\nx = 1\n'
+        )
+        result = invoke(runner, project, ["parse", "--all", "-j", "1"])
+        assert result.exit_code == 0
+        docs = {d["file"]: d for d in map(json.loads, result.stdout.splitlines())}
+        assert set(docs) == {"main.py", "marked.py"}
+        assert docs["marked.py"]["fragments"][0]["name"] == "block"
+        assert "Parsed 2 files" in result.stderr
+        assert "marked.py: 1 warning" in result.stderr
+
+    def test_parse_requires_file_or_all(self, runner, project):
+        result = invoke(runner, project, ["parse"])
+        assert result.exit_code == 1
+
+
+class TestCacheCommands:
+    def test_cached_parse_and_clear(self, runner, project):
+        (project / ".pyweb").mkdir()
+        first = invoke(runner, project, ["parse", "main.py"])
+        second = invoke(runner, project, ["parse", "main.py"])
+        assert first.output == second.output
+
+        stats = invoke(runner, project, ["cache", "stats"])
+        assert "entries: 1" in stats.output
+
+        cleared = invoke(runner, project, ["cache", "clear"])
+        assert "Removed 1" in cleared.output
+
+    def test_snapshot_gc(self, runner, project):
+        store = FragmentStore(project)
+        store.init()
+        store.save_cache("main.py", "one\n")
+        store.save_cache("main.py", "two\n")
+        result = invoke(runner, project, ["cache", "gc"])
+        assert result.exit_code == 0
+        assert "Removed 2 snapshot files" in result.output
+
+    def test_snapshot_gc_on_sqlite_backend(self, runner, project):
+        from pyweb.core.models import Range
+        from pyweb.core.sqlstore import SqliteFragmentStore
+
+        FragmentStore(project).init()
+        (project / ".pyweb" / "config.json").write_text('{"version": 1, "backend": "sqlite"}')
+        store = SqliteFragmentStore(project)
+        store.create_fragment("main.py", "block", Range(0, 0, 5, 0))
+        store.save_cache("main.py", (project / "main.py").read_text())
+        store.close()
+
+        result = invoke(runner, project, ["cache", "gc"])
+        assert "Removed 0 snapshot files" in result.output
+        result = invoke(runner, project, ["anchor", "main.py"])
+        assert result.exit_code == 0
+        assert "up to date" in result.output
+
+
+class TestParseOffsets:
+    def test_offsets_and_columns(self, runner, project):
+        src = (
+            "x = 1\r\n"
+            '    # @pyweb:start id="f1" name="block"\r\n'
+            "    y = 2\r\n"
+            '    # @pyweb:end id="f1"\r\n'
+            '# @pyweb:start id="f2" name="open"\r\n'
+        )
+        (project / "main.py").write_bytes(src.encode())
+        result = invoke(runner, project, ["parse", "main.py"])
+        assert result.exit_code == 0
+        frags = {f["id"]: f for f in json.loads(result.output)["fragments"]}
+        f1 = frags["f1"]
+        assert src[f1["start_offset"]:].startswith('    # @pyweb:start id="f1"')
+        assert src[f1["end_offset"]:].startswith('# @pyweb:start id="f2"')
+        assert f1["start_col"] == 4
+        assert f1["end_col"] == len('    # @pyweb:end id="f1"')
+        assert frags["f2"]["end_offset"] == len(src)
+        assert frags["f2"]["end_col"] is None
+
+    def test_offsets_are_characters_and_cached(self, runner, project):
+        src = (
+            "s = 'héllo → wörld'\n"
+            '\t# @pyweb:start id="f1" name="é"\n'
+            "\tz = '∑'\x0c\n"
+            '\t# @pyweb:end id="f1" ✓\n'
+        )
+        (project / "main.py").write_bytes(src.encode())
+        (project / ".pyweb").mkdir()
+        first = invoke(runner, project, ["parse", "main.py"])
+        cached = invoke(runner, project, ["parse", "main.py"])
+        assert first.output == cached.output
+        [f1] = json.loads(cached.output)["fragments"]
+        assert src[f1["start_offset"]:].startswith('\t# @pyweb:start id="f1"')
+        assert f1["end_offset"] == len(src)
+        assert (f1["start_col"], f1["end_col"]) == (1, len('\t# @pyweb:end id="f1" ✓'))
+
+    def test_all_emits_offsets(self, runner, project):
+        src = 'a\n# @pyweb:start id="f1" name="b"\nc\n# @pyweb:end id="f1"\n'
+        (project / "main.py").write_text(src)
+        single = json.loads(invoke(runner, project, ["parse", "main.py"]).output)
+        result = runner.invoke(cli, ["-p", str(project), "parse", "--all", "-j", "1"])
+        docs = [json.loads(line) for line in result.stdout.splitlines()]
+        assert docs == [single]
+        assert docs[0]["fragments"][0]["start_offset"] == 2
+
+
+class TestBatch:
+    def _batch(self, runner, project, ops):
+        stdin = "".join(json.dumps(op) + "\n" for op in ops)
+        return runner.invoke(cli, ["-p", str(project), "batch", "main.py"], input=stdin)
+
+    def test_applies_all_ops_in_one_write(self, runner, project):
+        result = self._batch(runner, project, [
+            {"op": "add", "name": "outer", "start_line": 0, "end_line": 10, "prose": "All of it"},
+            {"op": "add", "name": "inner", "start_line": 2, "end_line": 4},
+        ])
+        assert result.exit_code == 0
+        assert "Applied 2 operations to main.py" in result.output
+        parsed = json.loads(invoke(runner, project, ["parse", "main.py"]).output)
+        frags = {f["name"]: f for f in parsed["fragments"]}
+        assert frags["inner"]["parent_id"] == frags["outer"]["id"]
+        assert frags["outer"]["prose"] == "All of it"
+        assert parsed["warnings"] == []
+
+    def test_invalid_op_writes_nothing(self, runner, project):
+        before = (project / "main.py").read_text()
+        result = self._batch(runner, project, [
+            {"op": "add", "name": "ok", "start_line": 0, "end_line": 2},
+            {"op": "rm", "id": "nope"},
+        ])
+        assert result.exit_code == 1
+        assert "line 2" in result.stderr
+        assert (project / "main.py").read_text() == before
+
+    @pytest.mark.parametrize("line, message", [
+        ("[1]", "line 1: expected a JSON object, got list"),
+        ('"x"', "line 1: expected a JSON object, got str"),
+        ("3", "line 1: expected a JSON object, got int"),
+        ('{"op": ["add"]}', "line 1: unknown op ['add']"),
+        ('{"op": "resize", "id": "x"}', "line 1: missing fields 'start_line', 'end_line'"),
+    ])
+    def test_malformed_op_reported(self, runner, project, line, message):
+        result = runner.invoke(cli, ["-p", str(project), "batch", "main.py"], input=line + "\n")
+        assert result.exit_code == 1
+        assert result.stderr == f"Error: {message}\n"
+
+    def test_crossing_adds_write_nothing(self, runner, project):
+        before = (project / "main.py").read_text()
+        result = self._batch(runner, project, [
+            {"op": "add", "name": "a", "start_line": 0, "end_line": 5},
+            {"op": "add", "name": "b", "start_line": 3, "end_line": 8},
+        ])
+        assert result.exit_code == 1
+        assert result.stderr == "Error: Fragments 'a' and 'b' cross\n"
+        assert (project / "main.py").read_text() == before
+
+
+class TestAutofrag:
+    def test_directory(self, runner, project):
+        (project / "pkg").mkdir()
+        (project / "pkg" / "mod.py").write_text("def f():\n    return 1\n\n\nclass C:\n    pass\n")
+        (project / "pkg" / "notes.txt").write_text("def f():\n    return 1\n")
+        result = invoke(runner, project, ["autofrag", "pkg", "-j", "1"])
+        assert result.exit_code == 0
+        assert "pkg/mod.py: 2 fragments" in result.output
+        assert "Added 2 fragments to 1 files" in result.output
+        assert "@pyweb" not in (project / "pkg" / "notes.txt").read_text()
+        names = [f["name"] for f in json.loads(
+            invoke(runner, project, ["parse", "pkg/mod.py"]).output)["fragments"]]
+        assert names == ["f", "C"]
+
+
+class TestStrip:
+    def _mark(self, runner, project):
+        invoke(runner, project, ["add", "main.py", "mid", "2", "5", "--prose", "Why."])
+
+    def test_stdout(self, runner, project):
+        before = (project / "main.py").read_text()
+        self._mark(runner, project)
+        result = invoke(runner, project, ["strip", "main.py"])
+        assert result.exit_code == 0
+        assert result.stdout == before
+        assert "Removed 3 marker lines from 1 files" in result.stderr
+
+    def test_mirror_with_sidecars(self, runner, project):
+        before = (project / "main.py").read_text()
+        self._mark(runner, project)
+        result = invoke(runner, project, ["strip", "-o", "dist", "--sidecars", "-j", "1"])
+        assert result.exit_code == 0
+        assert (project / "dist" / "main.py").read_text() == before
+        frag = FragmentStore(project / "dist").get_fragment_by_name("main.py", "mid")
+        assert (frag.range.start_line, frag.range.end_line, frag.prose) == (2, 5, "Why.")
+        # The output directory is not stripped into itself on a second run
+        assert invoke(runner, project, ["strip", "-o", "dist", "-j", "1"]).exit_code == 0
+        assert not (project / "dist" / "dist").exists()
+
+    def test_sidecars_need_output(self, runner, project):
+        result = invoke(runner, project, ["strip", "--sidecars"])
+        assert result.exit_code == 1
@@ -0,0 +1,79 @@
+"""Tests for the struct-of-arrays parse result."""
+import random
+
+import pytest
+
+from pyweb.core.compact import CompactParseResult, parse_markers_compact
+from pyweb.core.parser import parse_markers
+
+
+SRC = (
+    '# @pyweb:start id="p" name="parent"\n'
+    '# @pyweb:prose Line one.\n'
+    '# @pyweb:prose Line two.\n'
+    '# @pyweb:start id="c1" name="child"\n'
+    'x = 1\n'
+    '# @pyweb:end id="c1"\n'
+    '# @pyweb:start id="c2" name="child"\n'
+    '# @pyweb:end id="p"\n'
+    '# @pyweb:start id="q" name="open"\n'
+)
+
+
+def _random_source(rng: random.Random) -> str:
+    ids = ["a", "b", "c", "d", "e", "f"]
+    out = []
+    for _ in range(rng.randrange(0, 40)):
+        roll = rng.random()
+        fid = rng.choice(ids)
+        if roll < 0.15:
+            out.append(f'# @pyweb:start id="{fid}" name="n{rng.randrange(3)}"\n')
+        elif roll < 0.3:
+            out.append(f'# @pyweb:end id="{fid}"\n')
+        elif roll < 0.4:
+            out.append(f"# @pyweb:prose text {rng.randrange(3)}\n")
+        else:
+            out.append("code\n")
+    return "".join(out)
+
+
+class TestCompactParse:
+    def test_matches_parse_markers(self):
+        compact = parse_markers_compact(SRC)
+        assert compact.to_result() == parse_markers(SRC)
+        assert compact.line_count == 9
+
+    def test_columns(self):
+        compact = parse_markers_compact(SRC)
+        p = compact.find("p")
+        assert compact.name_of(p) == "parent"
+        assert [compact.id_of(c) for c in compact.children_of(p)] == ["c1", "c2"]
+        assert compact.prose_lines_of(p) == ["Line one.", "Line two."]
+        assert [compact.id_of(r) for r in compact.roots()] == ["p", "q"]
+        assert compact.find("missing") == -1
+
+    def test_shared_string_table(self):
+        compact = parse_markers_compact(SRC)
+        # both children are named "child": one table entry
+        assert compact.strings.count("child") == 1
+        assert compact.names[compact.find("c1")] == compact.names[compact.find("c2")]
+
+    def test_lazy_view(self):
+        compact = parse_markers_compact(SRC)
+        assert len(compact) == 4
+        assert compact.get("c2") == parse_markers(SRC).get("c2")
+        assert compact.get("missing") is None
+        assert [f.id for f in compact] == ["p", "c1", "c2", "q"]
+
+    def test_from_result_round_trip(self):
+        result = parse_markers(SRC)
+        assert CompactParseResult.from_result(result).to_result() == result
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_randomized(self, seed):
+        rng = random.Random(seed)
+        for _ in range(200):
+            src = _random_source(rng)
+            expected = parse_markers(src)
+            assert parse_markers_compact(src).to_result() == expected
+            assert CompactParseResult.from_result(expected).to_result() == expected
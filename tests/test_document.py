@@ -0,0 +1,81 @@
+"""Tests for the editable block-of-lines Document."""
+import random
+
+import pytest
+
+from pyweb.core import document
+from pyweb.core.document import Document
+from pyweb.core.lineindex import LineIndex
+
+
+TEXT = "alpha\n    beta\r\ngamma"
+
+
+def _random_text(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(["a", "b", " ", "\n", "\r", "\r\n", "\x0c"]) for _ in range(rng.randint(0, n)))
+
+
+class TestDocument:
+    def test_queries_match_line_index(self):
+        doc = Document(TEXT)
+        idx = LineIndex(TEXT)
+        assert doc.line_count == idx.line_count
+        assert len(doc) == len(TEXT)
+        for line in range(idx.line_count + 1):
+            assert doc.offset(line) == idx.offset(line)
+        for off in range(len(TEXT)):
+            assert doc.position(off) == idx.position(off)
+        assert doc.line(1) == "    beta\r\n"
+        assert doc.line_span(0, 2) == "alpha\n    beta\r\n"
+        assert doc.indent(1) == "    "
+        assert doc.line_length(1) == 8
+
+    def test_splice_joins_and_splits_lines(self):
+        doc = Document("one\ntwo\nthree\n")
+        doc.splice(3, 4, " ")             # join line 0 and 1
+        assert list(doc.iter_lines()) == ["one two\n", "three\n"]
+        doc.splice(0, 0, "zero\n")
+        assert doc.line(0) == "zero\n"
+        doc.splice(len(doc), len(doc), "four")
+        assert doc.line(doc.line_count - 1) == "four"
+        assert str(doc) == "zero\none two\nthree\nfour"
+
+    def test_cr_lf_pairing_across_edits(self):
+        doc = Document("a\rX\nb\n")
+        doc.splice(2, 3, "")              # "a\r" + "\n" becomes one break
+        assert list(doc.iter_lines()) == ["a\r\n", "b\n"]
+        doc.splice(2, 2, "Y")             # and splits again
+        assert list(doc.iter_lines()) == ["a\r", "Y\n", "b\n"]
+
+    def test_append_to_unterminated_last_line(self):
+        doc = Document("abc")
+        doc.replace_lines(1, 1, "d\n")
+        assert list(doc.iter_lines()) == ["abcd\n"]
+
+    def test_replace_lines_clamps(self):
+        doc = Document("0\n1\n2\n")
+        doc.replace_lines(1, 99, "x\n")
+        assert str(doc) == "0\nx\n"
+
+    @pytest.mark.parametrize("block", [1, 3, 512])
+    def test_random_edits_match_str(self, monkeypatch, block):
+        monkeypatch.setattr(document, "_BLOCK", block)
+        rng = random.Random(block)
+        for _ in range(200):
+            text = _random_text(rng, 40)
+            doc = Document(text)
+            for _ in range(20):
+                a = rng.randint(0, len(text))
+                b = rng.randint(a, len(text))
+                new = _random_text(rng, 6)
+                doc.splice(a, b, new)
+                text = text[:a] + new + text[b:]
+                assert list(doc.iter_lines()) == text.splitlines(keepends=True)
+                assert doc.offset(doc.line_count) == len(text)
+            assert str(doc) == text
+
+    def test_str_is_cached_until_edit(self):
+        doc = Document("a\nb\n")
+        assert str(doc) is str(doc)
+        doc.splice(0, 1, "c")
+        assert str(doc) == "c\nb\n"
@@ -0,0 +1,150 @@
+"""Tests for line edits taken from `git diff`."""
+import subprocess
+
+import pytest
+
+from pyweb.core.anchorer import DiffAnchorer, LineEdit
+from pyweb.core.anchoring import ANCHORED, anchor_project
+from pyweb.core.gitdiff import GitDiffProvider, blob_id, parse_unified_diff
+from pyweb.core.models import Range
+from pyweb.core.store import FragmentStore
+
+TEXT = "".join(f"line{i}\n" for i in range(10))
+
+
+def git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=repo, check=True, capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    try:
+        git(tmp_path, "init", "-q")
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git not available")
+    for name in ("a.py", "b.py", "sub dir/c.py"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(TEXT)
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "base")
+    return tmp_path
+
+
+class TestParse:
+    def test_hunks_become_line_edits(self):
+        diff = (
+            b"diff --git a/x.py b/x.py\n"
+            b"index 1111111111111111111111111111111111111111..2222222222222222222222222222222222222222 100644\n"
+            b"--- a/x.py\n"
+            b"+++ b/x.py\n"
+            b"@@ -2 +2 @@ a\n"
+            b"-b\n"
+            b"+B\n"
+            b"@@ -3,0 +4,2 @@ c\n"
+            b"+d\n"
+            b"+e\n"
+            b"@@ -5,2 +6,0 @@\n"
+            b"--- looks like a header\n"
+            b"-+++ b/not-a-file\n"
+            b"\\ No newline at end of file\n"
+        )
+        files = parse_unified_diff(diff)
+        assert list(files) == ["x.py"]
+        assert files["x.py"].old_id == "1" * 40
+        assert files["x.py"].edits == [LineEdit(1, 1, 1), LineEdit(3, 0, 2), LineEdit(4, 2, 0)]
+
+    def test_quoted_and_deleted_paths(self):
+        diff = (
+            b'diff --git "a/t\\tab \\303\\251.py" "b/t\\tab \\303\\251.py"\n'
+            b"index 1111111111111111111111111111111111111111..2222222222222222222222222222222222222222 100644\n"
+            b'--- "a/t\\tab \\303\\251.py"\n'
+            b'+++ "b/t\\tab \\303\\251.py"\n'
+            b"@@ -1 +1 @@\n-a\n+b\n"
+            b"diff --git a/gone.py b/gone.py\n"
+            b"deleted file mode 100644\n"
+            b"index 1111111111111111111111111111111111111111..0000000000000000000000000000000000000000\n"
+            b"--- a/gone.py\n"
+            b"+++ /dev/null\n"
+            b"@@ -1 +0,0 @@\n-a\n"
+        )
+        assert list(parse_unified_diff(diff)) == ["t\tab é.py"]
+
+
+class TestGitDiffProvider:
+    def test_hunks_reproduce_new_text(self, repo):
+        new = "top\n" + TEXT.replace("line4\n", "four\nfour and a half\n").replace("line8\n", "")
+        (repo / "a.py").write_text(new)
+        (repo / "sub dir" / "c.py").write_text(TEXT + "end\n")
+        provider = GitDiffProvider.from_git(repo)
+        assert sorted(provider.files) == ["a.py", "sub dir/c.py"]
+
+        edits = provider.line_edits("a.py", TEXT, new)
+        assert provider.hits == 1 and provider.fallbacks == 0
+        # Applying the hunks to the old line numbers reproduces the new file
+        old_lines, out, pos = TEXT.splitlines(True), [], 0
+        new_lines = new.splitlines(True)
+        j = 0
+        for e in edits:
+            out += old_lines[pos:e.line]
+            j += e.line - pos
+            out += new_lines[j:j + e.new_count]
+            j += e.new_count
+            pos = e.line + e.old_count
+        out += old_lines[pos:]
+        assert "".join(out) == new
+
+    def test_falls_back_when_snapshot_is_not_base(self, repo, monkeypatch):
+        (repo / "a.py").write_text("x\n" + TEXT)
+        provider = GitDiffProvider.from_git(repo)
+        calls = []
+        real = DiffAnchorer.compute_line_edits
+        monkeypatch.setattr(DiffAnchorer, "compute_line_edits",
+                            staticmethod(lambda o, n: calls.append(1) or real(o, n)))
+        # The snapshot is not the committed text
+        edits = provider.line_edits("a.py", "zzz\n" + TEXT, "x\n" + TEXT)
+        assert calls and provider.fallbacks == 1
+        assert edits == [LineEdit(0, 1, 1)]
+
+    def test_falls_back_on_crlf(self, repo):
+        (repo / "b.py").write_bytes(TEXT.replace("\n", "\r\n").encode())
+        git(repo, "commit", "-q", "-am", "crlf")
+        (repo / "b.py").write_bytes(("x\n" + TEXT).replace("\n", "\r\n").encode())
+        provider = GitDiffProvider.from_git(repo, "HEAD")
+        provider.line_edits("b.py", TEXT, (repo / "b.py").read_text())
+        assert provider.fallbacks == 1
+
+    def test_paths_and_bad_revision(self, repo):
+        (repo / "a.py").write_text("x\n")
+        (repo / "b.py").write_text("x\n")
+        assert list(GitDiffProvider.from_git(repo, paths=["b.py"]).files) == ["b.py"]
+        with pytest.raises(RuntimeError):
+            GitDiffProvider.from_git(repo, "no-such-rev")
+
+    def test_blob_id_matches_git(self, repo):
+        out = subprocess.run(["git", "rev-parse", "HEAD:a.py"], cwd=repo,
+                             capture_output=True, check=True).stdout.decode().strip()
+        assert blob_id(TEXT.encode()) == out
+
+
+class TestAnchorAfterPull:
+    def test_anchor_project_with_git(self, repo):
+        store = FragmentStore(repo)
+        store.init()
+        for name in ("a.py", "b.py", "sub dir/c.py"):
+            store.create_fragment(name, "tail", Range(5, 0, 8, 0))
+            store.save_cache(name, TEXT)
+        git(repo, "tag", "before")
+        for name in ("a.py", "sub dir/c.py"):
+            (repo / name).write_text("new\nnew\n" + TEXT)
+        git(repo, "commit", "-q", "-am", "pull")
+
+        provider = GitDiffProvider.from_git(repo, "before")
+        report = anchor_project(store, workers=1, diff=provider)
+        assert [r.file for r in report.with_status(ANCHORED)] == ["a.py", "sub dir/c.py"]
+        assert provider.hits == 2 and provider.fallbacks == 0
+        for name in ("a.py", "sub dir/c.py"):
+            r = store.get_fragment_by_name(name, "tail").range
+            assert (r.start_line, r.end_line) == (7, 10)
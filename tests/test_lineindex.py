@@ -0,0 +1,46 @@
+"""Tests for the line-start offset table."""
+from pyweb.core.lineindex import LineIndex
+from pyweb.core.parser import parse_markers
+
+
+TEXT = "alpha\n    beta\r\ngamma"
+
+
+class TestLineIndex:
+    def test_offsets(self):
+        idx = LineIndex(TEXT)
+        assert idx.line_count == 3
+        assert idx.offset(0) == 0
+        assert idx.offset(1) == 6
+        assert idx.offset(2) == 16
+        assert idx.offset(3) == len(TEXT)
+        assert idx.offset(1, 4) == 10
+
+    def test_position_round_trip(self):
+        idx = LineIndex(TEXT)
+        for off in range(len(TEXT)):
+            line, col = idx.position(off)
+            assert idx.offset(line, col) == off
+        assert idx.position(len(TEXT)) == (2, 5)
+
+    def test_line_helpers(self):
+        idx = LineIndex(TEXT)
+        assert idx.line(1) == "    beta\r\n"
+        assert idx.line_span(0, 2) == "alpha\n    beta\r\n"
+        assert idx.indent(1) == "    "
+        assert idx.indent(5) == ""
+        assert idx.line_length(1) == 8
+        assert idx.line_length(2) == 5
+
+    def test_empty(self):
+        idx = LineIndex("")
+        assert idx.line_count == 0
+        assert idx.offset(0) == 0
+        assert idx.position(0) == (0, 0)
+
+    def test_matches_parser_line_numbers(self):
+        src = 'a\x0cb\n# @pyweb:start id="f" name="f"\nc\n'
+        result = parse_markers(src, with_index=True)
+        idx = result.line_index
+        assert idx.line_count == result.line_count
+        assert idx.line(result.fragments[0].start_line).startswith("# @pyweb:start")
@@ -141,3 +141,100 @@ class TestFileFragments:
         assert "file" in parsed
         assert "content_hash" in parsed
         assert "fragments" in parsed
+
+    def test_round_trip_columnar(self):
+        ff = FileFragments(file="a.py", content_hash="sha256:x", fragments=[
+            Fragment(id="f1", name="init", file="a.py", range=Range(0, 2, 10, 0),
+                     children=["f3", "f2"], prose="Setup code"),
+            Fragment(id="f2", name="a", file="a.py", range=Range(2, 0, 8, 4)),
+            Fragment(id="f3", name="b", file="a.py", range=Range(-1, -1, -1, -1), prose=""),
+        ])
+        text = ff.to_columnar()
+        assert "\n" not in text
+        assert "files" not in json.loads(text)
+        assert FileFragments.from_json(text) == ff
+
+        ff.fragments[1].file = "b.py"
+        assert FileFragments.from_json(ff.to_columnar()) == ff
+
+    def test_columnar_empty_and_future_version(self):
+        ff = FileFragments(file="a.py", content_hash="sha256:x")
+        assert FileFragments.from_json(ff.to_columnar()) == ff
+        d = json.loads(ff.to_columnar())
+        d["version"] = 99
+        with pytest.raises(ValueError, match="version"):
+            FileFragments.from_json(json.dumps(d))
+
+
+def _tree() -> FileFragments:
+    return FileFragments(file="a.py", content_hash="sha256:x", fragments=[
+        Fragment(id="p", name="p", file="a.py", range=Range(0, 0, 20, 0), children=["a", "b"]),
+        Fragment(id="a", name="a", file="a.py", range=Range(2, 0, 5, 0)),
+        Fragment(id="b", name="b", file="a.py", range=Range(8, 0, 12, 0), children=["c"]),
+        Fragment(id="c", name="c", file="a.py", range=Range(9, 0, 10, 0)),
+        Fragment(id="r", name="r", file="a.py", range=Range(30, 0, 40, 0)),
+    ])
+
+
+class TestFileFragmentsIndex:
+    def test_lookups(self):
+        ff = _tree()
+        assert ff.get("c").name == "c"
+        assert ff.get("zz") is None
+        assert ff.parent_of("c").id == "b"
+        assert ff.parent_of("p") is None
+        assert [f.id for f in ff.roots()] == ["p", "r"]
+        assert [f.id for f in ff.children_of("p")] == ["a", "b"]
+
+    def test_overlapping_sibling(self):
+        ff = _tree()
+        assert ff.overlapping_sibling("p", Range(5, 0, 8, 0)) is None
+        assert ff.overlapping_sibling("p", Range(4, 0, 6, 0)).id == "a"
+        assert ff.overlapping_sibling("p", Range(11, 0, 15, 0)).id == "b"
+        assert ff.overlapping_sibling("p", Range(8, 0, 12, 0), exclude="b") is None
+        # Several overlaps: the first in children order is reported
+        ff.get("p").children.reverse()
+        ff.reindex()
+        assert ff.overlapping_sibling("p", Range(0, 0, 20, 0)).id == "b"
+        assert ff.overlapping_sibling(None, Range(25, 0, 31, 0)).id == "r"
+
+    def test_overlapping_sibling_when_siblings_overlap(self):
+        ff = _tree()
+        ff.add(Fragment(id="x", name="x", file="a.py", range=Range(0, 0, 50, 0)))
+        assert ff.overlapping_sibling(None, Range(45, 0, 46, 0)).id == "x"
+        ff.remove("x")
+        assert ff.overlapping_sibling(None, Range(45, 0, 46, 0)) is None
+
+    def test_mutations_keep_index(self):
+        ff = _tree()
+        ff.add(Fragment(id="d", name="d", file="a.py", range=Range(14, 0, 16, 0)), parent_id="p")
+        assert ff.parent_of("d").id == "p"
+        ff.remove("b")
+        assert ff.get("p").children == ["a", "c", "d"]
+        assert ff.parent_of("c").id == "p"
+        ff.move("c", None)
+        assert [f.id for f in ff.roots()] == ["p", "c", "r"]
+        ff.set_range("r", Range(3, 0, 4, 0))
+        assert ff.overlapping_sibling(None, Range(3, 0, 4, 0), exclude="c").id == "p"
+        assert ff.overlapping_sibling(None, Range(35, 0, 36, 0)) is None
+
+    def test_external_list_changes_rebuild(self):
+        ff = _tree()
+        assert ff.get("r") is not None
+        ff.fragments = ff.fragments[:4]
+        assert ff.get("r") is None
+        ff.fragments.append(Fragment(id="n", name="n", file="a.py", range=Range(30, 0, 31, 0)))
+        assert ff.get("n") is not None
+        assert ff == FileFragments.from_json(ff.to_json())
+
+    def test_fragment_at(self):
+        ff = _tree()
+        assert ff.fragment_at(9, 5).id == "c"
+        assert ff.fragment_at(10, 0).id == "b"
+        assert ff.fragment_at(6, 0).id == "p"
+        assert ff.fragment_at(25, 0) is None
+        assert ff.fragment_at(-1, 0) is None
+        assert [f.id if f else None for f in ff.fragments_at([(3, 0), (35, 2), (40, 0)])] == ["a", "r", None]
+        # Equal ranges: the first in list order wins
+        ff.add(Fragment(id="c2", name="c2", file="a.py", range=Range(9, 0, 10, 0)))
+        assert ff.fragment_at(9, 0).id == "c"
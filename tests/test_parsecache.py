@@ -0,0 +1,142 @@
+"""Tests for the persistent parse-result cache."""
+import os
+from pathlib import Path
+
+import pytest
+
+from pyweb.core.parsecache import ParseCache
+from pyweb.core.parser import parse_markers
+
+
+SRC = (
+    '# @pyweb:start id="p" name="parent"\n'
+    '# @pyweb:prose Parent prose.\n'
+    '# @pyweb:start id="c" name="child"\n'
+    'x = 1\n'
+    '# @pyweb:end id="c"\n'
+    '# @pyweb:end id="p"\n'
+    '# @pyweb:start id="o" name="open"\n'
+)
+
+
+def _write(path: Path, text: str) -> None:
+    """Write a file with an old mtime, so its stat is trusted rather than racily clean."""
+    path.write_text(text)
+    os.utime(path, ns=(0, 10**9))
+
+
+@pytest.fixture
+def project(tmp_path):
+    _write(tmp_path / "main.py", SRC)
+    return tmp_path, ParseCache(tmp_path)
+
+
+class TestParseCache:
+    def test_miss_then_hit(self, project):
+        root, cache = project
+        first = cache.parse("main.py")
+        assert (cache.hits, cache.misses) == (0, 1)
+        second = cache.parse("main.py")
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert first == second == parse_markers(SRC)
+        assert second.line_count == first.line_count
+        assert second.fragments[0].children == ["c"]
+
+    def test_hit_does_not_read_source(self, project, monkeypatch):
+        root, cache = project
+        cache.parse("main.py")
+        real_open = Path.open
+
+        def guarded_open(self, *args, **kwargs):
+            assert self.name != "main.py", "source was opened on a cache hit"
+            return real_open(self, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "open", guarded_open)
+        assert ParseCache(root).get("main.py") is not None
+
+    def test_modified_file_misses(self, project):
+        root, cache = project
+        cache.parse("main.py")
+        (root / "main.py").write_text(SRC + "y = 2\n")
+        assert cache.get("main.py") is None
+        assert cache.parse("main.py").line_count == 8
+
+    def test_touched_file_validated_by_hash(self, project):
+        root, cache = project
+        cache.parse("main.py")
+        st = (root / "main.py").stat()
+        os.utime(root / "main.py", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert cache.get("main.py") == parse_markers(SRC)
+
+    def test_same_size_different_content(self, project):
+        root, cache = project
+        cache.parse("main.py")
+        (root / "main.py").write_text(SRC.replace("parent", "PARENT"))
+        assert cache.get("main.py") is None
+
+    def test_racily_clean_file_is_hashed(self, project):
+        root, cache = project
+        src = root / "main.py"
+        src.write_text(SRC)
+        cache.parse("main.py")
+        st = src.stat()
+        # Same size, inode and mtime: only the content tells them apart
+        src.write_text(SRC.replace("parent", "PARENT"))
+        os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert cache.get("main.py") is None
+        assert cache.parse("main.py").fragments[0].name == "PARENT"
+
+    def test_racily_clean_hit_is_trusted_once_checked(self, project, monkeypatch):
+        root, cache = project
+        src = root / "main.py"
+        src.write_text(SRC)
+        cache.parse("main.py")
+        # Pretend the entry was checked long after the file was written
+        monkeypatch.setattr("time.time_ns", lambda: src.stat().st_mtime_ns + 10 * 10**9)
+        assert cache.get("main.py") == parse_markers(SRC)
+        real_read_bytes = Path.read_bytes
+
+        def guarded_read_bytes(self):
+            assert self.name != "main.py", "source hashed again"
+            return real_read_bytes(self)
+
+        monkeypatch.setattr(Path, "read_bytes", guarded_read_bytes)
+        assert ParseCache(root).get("main.py") == parse_markers(SRC)
+
+    def test_eviction_and_clear(self, project):
+        root, cache = project
+        for i in range(5):
+            _write(root / f"f{i}.py", SRC)
+            cache.parse(f"f{i}.py")
+        assert cache.stats().entries == 5
+        one = cache.stats().total_bytes // 5
+        cache.prune(max_bytes=one * 2)
+        assert cache.stats().entries == 2
+        assert cache.clear() == 2
+        assert cache.stats().entries == 0
+
+    def test_char_offsets_survive_round_trip(self, project):
+        root, cache = project
+        first = cache.parse("main.py")
+        second = cache.parse("main.py")
+        assert cache.hits == 1
+        assert first.char_offsets
+        assert second.char_offsets == first.char_offsets
+        assert second.columns == first.columns
+
+    def test_writes_prune_only_past_the_limit(self, project, monkeypatch):
+        root, cache = project
+        scans = []
+        real_entries = ParseCache._entries
+        monkeypatch.setattr(ParseCache, "_entries", lambda self: scans.append(1) or real_entries(self))
+        for i in range(20):
+            _write(root / f"f{i}.py", SRC)
+            cache.parse(f"f{i}.py")
+        # One scan for the running total, none per write
+        assert len(scans) == 1
+
+        one = cache.stats().total_bytes // 20
+        small = ParseCache(root, max_bytes=one * 3)
+        _write(root / "main.py", SRC + "y = 2\n")
+        small.parse("main.py")
+        assert small.stats().entries <= 3
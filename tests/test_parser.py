@@ -1,6 +1,10 @@
 """Tests for the marker-based parser."""
+import io
+import random
+
 import pytest
-from pyweb.core.parser import parse_markers, get_roots, get_fragment_by_id, get_fragment_by_name
+from pyweb.core.parser import parse_markers, parse_markers_bytes, parse_file, parse_text_file, parse_stream, reparse, get_roots, get_fragment_by_id, get_fragment_by_name
+from pyweb.core.lineindex import LineIndex
 
 
 class TestParseBasic:
@@ -289,3 +293,347 @@ class TestToFragment:
         assert frag.range.start_line == 0
         assert frag.range.end_line == 4
         assert frag.prose == "Explanation here"
+
+
+class TestFastScanner:
+    """The sentinel scanner must agree with the per-line path on every input."""
+
+    SOURCES = [
+        "",
+        "x = 1\n",
+        "no trailing newline",
+        '# @pyweb:start id="f1" name="init"\nx = 1\n# @pyweb:end id="f1"',
+        '# @pyweb:start id="f1" name="init"\r\nx = 1\r\n# @pyweb:end id="f1"\r\n',
+        '# @pyweb:start id="f1" name="init"\rx = 1\r# @pyweb:end id="f1"\r',
+        '# @pyweb:start id="f1" name="init"\n\x0c\n# @pyweb:end id="f1"\n',
+        '# @pyweb:start id="a" name="a"\n# @pyweb:start id="b" name="b"\nx\n',
+        '# @pyweb:prose stray\n# @pyweb:end id="zz"\n',
+        '# @pyweb:bogus\n# @pyweb:start id="f1" name="init"\n# @pyweb:prose one\n'
+        'code\n# @pyweb:prose two\n# @pyweb:end id="f1"\n',
+        'x = "@pyweb:" @pyweb:start id="f1" name="init"\n\n\n# @pyweb:end id="f1"\n',
+    ]
+
+    @pytest.mark.parametrize("src", SOURCES)
+    def test_matches_per_line_path(self, src):
+        assert parse_markers(src) == parse_markers(src, fast=False)
+
+    def test_line_numbers_skip_plain_lines(self):
+        src = "a\n" * 1000 + '# @pyweb:start id="f1" name="x"\n' + "b\n" * 500 + '# @pyweb:end id="f1"\n'
+        f = parse_markers(src).fragments[0]
+        assert f.start_line == 1000
+        assert f.end_line == 1502
+
+
+def _random_line(rng: random.Random, ids: list[str]) -> str:
+    roll = rng.random()
+    fid = rng.choice(ids)
+    if roll < 0.12:
+        return f'# @pyweb:start id="{fid}" name="n{fid}"'
+    if roll < 0.24:
+        return f'# @pyweb:end id="{fid}"'
+    if roll < 0.32:
+        return f"# @pyweb:prose note {fid}"
+    if roll < 0.34:
+        return "# @pyweb: not a marker"
+    return f"code_{rng.randrange(100)} = 1"
+
+
+def _random_text(rng: random.Random, ids: list[str], n: int, newline: str = "\n") -> str:
+    return "".join(_random_line(rng, ids) + newline for _ in range(n))
+
+
+class TestReparse:
+    def test_insert_plain_lines_shifts(self):
+        src = (
+            '# @pyweb:start id="a" name="a"\n'
+            'x = 1\n'
+            '# @pyweb:end id="a"\n'
+            '# @pyweb:start id="b" name="b"\n'
+            '# @pyweb:end id="b"\n'
+        )
+        prev = parse_markers(src)
+        result = reparse(prev, src, (2, 2), "y = 2\nz = 3\n")
+        b = get_fragment_by_id(result.fragments, "b")
+        assert b.start_line == 5
+        assert b.end_line == 7
+        assert get_fragment_by_id(result.fragments, "a").end_line == 5
+
+    def test_typing_an_end_marker_closes_fragment(self):
+        src = '# @pyweb:start id="a" name="a"\nx = 1\ny = 2\n'
+        prev = parse_markers(src)
+        assert prev.warnings
+        result = reparse(prev, src, (2, 2), '# @pyweb:end id="a"\n')
+        assert result.warnings == []
+        assert result.fragments[0].end_line == 3
+
+    def test_edit_within_lines_reuses_fragments(self, monkeypatch):
+        from pyweb.core import parser
+        src = (
+            '# @pyweb:start id="a" name="a"\n'
+            'x = 1\n'
+            '# @pyweb:end id="a"\n'
+            '# @pyweb:start id="b" name="b"\n'
+        )
+        prev = parse_markers(src)
+        expected = parse_markers(src.replace("x = 1\n", "x = 12345\n"))
+        monkeypatch.setattr(parser.TreeBuilder, "feed", lambda *a: pytest.fail("markers replayed"))
+        result = reparse(prev, src, (1, 2), "x = 12345\n")
+        assert result == expected
+        assert result.fragments is prev.fragments
+        assert result.markers == prev.markers
+
+    def test_invalid_range(self):
+        prev = parse_markers("a\nb\n")
+        with pytest.raises(ValueError):
+            reparse(prev, "a\nb\n", (1, 5), "")
+
+    def test_unterminated_replacement_falls_back(self):
+        src = 'a\n# @pyweb:start id="a" name="a"\nb\n'
+        prev = parse_markers(src)
+        # "x" has no newline, so it joins with the old line 1
+        result = reparse(prev, src, (0, 1), "x")
+        assert result == parse_markers('x# @pyweb:start id="a" name="a"\nb\n')
+
+    def test_randomized_against_full_parse(self):
+        rng = random.Random(1234)
+        ids = ["a", "b", "c", "d", "e"]
+        for _ in range(500):
+            newline = rng.choice(["\n", "\n", "\r\n", "\r"])
+            src = _random_text(rng, ids, rng.randrange(0, 30), newline)
+            if rng.random() < 0.2:
+                src = src.rstrip("\r\n")
+            prev = parse_markers(src)
+            lines = src.splitlines(keepends=True)
+            start = rng.randrange(0, len(lines) + 1)
+            end = rng.randrange(start, len(lines) + 1)
+            new_text = _random_text(rng, ids, rng.randrange(0, 5), rng.choice(["\n", "\r\n"]))
+            if rng.random() < 0.1:
+                new_text = new_text.rstrip("\r\n")
+            expected = parse_markers("".join(lines[:start]) + new_text + "".join(lines[end:]))
+            result = reparse(prev, src, (start, end), new_text)
+            assert result == expected
+            assert result.line_count == expected.line_count
+
+    def test_chained_edits(self):
+        rng = random.Random(99)
+        ids = ["a", "b", "c"]
+        src = _random_text(rng, ids, 40)
+        result = parse_markers(src)
+        for _ in range(200):
+            lines = src.splitlines(keepends=True)
+            start = rng.randrange(0, len(lines) + 1)
+            end = min(len(lines), start + rng.randrange(0, 3))
+            new_text = _random_text(rng, ids, rng.randrange(0, 3))
+            result = reparse(result, src, (start, end), new_text)
+            src = "".join(lines[:start]) + new_text + "".join(lines[end:])
+            assert result == parse_markers(src)
+            assert result.markers is not None
+
+
+class TestParseStream:
+    SRC = (
+        'x = 1\n'
+        '# @pyweb:start id="p" name="parent"\n'
+        '# @pyweb:prose About the parent.\n'
+        '# @pyweb:start id="c" name="child"\n'
+        'y = 2\n'
+        '# @pyweb:end id="c"\n'
+        '# @pyweb:end id="p"\n'
+        '# @pyweb:start id="open" name="unclosed"\n'
+        'z = 3\n'
+    )
+
+    def test_text_file_object(self):
+        assert parse_stream(io.StringIO(self.SRC)) == parse_markers(self.SRC)
+
+    def test_binary_file_object(self):
+        assert parse_stream(io.BytesIO(self.SRC.encode())) == parse_markers(self.SRC)
+
+    def test_crlf_binary(self):
+        src = self.SRC.replace("\n", "\r\n")
+        assert parse_stream(io.BytesIO(src.encode())) == parse_markers(src)
+
+    def test_line_generator(self):
+        gen = (line for line in self.SRC.splitlines(keepends=True))
+        assert parse_stream(gen) == parse_markers(self.SRC)
+
+    def test_eof_auto_close_without_length(self):
+        result = parse_stream(iter(self.SRC.splitlines(keepends=True)))
+        f = get_fragment_by_id(result.fragments, "open")
+        assert f.end_line == 9
+        assert result.line_count == 9
+        assert "never closed" in result.warnings[-1].message
+        assert result.warnings[-1].line == 8
+
+    def test_empty(self):
+        result = parse_stream(io.StringIO(""))
+        assert result.fragments == []
+        assert result.line_count == 0
+
+    def test_real_file(self, tmp_path):
+        p = tmp_path / "big.sql"
+        p.write_text(self.SRC * 3)
+        with p.open("rb") as fh:
+            assert parse_stream(fh) == parse_markers(self.SRC * 3)
+
+
+class TestIndexes:
+    SRC = (
+        '# @pyweb:start id="p" name="parent"\n'
+        '# @pyweb:start id="c1" name="dup"\n'
+        '# @pyweb:end id="c1"\n'
+        '# @pyweb:start id="c2" name="dup"\n'
+        '# @pyweb:end id="c2"\n'
+        '# @pyweb:end id="p"\n'
+        '# @pyweb:start id="q" name="other"\n'
+        '# @pyweb:end id="q"\n'
+    )
+
+    def test_lookup_by_id_and_name(self):
+        result = parse_markers(self.SRC)
+        assert result.get("c2").name == "dup"
+        assert result.get("missing") is None
+        assert [f.id for f in result.by_name["dup"]] == ["c1", "c2"]
+        assert result.get_by_name("dup").id == "c1"
+        assert result.get_by_name("missing") is None
+
+    def test_children_and_roots(self):
+        result = parse_markers(self.SRC)
+        assert [f.id for f in result.children_of("p")] == ["c1", "c2"]
+        assert result.children_of("q") == []
+        assert [f.id for f in result.roots] == ["p", "q"]
+
+    def test_helpers_accept_result(self):
+        result = parse_markers(self.SRC)
+        assert get_fragment_by_id(result, "q") is result.get("q")
+        assert get_fragment_by_name(result, "dup").id == "c1"
+        assert [f.id for f in get_roots(result)] == [f.id for f in get_roots(result.fragments)]
+
+    def test_indexes_built_once(self):
+        result = parse_markers(self.SRC)
+        assert result.by_id is result.by_id
+
+
+class TestParseBytes:
+    SRC = (
+        'x = "héllo"\n'
+        '# @pyweb:start id="p" name="párent"\n'
+        '# @pyweb:prose Prose with ünicode.\n'
+        '# @pyweb:start id="c" name="child"\n'
+        'y = 2\n'
+        '# @pyweb:end id="p"\n'
+        '# @pyweb:start id="open" name="unclosed"\n'
+        'z = 3'
+    )
+
+    @pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+    def test_matches_text_parse(self, newline):
+        src = self.SRC.replace("\n", newline)
+        assert parse_markers_bytes(src.encode()) == parse_markers(src)
+
+    def test_offsets(self):
+        data = self.SRC.encode()
+        result = parse_markers_bytes(data)
+        p = result.offsets_of("p")
+        assert data[p.start:].startswith(b'# @pyweb:start id="p"')
+        assert data[p.content_start:].startswith(b'# @pyweb:start id="c"')
+        assert data[p.content_end:].startswith(b'# @pyweb:end id="p"')
+        assert data[p.end:].startswith(b'# @pyweb:start id="open"')
+        # auto-closed child ends where the parent's end marker starts
+        assert result.offsets_of("c").end == p.content_end
+        # unclosed fragment runs to EOF
+        assert result.offsets_of("open").end == len(data)
+        assert result.offsets_of("missing") is None
+
+    def test_offsets_require_bytes_mode(self):
+        with pytest.raises(ValueError):
+            parse_markers(self.SRC).offsets_of("p")
+
+    def test_parse_file_mmap(self, tmp_path):
+        p = tmp_path / "main.py"
+        p.write_bytes(self.SRC.encode())
+        result = parse_file(p)
+        assert result == parse_markers(self.SRC)
+        assert result.offsets_of("p") == parse_markers_bytes(self.SRC.encode()).offsets_of("p")
+
+    def test_parse_empty_file(self, tmp_path):
+        p = tmp_path / "empty.py"
+        p.write_bytes(b"")
+        assert parse_file(p).fragments == []
+
+    def test_mmap_chunked_counting(self, tmp_path, monkeypatch):
+        import mmap
+        from pyweb.core import parser
+        monkeypatch.setattr(parser, "_COUNT_CHUNK", 7)
+        src = ("a\r\n" * 20 + '# @pyweb:start id="f" name="f"\r\n' + "b\r\n" * 13).encode()
+        p = tmp_path / "crlf.py"
+        p.write_bytes(src)
+        with p.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            result = parse_markers_bytes(mm)
+        assert result == parse_markers(src.decode())
+        assert result.line_count == 34
+
+    @pytest.mark.parametrize("newline", ["\n", "\r\n"])
+    def test_parse_text_file_offsets(self, tmp_path, newline):
+        src = self.SRC.replace("\n", newline)
+        p = tmp_path / "main.py"
+        p.write_bytes(src.encode())
+        result = parse_text_file(p)
+        expected = parse_markers_bytes(src.encode())
+        assert result == expected
+        assert result.char_offsets == expected.char_offsets
+        assert result.columns == expected.columns
+        assert parse_markers(src, with_offsets=True).char_offsets == expected.char_offsets
+
+    @pytest.mark.parametrize("encoding", ["utf-16", "utf-32-le"])
+    def test_rejects_non_ascii_compatible_encoding(self, encoding):
+        data = self.SRC.encode(encoding)
+        with pytest.raises(ValueError, match="ASCII-compatible"):
+            parse_markers_bytes(data, encoding=encoding)
+        with pytest.raises(ValueError, match="ASCII-compatible"):
+            parse_stream(io.BytesIO(data), encoding=encoding)
+
+    def test_accepts_ascii_compatible_encoding(self):
+        data = self.SRC.encode("latin-1")
+        assert parse_markers_bytes(data, encoding="latin-1") == parse_markers(self.SRC)
+
+
+class TestLineBoundaryParity:
+    """Every parser numbers lines the way str.splitlines() does."""
+
+    @pytest.mark.parametrize("brk", list("\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029\r"))
+    def test_all_parsers_agree(self, tmp_path, brk):
+        src = (
+            f"a = 1\n{brk}\nb = 2{brk}c = 3\n"
+            '# @pyweb:start id="f1" name="blk"\n'
+            f"x = 1{brk}y = 2\n"
+            '# @pyweb:end id="f1"\n'
+            "tail\n"
+        )
+        expected = parse_markers(src, fast=False)
+        # "{brk}\n" is two lines, except for "\r\n"
+        assert expected.fragments[0].start_line == (4 if brk == "\r" else 5)
+        path = tmp_path / "m.py"
+        path.write_bytes(src.encode())
+
+        results = {
+            "fast": parse_markers(src),
+            "bytes": parse_markers_bytes(src.encode()),
+            "file": parse_file(path),
+            "text file": parse_text_file(path),
+            "stream text": parse_stream(io.StringIO(src, newline=None)),
+            "stream bytes": parse_stream(io.BytesIO(src.encode())),
+        }
+        with path.open(newline="") as fh:
+            results["stream file"] = parse_stream(fh)
+        for label, result in results.items():
+            assert result == expected, label
+            assert result.line_count == expected.line_count, label
+
+        offsets = results["bytes"].offsets_of("f1")
+        assert src.encode()[offsets.content_start:].startswith(b"x = 1")
+        index = LineIndex(src)
+        assert results["text file"].char_offsets == results["bytes"].char_offsets
+        assert results["text file"].columns == results["bytes"].columns
+        for result in (results["bytes"], results["file"]):
+            assert result.char_offsets == {line: index.offset(line) for line in result.offsets}
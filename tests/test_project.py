@@ -0,0 +1,82 @@
+"""Tests for project-wide file discovery and parallel parsing."""
+import subprocess
+
+import pytest
+
+from pyweb.core.project import iter_project_files, map_batches, parse_path, parse_project
+
+
+MARKED = (
+    '# @pyweb:start id="f1" name="block"\n'
+    'x = 1\n'
+    '# @pyweb:end id="f1"\n'
+)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "a.py").write_text(MARKED)
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "b.py").write_text('# @pyweb:start id="b" name="open"\ny = 2\n')
+    (tmp_path / "pkg" / "data.bin").write_bytes(b"\x00\x01\x02@pyweb:start")
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "c.py").write_text(MARKED)
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "a.cpython.pyc").write_bytes(b"\x00")
+    return tmp_path
+
+
+class TestIterProjectFiles:
+    def test_walk_skips_hidden_and_cache_dirs(self, tree):
+        files = sorted(iter_project_files(tree))
+        assert files == ["a.py", "pkg/b.py", "pkg/data.bin"]
+
+    def test_git_respects_gitignore(self, tree):
+        try:
+            subprocess.run(["git", "init", "-q"], cwd=tree, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            pytest.skip("git not available")
+        (tree / ".gitignore").write_text("pkg/\n__pycache__/\n")
+        files = sorted(iter_project_files(tree))
+        assert "a.py" in files
+        assert ".gitignore" in files
+        assert not any(f.startswith("pkg/") for f in files)
+
+
+def _tag(batch, tag):
+    return [(rel, tag, len(batch)) for rel in batch]
+
+
+class TestMapBatches:
+    def test_pool_batches_with_args(self):
+        files = [f"f{i}" for i in range(20)]
+        out = list(map_batches(_tag, files, workers=2, batch_args=lambda batch: (batch[0],)))
+        assert sorted(rel for rel, _, _ in out) == sorted(files)
+        # 20 files over 2 workers: batches of 2, tagged with their first file
+        assert {(tag, size) for _, tag, size in out} == {(f"f{i}", 2) for i in range(0, 20, 2)}
+
+    def test_serial_runs_local_in_order(self):
+        seen = []
+        out = list(map_batches(_tag, ["a", "b"], workers=1,
+                               local=lambda batch: seen.append(batch) or batch))
+        assert out == ["a", "b"]
+        assert seen == [["a"], ["b"]]
+
+
+class TestParseProject:
+    def test_parse_path_skips_binary(self, tree):
+        assert parse_path(tree / "pkg" / "data.bin") is None
+        assert len(parse_path(tree / "a.py").fragments) == 1
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_parse_all(self, tree, workers):
+        results = dict(parse_project(tree, workers=workers))
+        assert set(results) == {"a.py", "pkg/b.py", "pkg/data.bin"}
+        assert results["pkg/data.bin"] is None
+        assert results["a.py"].fragments[0].name == "block"
+        assert results["a.py"].warnings == []
+        assert "never closed" in results["pkg/b.py"].warnings[0].message
+
+    def test_unreadable_file_is_skipped(self, tree):
+        results = dict(parse_project(tree, files=["a.py", "missing.py"], workers=1))
+        assert results["missing.py"] is None
@@ -0,0 +1,120 @@
+"""Tests for the content-addressed snapshot cache."""
+import json
+
+import pytest
+
+from pyweb.core.snapshots import SnapshotCache
+from pyweb.core.store import FragmentStore
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SnapshotCache(tmp_path / "cache")
+
+
+def _blobs(cache):
+    return sorted(cache.blobs_dir.glob("*/*.z"))
+
+
+class TestSnapshotCache:
+    def test_round_trip(self, cache):
+        digest = cache.save("a.py", "print('hi')\n")
+        assert digest == FragmentStore.content_hash("print('hi')\n")
+        assert cache.load("a.py") == "print('hi')\n"
+        assert cache.digest("a.py") == digest
+        assert cache.load("missing.py") is None
+
+    def test_compressed(self, cache):
+        text = "x = 1\n" * 10_000
+        cache.save("a.py", text)
+        [blob] = _blobs(cache)
+        assert blob.stat().st_size < len(text) // 20
+
+    def test_deduplicated(self, cache):
+        cache.save("a.py", "one\n")
+        cache.save("b.py", "one\n")
+        cache.save("a.py", "two\n")
+        cache.save("a.py", "one\n")
+        assert len(_blobs(cache)) == 2
+        assert cache.load("a.py") == cache.load("b.py") == "one\n"
+
+    def test_unchanged_save_writes_nothing(self, cache):
+        cache.save("a.py", "one\n")
+        index = cache._ref_path("a.py").stat()
+        [blob] = _blobs(cache)
+        blob_st = blob.stat()
+        cache.save("a.py", "one\n")
+        SnapshotCache(cache.cache_dir).save("a.py", "one\n")
+        assert cache._ref_path("a.py").stat().st_mtime_ns == index.st_mtime_ns
+        assert blob.stat().st_mtime_ns == blob_st.st_mtime_ns
+
+    def test_save_file_streams_like_read_text(self, cache, tmp_path):
+        src = tmp_path / "crlf.py"
+        src.write_bytes(b"a\r\nb\rc\n\xff\n")
+        text = src.read_text(errors="surrogateescape")
+        digest = cache.save_file("crlf.py", src)
+        assert digest == cache.save("other.py", text)
+        assert cache.load("crlf.py") == text
+        assert len(_blobs(cache)) == 1
+        assert list(cache.blobs_dir.glob(".*.tmp")) == []
+
+    def test_gc(self, cache):
+        cache.save("a.py", "one\n")
+        cache.save("a.py", "two\n")
+        cache.save("b.py", "three\n")
+        assert cache.gc() == 1
+        assert cache.load("a.py") == "two\n"
+        assert cache.gc(keep=["a.py"]) == 1
+        assert cache.load("b.py") is None
+        assert cache.load("a.py") == "two\n"
+        assert len(_blobs(cache)) == 1
+
+    def test_save_writes_one_pointer(self, cache):
+        cache.save("a.py", "one\n")
+        cache.save("src/b.py", "two\n")
+        other = cache._ref_path("a.py").stat()
+        cache.save("src/b.py", "three\n")
+        assert cache._ref_path("a.py").stat().st_mtime_ns == other.st_mtime_ns
+        assert cache._files() == {
+            "a.py": FragmentStore.content_hash("one\n"),
+            "src/b.py": FragmentStore.content_hash("three\n"),
+        }
+        assert cache.gc(keep=["a.py"]) == 2
+        assert not (cache.refs_dir / "src").exists()
+
+    def test_old_index_split_into_refs(self, cache):
+        digest = cache.save("a.py", "one\n")
+        cache.save("b.py", "two\n")
+        cache._ref_path("a.py").unlink()
+        cache.index_path.write_text(json.dumps({"version": 1, "files": {"a.py": digest}}))
+        fresh = SnapshotCache(cache.cache_dir)
+        assert fresh.load("a.py") == "one\n"
+        fresh.save("c.py", "three\n")
+        assert not cache.index_path.exists()
+        assert fresh.load("a.py") == "one\n"
+        assert sorted(fresh._files()) == ["a.py", "b.py", "c.py"]
+
+    def test_plain_copies_still_read(self, cache):
+        legacy = cache.cache_dir / "src" / "a.py"
+        legacy.parent.mkdir(parents=True)
+        legacy.write_text("old\n")
+        assert cache.load("src/a.py") == "old\n"
+        cache.save("src/a.py", "new\n")
+        assert cache.load("src/a.py") == "new\n"
+        assert cache.gc() == 1
+        assert not legacy.exists()
+
+
+class TestStoreSnapshots:
+    def test_gc_cache_keeps_files_with_fragments(self, tmp_path):
+        from pyweb.core.models import Range
+
+        (tmp_path / "a.py").write_text("a\n")
+        store = FragmentStore(tmp_path)
+        store.init()
+        store.create_fragment("a.py", "block", Range(0, 0, 1, 0))
+        store.save_cache("a.py", "a\n")
+        store.save_cache("gone.py", "b\n")
+        assert store.gc_cache() == 1
+        assert store.load_cache("a.py") == "a\n"
+        assert store.load_cache("gone.py") is None
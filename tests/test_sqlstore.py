@@ -0,0 +1,148 @@
+"""Tests for SqliteFragmentStore: same behaviour as the JSON store, plus import/export."""
+import sqlite3
+
+import pytest
+
+from pyweb.core.models import FileFragments, Fragment, Range
+from pyweb.core.sqlstore import SqliteFragmentStore
+from pyweb.core.store import FragmentStore, ValidationError
+
+
+@pytest.fixture
+def tmp_project(tmp_path):
+    src = tmp_path / "src" / "main.py"
+    src.parent.mkdir(parents=True)
+    src.write_text("".join(f"line {i}\n" for i in range(10)))
+    store = SqliteFragmentStore(tmp_path)
+    store.init()
+    yield tmp_path, store
+    store.close()
+
+
+def _tree(file_path="src/main.py"):
+    return FileFragments(file_path, "sha256:abc", [
+        Fragment("p", "parent", file_path, Range(0, 0, 8, 0), ["c2", "c1", "gone"], prose="Top"),
+        Fragment("c1", "one", file_path, Range(1, 0, 2, 0)),
+        Fragment("c2", "two", file_path, Range(3, 4, 5, 0)),
+        Fragment("o", "lost", file_path, Range(-1, -1, -1, -1)),
+    ])
+
+
+class TestSqliteStore:
+    def test_wal_mode(self, tmp_project):
+        root, store = tmp_project
+        con = sqlite3.connect(root / ".pyweb" / "fragments.db")
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        con.close()
+
+    def test_round_trip_keeps_order(self, tmp_project):
+        root, store = tmp_project
+        store.save_file(_tree())
+        loaded = SqliteFragmentStore(root).load_file("src/main.py")
+        assert loaded == _tree()
+
+    def test_missing_file(self, tmp_project):
+        root, store = tmp_project
+        assert store.load_file("nope.py") is None
+        assert SqliteFragmentStore(root / "src").load_file("main.py") is None
+
+    def test_failed_write_drops_changed_copy(self, tmp_project, monkeypatch):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+
+        def locked(*args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(store, "_write", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            store.rename_fragment("src/main.py", frag.id, "renamed")
+        monkeypatch.undo()
+        assert store.get_fragment("src/main.py", frag.id).name == "block"
+
+    def test_mutations(self, tmp_project):
+        root, store = tmp_project
+        parent = store.create_fragment("src/main.py", "parent", Range(0, 0, 10, 0))
+        child = store.create_fragment("src/main.py", "child", Range(2, 0, 5, 0), parent_id=parent.id)
+        with pytest.raises(ValidationError):
+            store.create_fragment("src/main.py", "other", Range(4, 0, 6, 0), parent_id=parent.id)
+        store.rename_fragment("src/main.py", child.id, "renamed")
+        store.set_prose("src/main.py", child.id, "Words")
+        store.delete_fragment("src/main.py", parent.id)
+
+        fresh = SqliteFragmentStore(root)
+        [root_frag] = fresh.get_roots("src/main.py")
+        assert (root_frag.name, root_frag.prose) == ("renamed", "Words")
+        assert fresh.fragment_at("src/main.py", 3, 0).id == child.id
+        assert fresh.validate("src/main.py") == []
+
+    def test_other_writer_invalidates_cache(self, tmp_project):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+        assert store.get_fragment("src/main.py", frag.id).name == "block"
+        SqliteFragmentStore(root).rename_fragment("src/main.py", frag.id, "changed")
+        assert store.get_fragment("src/main.py", frag.id).name == "changed"
+        stats = store.cache_stats()
+        assert (stats.hits, stats.misses) == (1, 1)
+
+    def test_project_queries(self, tmp_project):
+        root, store = tmp_project
+        store.save_file(_tree())
+        store.save_file(_tree("src/b.py"))
+        assert store.list_files() == ["src/b.py", "src/main.py"]
+        assert [f.file for f in store.find_fragments("one")] == ["src/b.py", "src/main.py"]
+        assert [f.id for f in store.orphaned_fragments()] == ["o", "o"]
+        assert store.find_fragments("nothing") == []
+
+    def test_import_export(self, tmp_project):
+        root, store = tmp_project
+        sidecars = FragmentStore(root)
+        sidecars.save_file(_tree())
+        sidecars.save_file(_tree("src/b.py"))
+        assert store.import_sidecars() == 2
+        assert store.load_file("src/b.py") == _tree("src/b.py")
+
+        store.save_file(FileFragments("src/c.py", "sha256:c", []))
+        for p in (root / ".pyweb" / "fragments").rglob("*.json"):
+            p.unlink()
+        assert store.export_sidecars() == 3
+        fresh = FragmentStore(root)
+        assert fresh.list_files() == ["src/b.py", "src/c.py", "src/main.py"]
+        assert fresh.load_file("src/main.py") == _tree()
+
+    def test_failed_import_rolls_back(self, tmp_project):
+        root, store = tmp_project
+
+        def files():
+            yield _tree()
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            store.save_files(files())
+        assert store.list_files() == []
+
+    def test_conflicting_save(self, tmp_project):
+        from pyweb.core.store import ConflictError
+
+        root, store = tmp_project
+        store.save_file(_tree())
+        ff = store.load_file("src/main.py")
+        loaded_at = ff.generation
+        SqliteFragmentStore(root).rename_fragment("src/main.py", "c1", "theirs")
+        with pytest.raises(ConflictError):
+            store.save_file(ff, expected_generation=loaded_at)
+        store.update_file("src/main.py", lambda ff: setattr(ff.get("c2"), "name", "ours"))
+        fresh = SqliteFragmentStore(root)
+        assert [fresh.get_fragment("src/main.py", i).name for i in ("c1", "c2")] == ["theirs", "ours"]
+
+    def test_open_store_passes_options(self, tmp_project):
+        from pyweb.core.store import open_store
+
+        root, store = tmp_project
+        (root / ".pyweb" / "config.json").write_text('{"version": 1, "backend": "sqlite"}')
+        opened = open_store(root, max_cached_files=2, journal=True, fsync=True)
+        assert isinstance(opened, SqliteFragmentStore)
+        assert opened.max_cached_files == 2 and opened.fsync and opened.snapshots.fsync
+        opened.save_file(_tree())
+        assert opened._connect().execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+        assert store.get_fragment("src/main.py", "c1").name == "one"
+        opened.close()
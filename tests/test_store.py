@@ -258,6 +258,19 @@ class TestQueries:
         result = store.fragment_at("src/main.py", 5, 0)
         assert result is None
 
+    def test_fragments_at(self, tmp_project):
+        root, store = tmp_project
+        parent = store.create_fragment("src/main.py", "parent", Range(1, 0, 8, 0))
+        child = store.create_fragment("src/main.py", "child", Range(3, 0, 5, 0), parent_id=parent.id)
+        owners = store.fragments_at("src/main.py", [(line, 0) for line in range(10)])
+        assert [f.name if f else None for f in owners] == [
+            None, "parent", "parent", "child", "child", "parent", "parent", "parent", None, None,
+        ]
+        # Resizing refreshes the lookup table
+        store.resize_fragment("src/main.py", child.id, Range(3, 0, 7, 0))
+        assert store.fragment_at("src/main.py", 6, 0).id == child.id
+        assert store.fragments_at("missing.py", [(0, 0)]) == [None]
+
     def test_get_fragment_by_name(self, tmp_project):
         root, store = tmp_project
         frag = store.create_fragment("src/main.py", "myblock", Range(0, 0, 5, 0))
@@ -292,6 +305,31 @@ class TestValidation:
         errors = store.validate("nope.py")
         assert errors == []
 
+    def test_overlaps_reported_in_order(self, tmp_project):
+        root, store = tmp_project
+        store.save_file(FileFragments("src/main.py", "", [
+            Fragment("p", "p", "src/main.py", Range(0, 0, 8, 0), ["c1", "c2", "c3"]),
+            Fragment("c1", "c1", "src/main.py", Range(4, 0, 6, 0)),
+            Fragment("c2", "c2", "src/main.py", Range(1, 0, 5, 0)),
+            Fragment("c3", "c3", "src/main.py", Range(2, 0, 3, 0)),
+            Fragment("q", "q", "src/main.py", Range(7, 0, 9, 0)),
+        ]))
+        assert store.validate("src/main.py") == [
+            "Siblings 'c1' and 'c2' overlap",
+            "Siblings 'c2' and 'c3' overlap",
+            "Root fragments 'p' and 'q' overlap",
+        ]
+
+    def test_cycle_reported(self, tmp_project):
+        root, store = tmp_project
+        store.save_file(FileFragments("src/main.py", "", [
+            Fragment("a", "a", "src/main.py", Range(0, 0, 5, 0), ["b"]),
+            Fragment("b", "b", "src/main.py", Range(0, 0, 5, 0), ["a"]),
+        ]))
+        errors = store.validate("src/main.py")
+        assert "Cycle detected involving fragment 'a'" in errors
+        assert "Cycle detected involving fragment 'b'" in errors
+
 
 class TestPersistence:
     def test_round_trip(self, tmp_project):
@@ -316,3 +354,275 @@ class TestPersistence:
         assert len(h) > 10
         # Deterministic
         assert FragmentStore.content_hash("hello") == h
+
+
+class TestMemoryCache:
+    def test_repeated_queries_read_once(self, tmp_project):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+        fresh = FragmentStore(root)
+        for _ in range(5):
+            assert fresh.get_fragment("src/main.py", frag.id).name == "block"
+        stats = fresh.cache_stats()
+        assert (stats.entries, stats.hits, stats.misses) == (1, 4, 1)
+
+    def test_mutations_keep_cache_warm(self, tmp_project):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+        store.rename_fragment("src/main.py", frag.id, "renamed")
+        assert store.get_fragment("src/main.py", frag.id).name == "renamed"
+        assert store.cache_stats().misses == 0
+
+    def test_external_change_invalidates(self, tmp_project):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+        other = FragmentStore(root)
+        other.rename_fragment("src/main.py", frag.id, "a much longer name")
+        assert store.get_fragment("src/main.py", frag.id).name == "a much longer name"
+        store._frag_path("src/main.py").unlink()
+        assert store.load_file("src/main.py") is None
+        assert store.cache_stats().entries == 0
+
+    def test_lru_bound(self, tmp_project):
+        root, store = tmp_project
+        (root / "b.py").write_text("x\n")
+        store.create_fragment("src/main.py", "a", Range(0, 0, 1, 0))
+        store.create_fragment("b.py", "b", Range(0, 0, 1, 0))
+        bounded = FragmentStore(root, max_cached_files=1)
+        bounded.load_file("src/main.py")
+        bounded.load_file("b.py")
+        bounded.load_file("src/main.py")
+        stats = bounded.cache_stats()
+        assert (stats.entries, stats.max_entries, stats.misses) == (1, 1, 3)
+
+    def test_failed_mutation_leaves_cache_intact(self, tmp_project):
+        root, store = tmp_project
+        parent = store.create_fragment("src/main.py", "parent", Range(0, 0, 10, 0))
+        child = store.create_fragment("src/main.py", "child", Range(2, 0, 5, 0), parent_id=parent.id)
+        with pytest.raises(ValidationError, match="not found"):
+            store.move_fragment("src/main.py", child.id, "missing")
+        assert store.get_fragment("src/main.py", parent.id).children == [child.id]
+        assert FragmentStore(root).get_fragment("src/main.py", parent.id).children == [child.id]
+
+    @pytest.mark.parametrize("journal", [False, True])
+    def test_failed_write_drops_changed_copy(self, tmp_project, monkeypatch, journal):
+        root, _ = tmp_project
+        store = FragmentStore(root, journal=journal)
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+
+        def disk_full(*args, **kwargs):
+            raise OSError("No space left on device")
+
+        if journal:
+            real_open = Path.open
+            monkeypatch.setattr(Path, "open", lambda self, *a, **k: (
+                disk_full() if self.name.endswith(".log") else real_open(self, *a, **k)
+            ))
+        else:
+            monkeypatch.setattr("pyweb.core.store.atomic_write", disk_full)
+        with pytest.raises(OSError, match="No space"):
+            store.rename_fragment("src/main.py", frag.id, "renamed")
+        monkeypatch.undo()
+        assert store.get_fragment("src/main.py", frag.id).name == "block"
+
+
+class TestSidecarFormat:
+    def test_columnar_from_config(self, tmp_project):
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0), prose="Hi")
+        (root / ".pyweb" / "config.json").write_text('{"version": 1, "sidecar_format": "columnar"}')
+        compact = FragmentStore(root)
+        assert compact.sidecar_format == "columnar"
+        # Reads the existing pretty JSON, writes columnar
+        compact.rename_fragment("src/main.py", frag.id, "renamed")
+        assert '"format":"columnar"' in (root / ".pyweb" / "fragments" / "src" / "main.py.json").read_text()
+        loaded = FragmentStore(root, sidecar_format="json").get_fragment("src/main.py", frag.id)
+        assert (loaded.name, loaded.prose) == ("renamed", "Hi")
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError, match="sidecar format"):
+            FragmentStore(tmp_path, sidecar_format="yaml")
+
+
+class TestJournal:
+    def _journaled(self, root, **kwargs):
+        store = FragmentStore(root, journal=True, **kwargs)
+        parent = store.create_fragment("src/main.py", "parent", Range(0, 0, 10, 0))
+        child = store.create_fragment("src/main.py", "child", Range(2, 0, 5, 0), parent_id=parent.id)
+        return store, parent, child
+
+    def test_mutations_append_and_replay(self, tmp_project):
+        root, _ = tmp_project
+        store, parent, child = self._journaled(root)
+        sidecar = root / ".pyweb" / "fragments" / "src" / "main.py.json"
+        before = sidecar.read_bytes()
+        store.rename_fragment("src/main.py", child.id, "renamed")
+        store.set_prose("src/main.py", child.id, "Words")
+        store.resize_fragment("src/main.py", child.id, Range(3, 0, 6, 0))
+        other = store.create_fragment("src/main.py", "other", Range(7, 0, 8, 0), parent_id=parent.id)
+        store.move_fragment("src/main.py", other.id, None)
+        store.delete_fragment("src/main.py", parent.id)
+
+        assert sidecar.read_bytes() == before
+        journal = root / ".pyweb" / "fragments" / "src" / "main.py.json.log"
+        assert len(journal.read_bytes().splitlines()) == 1 + 7
+        # A plain store reads the journal too
+        assert FragmentStore(root).load_file("src/main.py") == store.load_file("src/main.py")
+        loaded = FragmentStore(root).get_fragment("src/main.py", child.id)
+        assert (loaded.name, loaded.prose, loaded.range) == ("renamed", "Words", Range(3, 0, 6, 0))
+        assert [r.name for r in FragmentStore(root).get_roots("src/main.py")] == ["renamed", "other"]
+
+    def test_compaction(self, tmp_project):
+        root, _ = tmp_project
+        store, parent, child = self._journaled(root, journal_compact_bytes=0)
+        journal = root / ".pyweb" / "fragments" / "src" / "main.py.json.log"
+        sidecar = root / ".pyweb" / "fragments" / "src" / "main.py.json"
+        compactions = 0
+        for i in range(30):
+            store.rename_fragment("src/main.py", child.id, f"name {i}")
+            if not journal.exists():
+                compactions += 1
+            else:
+                # Never allowed to outgrow the sidecar
+                assert journal.stat().st_size <= sidecar.stat().st_size
+        assert compactions > 0
+        assert FragmentStore(root).get_fragment("src/main.py", child.id).name == "name 29"
+
+    def test_torn_record_cut_off(self, tmp_project):
+        root, _ = tmp_project
+        store, parent, child = self._journaled(root)
+        store.rename_fragment("src/main.py", child.id, "renamed")
+        journal = root / ".pyweb" / "fragments" / "src" / "main.py.json.log"
+        good = journal.read_bytes()
+        torn = good + b'{"op":"rename","id":"' + child.id.encode()
+        journal.write_bytes(torn)
+
+        fresh = FragmentStore(root, journal=True)
+        assert fresh.get_fragment("src/main.py", child.id).name == "renamed"
+        # Readers skip the torn tail; the next writer cuts it off
+        assert journal.read_bytes() == torn
+        fresh.rename_fragment("src/main.py", child.id, "again")
+        assert journal.read_bytes().startswith(good + b"{")
+        assert FragmentStore(root).get_fragment("src/main.py", child.id).name == "again"
+
+    def test_stale_journal_discarded(self, tmp_project):
+        root, _ = tmp_project
+        store, parent, child = self._journaled(root)
+        store.rename_fragment("src/main.py", child.id, "renamed")
+        journal = root / ".pyweb" / "fragments" / "src" / "main.py.json.log"
+        stale = journal.read_bytes()
+        # Compaction finished, but the old journal survived a crash
+        store.save_file(store.load_file("src/main.py"))
+        store.rename_fragment("src/main.py", child.id, "compacted")
+        journal.write_bytes(stale)
+
+        assert FragmentStore(root).get_fragment("src/main.py", child.id).name == "renamed"
+        journal.write_bytes(stale)
+        store.save_file(FragmentStore(root, journal=False).load_file("src/main.py"))
+        assert not journal.exists()
+
+    def test_config_enables_journal(self, tmp_project):
+        root, _ = tmp_project
+        (root / ".pyweb" / "config.json").write_text('{"version": 1, "journal": true}')
+        assert FragmentStore(root).journal
+        assert not FragmentStore(root, journal=False).journal
+
+
+def _hammer(root: str, worker: int, count: int, journal: bool) -> None:
+    """Stress-test worker: create and rename its own fragments in one shared file."""
+    store = FragmentStore(Path(root), journal=journal, journal_compact_bytes=0)
+    for i in range(count):
+        line = worker * 1000 + i * 2
+        frag = store.create_fragment("src/main.py", f"w{worker}-{i}", Range(line, 0, line + 1, 0))
+        store.rename_fragment("src/main.py", frag.id, f"w{worker}-{i}-renamed")
+
+
+def _read_loop(root: str, count: int) -> int:
+    """Stress-test reader: every load sees a whole, valid file."""
+    seen = 0
+    for _ in range(count):
+        store = FragmentStore(Path(root))
+        ff = store.load_file("src/main.py")
+        if ff is not None:
+            assert store.validate("src/main.py") == []
+            seen = max(seen, len(ff.fragments))
+    return seen
+
+
+class TestConcurrency:
+    @pytest.mark.parametrize("journal", [False, True])
+    def test_many_processes(self, tmp_project, journal):
+        from concurrent.futures import ProcessPoolExecutor
+
+        root, store = tmp_project
+        workers, count = 4, 15
+        with ProcessPoolExecutor(max_workers=workers + 1) as pool:
+            reader = pool.submit(_read_loop, str(root), 40)
+            futures = [pool.submit(_hammer, str(root), w, count, journal) for w in range(workers)]
+            for fut in futures:
+                fut.result()
+            reader.result()
+
+        ff = FragmentStore(root).load_file("src/main.py")
+        assert sorted(f.name for f in ff.fragments) == sorted(
+            f"w{w}-{i}-renamed" for w in range(workers) for i in range(count)
+        )
+        assert store.validate("src/main.py") == []
+        # One generation per mutation (plus one per compaction)
+        assert ff.generation >= 2 * workers * count
+        if not journal:
+            assert ff.generation == 2 * workers * count
+        leftovers = [p.name for p in (root / ".pyweb" / "fragments").rglob("*.tmp")]
+        assert leftovers == []
+
+    def test_save_detects_conflict(self, tmp_project):
+        from pyweb.core.store import ConflictError
+
+        root, store = tmp_project
+        frag = store.create_fragment("src/main.py", "block", Range(0, 0, 5, 0))
+        ff = store.load_file("src/main.py")
+        loaded_at = ff.generation
+        FragmentStore(root).rename_fragment("src/main.py", frag.id, "theirs")
+        with pytest.raises(ConflictError):
+            store.save_file(ff, expected_generation=loaded_at)
+        assert FragmentStore(root).get_fragment("src/main.py", frag.id).name == "theirs"
+
+    def test_update_file_retries(self, tmp_project):
+        root, store = tmp_project
+        a = store.create_fragment("src/main.py", "a", Range(0, 0, 2, 0))
+        b = store.create_fragment("src/main.py", "b", Range(3, 0, 5, 0))
+        calls = []
+
+        def change(ff):
+            calls.append(ff.generation)
+            if len(calls) == 1:
+                # Another writer gets in between load and save
+                FragmentStore(root).rename_fragment("src/main.py", b.id, "theirs")
+            ff.get(a.id).name = "ours"
+
+        store.update_file("src/main.py", change)
+        assert len(calls) == 2 and calls[1] == calls[0] + 1
+        fresh = FragmentStore(root)
+        assert fresh.get_fragment("src/main.py", a.id).name == "ours"
+        assert fresh.get_fragment("src/main.py", b.id).name == "theirs"
+
+
+class TestProjectQueries:
+    def test_find_and_orphaned_across_files(self, tmp_project):
+        root, store = tmp_project
+        store.create_fragment("src/main.py", "setup", Range(0, 0, 2, 0))
+        store.create_fragment("src/other.py", "setup", Range(0, 0, 1, 0))
+        lost = store.create_fragment("src/other.py", "lost", Range(3, 0, 4, 0))
+        store.resize_fragment("src/other.py", lost.id, Range(-1, -1, -1, -1))
+        assert store.list_files() == ["src/main.py", "src/other.py"]
+        assert [f.file for f in store.find_fragments("setup")] == ["src/main.py", "src/other.py"]
+        assert [f.name for f in store.orphaned_fragments()] == ["lost"]
+
+    def test_open_store_reads_backend(self, tmp_project):
+        from pyweb.core.sqlstore import SqliteFragmentStore
+        from pyweb.core.store import open_store
+
+        root, store = tmp_project
+        assert type(open_store(root)) is FragmentStore
+        (root / ".pyweb" / "config.json").write_text('{"version": 1, "backend": "sqlite"}')
+        assert isinstance(open_store(root), SqliteFragmentStore)
@@ -0,0 +1,97 @@
+"""Tests for streaming marker stripping and sidecar emission."""
+import io
+
+import pytest
+
+from pyweb.core import writer
+from pyweb.core.parser import parse_markers
+from pyweb.core.store import FragmentStore
+from pyweb.core.strip import strip_file, strip_lines, strip_project
+
+
+SOURCE = "a\nb\nc\nd\ne\nf\n"
+
+
+def _marked() -> tuple[str, str, str]:
+    src, outer = writer.add_fragment(SOURCE, "m.py", "outer", 1, 5, prose="Outer.\nTwo lines.")
+    inner_start = parse_markers(src).get(outer).content_start_line + 1
+    src, inner = writer.add_fragment(src, "m.py", "inner", inner_start, inner_start + 2)
+    return src, outer, inner
+
+
+def _strip(src: str):
+    out: list[str] = []
+    result = strip_lines(io.StringIO(src, newline=""), out.append, "m.py")
+    return "".join(out), result
+
+
+class TestStripLines:
+    def test_output_matches_removing_every_fragment(self):
+        src, outer, inner = _marked()
+        text, result = _strip(src)
+        removed = writer.remove_fragment(writer.remove_fragment(src, inner), outer)
+        assert text == removed == SOURCE
+        assert result.dropped == len(src.splitlines()) - len(SOURCE.splitlines())
+
+    def test_sidecar_ranges_point_at_stripped_lines(self):
+        src, outer, inner = _marked()
+        text, result = _strip(src)
+        lines = text.splitlines()
+        frags = {f.name: f for f in result.fragments.fragments}
+        assert lines[frags["outer"].range.start_line:frags["outer"].range.end_line] == ["b", "c", "d", "e"]
+        assert lines[frags["inner"].range.start_line:frags["inner"].range.end_line] == ["c", "d"]
+        assert frags["outer"].children == [inner]
+        assert frags["outer"].prose == "Outer.\nTwo lines."
+        assert result.fragments.content_hash == FragmentStore.content_hash(text)
+
+    def test_keeps_line_endings_and_other_breaks(self):
+        src = "x\r\n# @pyweb:start id=\"aaaa0001\" name=\"f\"\r\ny\x0cz\r\n# @pyweb:end id=\"aaaa0001\"\r\nw"
+        text, result = _strip(src)
+        assert text == "x\r\ny\x0cz\r\nw"
+        # y and z are separate lines, as str.splitlines() counts them
+        assert (result.fragments.fragments[0].range.start_line,
+                result.fragments.fragments[0].range.end_line) == (1, 3)
+
+    def test_cr_joining_lf_after_dropped_marker(self):
+        src = "x\r# @pyweb:start id=\"aaaa0001\" name=\"f\"\n\ny\n# @pyweb:end id=\"aaaa0001\"\n"
+        text, result = _strip(src)
+        assert text == "x\r\ny\n"
+        assert text.splitlines()[result.fragments.fragments[0].range.end_line - 1] == "y"
+
+    def test_warnings_match_parser(self):
+        src = "a\n# @pyweb:start id=\"aaaa0001\" name=\"f\"\nb\n"
+        _, result = _strip(src)
+        assert result.warnings == parse_markers(src).warnings
+
+
+def test_strip_file_passes_undecodable_bytes(tmp_path):
+    path = tmp_path / "m.py"
+    path.write_bytes(b"\xff\xfe\n# @pyweb:start id=\"aaaa0001\" name=\"f\"\nok\n# @pyweb:end id=\"aaaa0001\"\n")
+    out = tmp_path / "out.py"
+    with out.open("w", encoding="utf-8", errors="surrogateescape", newline="") as fh:
+        strip_file(path, fh)
+    assert out.read_bytes() == b"\xff\xfe\nok\n"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_project_mirror_with_sidecars(tmp_path, workers):
+    root, dest = tmp_path / "src", tmp_path / "dist"
+    (root / "pkg").mkdir(parents=True)
+    src, outer, _ = _marked()
+    for i in range(3):
+        (root / "pkg" / f"m{i}.py").write_text(src)
+    (root / "logo.png").write_bytes(b"\x89PNG\x00\x01")
+    files = ["logo.png"] + [f"pkg/m{i}.py" for i in range(3)]
+
+    results = dict(strip_project(root, files, dest, workers=workers, sidecars=True))
+    assert results["logo.png"].fragments is None
+    assert (dest / "logo.png").read_bytes() == b"\x89PNG\x00\x01"
+
+    store = FragmentStore(dest)
+    assert store.is_initialized()
+    for i in range(3):
+        rel = f"pkg/m{i}.py"
+        assert (dest / rel).read_text() == SOURCE
+        assert store.load_file(rel) == results[rel].fragments
+        assert store.get_fragment(rel, outer).range.start_line == 1
+        assert store.load_cache(rel) == SOURCE
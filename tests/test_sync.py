@@ -1,4 +1,5 @@
 """Tests for bidirectional sync: source→fragments and fragments→source."""
+import os
 import pytest
 from pathlib import Path
 
@@ -247,3 +248,55 @@ class TestRoundTrip:
         assert lines[5] == "REPLACED"
         # Lines after should still be correct
         assert "line6" in final
+
+
+class TestDocumentReuse:
+    def test_repeated_edits_reuse_document(self, project, monkeypatch):
+        root, store, engine = project
+        frag = store.create_fragment("main.py", "block", Range(3, 0, 5, 0))
+        engine.on_fragment_content_changed("main.py", frag.id, "A\nB\n")
+
+        doc = engine.document("main.py")
+        result = engine.on_fragment_content_changed("main.py", frag.id, "C\n")
+        assert engine.document("main.py") is doc
+        assert result.splitlines()[3] == "C"
+
+    def test_external_change_reloads(self, project):
+        root, store, engine = project
+        frag = store.create_fragment("main.py", "block", Range(0, 0, 1, 0))
+        engine.on_fragment_content_changed("main.py", frag.id, "A\n")
+        (root / "main.py").write_text("external\n" * 12)
+        result = engine.on_fragment_content_changed("main.py", frag.id, "B\n")
+        assert result == "B\n" + "external\n" * 11
+
+    def test_same_size_edit_under_cached_document(self, project):
+        root, store, engine = project
+        src = root / "main.py"
+        doc = engine.document("main.py")
+        st = src.stat()
+        # Same size, inode and mtime: only the content tells them apart
+        src.write_text(src.read_text().replace("line4", "LINE4"))
+        os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns))
+        reloaded = engine.document("main.py")
+        assert reloaded is not doc
+        assert str(reloaded).splitlines()[4] == "LINE4"
+
+    def test_old_file_trusted_without_reading(self, project, monkeypatch):
+        root, store, engine = project
+        src = root / "main.py"
+        os.utime(src, ns=(0, 0))
+        doc = engine.document("main.py")
+        monkeypatch.setattr(Path, "read_text", lambda self, *a, **k: pytest.fail("file read again"))
+        assert engine.document("main.py") is doc
+
+    def test_replaced_file_reloads(self, project):
+        root, store, engine = project
+        src = root / "main.py"
+        os.utime(src, ns=(0, 0))
+        doc = engine.document("main.py")
+        tmp = root / "main.py.new"
+        tmp.write_text(src.read_text().replace("line4", "LINE4"))
+        os.utime(tmp, ns=(0, 0))
+        os.replace(tmp, src)
+        assert str(engine.document("main.py")).splitlines()[4] == "LINE4"
+        assert doc is not engine.document("main.py")
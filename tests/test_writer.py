@@ -1,8 +1,9 @@
 """Tests for the marker writer: add, remove, rename, prose, resize."""
 import pytest
-from pyweb.core.writer import add_fragment, remove_fragment, rename_fragment, set_prose, resize_fragment
+from pyweb.core.writer import Batch, add_fragment, remove_fragment, rename_fragment, set_prose, resize_fragment
 from pyweb.core.parser import parse_markers, get_fragment_by_id
 from pyweb.core.comments import CommentStyle
+from pyweb.core.document import Document
 
 
 SIMPLE_SRC = "line0\nline1\nline2\nline3\nline4\n"
@@ -165,6 +166,19 @@ class TestResizeFragment:
         assert f2.id == fid
         assert f2.name == "block"
 
+    def test_resize_keeps_prose_and_code(self):
+        src, fid = add_fragment(SIMPLE_SRC, "main.py", "block", 1, 2, prose="Why\nHow")
+        f = parse_markers(src).fragments[0]
+        # Resizing to the current range leaves the source unchanged
+        assert resize_fragment(src, "main.py", fid, f.content_start_line, f.content_end_line) == src
+
+        # Positions are in the marked-up file, so the end marker line counts
+        new_src = resize_fragment(src, "main.py", fid, f.content_start_line, f.content_end_line + 2)
+        f2 = parse_markers(new_src).fragments[0]
+        assert f2.prose == "Why\nHow"
+        assert f2.content_end_line - f2.content_start_line == 2
+        assert remove_fragment(new_src, fid) == SIMPLE_SRC
+
     def test_resize_nonexistent_raises(self):
         with pytest.raises(ValueError):
             resize_fragment(SIMPLE_SRC, "main.py", "nope", 0, 3)
@@ -184,3 +198,151 @@ class TestIndentation:
         lines = new_src.splitlines()
         start_line = [l for l in lines if "@pyweb:start" in l][0]
         assert start_line.startswith("# @pyweb")  # no leading spaces
+
+
+class TestBatch:
+    def _nested_src(self):
+        src, outer = add_fragment(SIMPLE_SRC, "main.py", "outer", 0, 5, prose="Outer")
+        src, inner = add_fragment(src, "main.py", "inner", 3, 5)
+        return src, outer, inner
+
+    def test_single_ops_match_writer_functions(self):
+        src, outer, inner = self._nested_src()
+        cases = [
+            (lambda b: b.remove(inner), remove_fragment(src, inner)),
+            (lambda b: b.rename(outer, "renamed"), rename_fragment(src, outer, "renamed")),
+            (lambda b: b.set_prose(inner, "a\nb"), set_prose(src, "main.py", inner, "a\nb")),
+            (lambda b: b.set_prose(outer, None), set_prose(src, "main.py", outer, None)),
+        ]
+        for queue, expected in cases:
+            batch = Batch(src, "main.py")
+            queue(batch)
+            assert batch.apply() == expected
+
+    def test_add_matches_add_fragment(self):
+        batch = Batch(SIMPLE_SRC, "main.py")
+        fid = batch.add("block", 1, 3, prose="Note")
+        expected, other = add_fragment(SIMPLE_SRC, "main.py", "block", 1, 3, prose="Note")
+        assert batch.apply() == expected.replace(other, fid)
+
+    def test_positions_refer_to_original_source(self):
+        src, outer, inner = self._nested_src()
+        with Batch(src, "main.py") as batch:
+            batch.remove(inner)
+            batch.rename(outer, "all")
+            batch.set_prose(outer, "Everything")
+            new_id = batch.add("tail", 7, 9)   # line3, line4 in src
+        result = parse_markers(batch.result)
+        assert result.warnings == []
+        assert [f.name for f in result.fragments] == ["all", "tail"]
+        tail = result.get(new_id)
+        assert tail.parent_id == outer
+        lines = batch.result.splitlines()
+        assert lines[tail.content_start_line:tail.content_end_line] == ["line3", "line4"]
+
+    def test_nesting_at_shared_positions(self):
+        with Batch(SIMPLE_SRC, "main.py") as batch:
+            a = batch.add("a", 0, 2)
+            b = batch.add("b", 2, 4)
+            outer = batch.add("outer", 0, 4)
+            empty = batch.add("empty", 2, 2)
+        result = parse_markers(batch.result)
+        assert result.warnings == []
+        assert result.get(a).parent_id == outer
+        assert result.get(b).parent_id == outer
+        assert result.get(empty).parent_id == outer
+        assert remove_fragment(remove_fragment(remove_fragment(remove_fragment(
+            batch.result, a), b), outer), empty) == SIMPLE_SRC
+
+    def test_resize_to_current_range_is_noop(self):
+        src, outer, inner = self._nested_src()
+        f = parse_markers(src).get(inner)
+        batch = Batch(src, "main.py")
+        batch.resize(inner, f.content_start_line, f.content_end_line)
+        assert batch.apply() == src
+
+    def test_validation(self):
+        src, outer, inner = self._nested_src()
+        batch = Batch(src, "main.py")
+        with pytest.raises(ValueError, match="not found"):
+            batch.rename("nope", "x")
+        with pytest.raises(ValueError, match="Invalid line range"):
+            batch.add("x", 3, 99)
+        batch.remove(inner)
+        with pytest.raises(ValueError, match="already removed"):
+            batch.set_prose(inner, "x")
+
+    def test_resize_indents_markers_like_the_content(self):
+        # The old start marker is not indented like the code it wraps
+        src = (
+            '# @pyweb:start id="f" name="f"\n'
+            '# @pyweb:prose Note\n'
+            '    a = 1\n'
+            '    b = 2\n'
+            '# @pyweb:end id="f"\n'
+            'c = 3\n'
+        )
+        expected = resize_fragment(src, "main.py", "f", 0, 4)
+        assert expected.startswith('    # @pyweb:start id="f"')
+        batch = Batch(src, "main.py")
+        batch.resize("f", 0, 4)
+        assert batch.apply() == expected
+        doc = Document(src)
+        batch = Batch(doc, "main.py")
+        batch.resize("f", 0, 4)
+        assert str(batch.apply_in_place()) == expected
+
+    def test_crossing_adds_rejected(self):
+        batch = Batch(SIMPLE_SRC, "main.py")
+        batch.add("a", 0, 3)
+        batch.add("b", 2, 5)
+        with pytest.raises(ValueError, match="Fragments 'a' and 'b' cross"):
+            batch.apply()
+
+    def test_resize_crossing_an_add_rejected(self):
+        src, outer, inner = self._nested_src()
+        batch = Batch(src, "main.py")
+        f = parse_markers(src).get(outer)
+        batch.add("head", 0, f.content_start_line + 1)
+        batch.resize(outer, f.content_start_line, f.end_line)
+        with pytest.raises(ValueError, match="cross"):
+            batch.apply()
+
+    def test_ranges_checked_against_fragments_in_place(self):
+        src, outer, inner = self._nested_src()
+        parsed = parse_markers(src)
+        o, i = parsed.get(outer), parsed.get(inner)
+        batch = Batch(src, "main.py")
+        batch.add("half", 0, i.content_start_line)
+        with pytest.raises(ValueError, match="Fragments 'half' and 'outer' cross"):
+            batch.apply()
+        batch = Batch(src, "main.py")
+        batch.add("split", o.start_line + 1, o.content_end_line)
+        with pytest.raises(ValueError, match="inside the markers of 'outer'"):
+            batch.apply()
+        # Around a fragment, or inside its content, is fine
+        batch = Batch(src, "main.py")
+        batch.add("all", 0, o.end_line)
+        batch.add("in", o.content_start_line, i.start_line)
+        assert parse_markers(batch.apply()).warnings == []
+
+    def test_exception_in_block_skips_apply(self):
+        with pytest.raises(RuntimeError):
+            with Batch(SIMPLE_SRC, "main.py") as batch:
+                batch.add("x", 0, 1)
+                raise RuntimeError
+        assert batch.result is None
+
+    def test_document_in_place(self):
+        src, outer, inner = self._nested_src()
+        doc = Document(src)
+        with Batch(doc, "main.py") as batch:
+            batch.remove(inner)
+            batch.set_prose(outer, "Edited")
+            batch.add("head", 2, 3)
+        expected = Batch(src, "main.py")
+        expected.remove(inner)
+        expected.set_prose(outer, "Edited")
+        fid = expected.add("head", 2, 3)
+        new_fid = [f.id for f in parse_markers(str(doc)).fragments if f.name == "head"][0]
+        assert str(doc) == expected.apply().replace(fid, new_fid)